@@ -3,25 +3,46 @@ BGC.py
 
 Bulk ingest BGC CSV files (~500 rows each) into PostgreSQL (TimescaleDB + PostGIS).
 - Automatically creates table + hypertable + indexes.
+- Scans every header first: the table gets the union of all columns (new ones are
+  added to an existing table), so files with extra parameters no longer lose them.
+- One converter per column is picked once (compile_plan) and applied by position,
+  instead of branching on the column name for every cell.
+- WORKERS > 1 shards the files across a process pool, one connection per worker.
 - Bulk inserts with execute_values.
 - Deduplicates rows by (platform_number, juld, pres).
-- Computes location (geography POINT).
-- Skips files already fully inserted.
+- Computes location (geography POINT) as part of the insert.
+- Tracks loaded files in ingest_manifest: unchanged files are skipped without being
+  opened and partially loaded files resume after their last committed batch.
 - Robust UTF-8 / Latin-1 encoding handling.
+- LAYOUT = "long" stores (profile, pres, parameter, value, qc) rows instead, with a
+  parameter dictionary and per-parameter partial indexes (bgc_store.py); files with
+  different parameter sets can then share the store.
+- Rows with a bad JULD go to ingest_rejects (file, line, raw row), written per batch.
 """
 
 import os
 import glob
 import csv
+import multiprocessing
+import multiprocessing.util
+from collections import Counter
 from datetime import datetime
 import psycopg2
 from psycopg2.extras import execute_values
+import bgc_store
+from ingest_manifest import ensure_manifest, load_manifest, plan_file, record_progress
+from ingest_rejects import BAD_JULD, Reject, RejectLog, ensure_rejects
+from ingest_rejects import print_summary as print_rejects_summary
 
 # ---------- CONFIG ----------
 CSV_FOLDER = r"F:\BGC_ARGO_2025"
 DB_CONN_STR = "dbname=argo_db user=postgres password=1212 host=localhost port=5432"
 TABLE_NAME = "bgc_argo"
 BATCH_SIZE = 5000
+LAYOUT = "wide"  # "wide" = bgc_argo, one column per parameter; "long" = bgc_store tables
+WORKERS = 1  # > 1 shards the files across a process pool, one connection per worker
+KEY_COLUMNS = ["PLATFORMNUMBER", "JULD", "PRES"]
+TEXT_COLUMNS = ["DATECREATION", "PLATFORMNUMBER", "CYCNUMBER", "DIRECTION", "DATAMODE", "PLATFORMTYPE"]
 
 # ---------- Helpers ----------
 def clean_text(val):
@@ -72,156 +93,308 @@ def normalize(col):
     """Remove spaces/underscores, uppercase, remove BOM"""
     return col.replace(" ", "").replace("_", "").upper().replace("\ufeff", "")
 
+def quoted(cols):
+    """Comma-separated quoted identifiers, matching the quoted column names of ensure_table."""
+    return ", ".join(f'"{c}"' for c in cols)
+
+def column_type(col):
+    """SQL type of a bgc_argo column; compile_plan converts values to match."""
+    if col == "JULD":
+        return "TIMESTAMPTZ"  # hypertable time column
+    if col in TEXT_COLUMNS:
+        return "TEXT"
+    return "REAL"  # LATITUDE, LONGITUDE, PRES and the BGC columns
+
+def store_column_type(col):
+    """bgc_store.load_records converts the values itself (b'' wrappers included); only JULD is parsed here."""
+    return "TIMESTAMPTZ" if col == "JULD" else "TEXT"
+
 # ---------- DB helpers ----------
 def ensure_table(conn, col_list):
     """
     Create table if not exists, with dynamic BGC columns based on list of column names.
     """
-    cols_defs = []
-
-    for col in col_list:
-        if col in ["LATITUDE", "LONGITUDE", "PRES", "JULD"]:
-            col_type = "REAL"
-        elif col in ["DATECREATION", "PLATFORMNUMBER", "CYCNUMBER", "DIRECTION",
-                     "DATAMODE", "PLATFORMTYPE"]:
-            col_type = "TEXT"
-        else:
-            col_type = "REAL"  # BGC columns
-        cols_defs.append(f'"{col}" {col_type}')
+    cols_defs = [f'"{col}" {column_type(col)}' for col in col_list]
 
     cols_sql = ",\n    ".join(cols_defs)
     create_sql = f"""
     CREATE TABLE IF NOT EXISTS "{TABLE_NAME}" (
-        id SERIAL PRIMARY KEY,
+        id SERIAL,  -- not a primary key: hypertable unique indexes must include JULD
         {cols_sql},
         location GEOGRAPHY(Point, 4326)
     );
     """
     with conn.cursor() as cur:
         cur.execute(create_sql)
+        # Columns that only later files of the union brought in
+        for col_def in cols_defs:
+            cur.execute(f'ALTER TABLE "{TABLE_NAME}" ADD COLUMN IF NOT EXISTS {col_def};')
         conn.commit()
         # Hypertable
         cur.execute(f"SELECT create_hypertable('{TABLE_NAME}', 'JULD', if_not_exists => TRUE);")
         conn.commit()
         # Indexes
         cur.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{TABLE_NAME}_platform_juld_pres "
-                    f"ON {TABLE_NAME} (PLATFORM_NUMBER, JULD, PRES);")
+                    f"ON {TABLE_NAME} ({quoted(KEY_COLUMNS)});")
         conn.commit()
         cur.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE_NAME}_location "
                     f"ON {TABLE_NAME} USING GIST(location);")
         conn.commit()
     print("✅ Table and indexes ensured.")
 
-def deduplicate_batch(batch):
+def deduplicate_batch(batch, key_idx):
     """Remove duplicates in batch by (platform_number, juld, pres)"""
     unique = {}
     for r in batch:
-        key = (r[0], r[5], r[9])
+        key = tuple(r[i] for i in key_idx)
         unique[key] = r
     return list(unique.values())
 
 def insert_batch(conn, batch, all_cols):
     if not batch:
         return 0
-    batch = deduplicate_batch(batch)
+    key_idx = [all_cols.index(c) for c in KEY_COLUMNS if c in all_cols]
+    batch = deduplicate_batch(batch, key_idx)
+    placeholders = ["%s"] * len(all_cols)
+    # Write the geography point with the row instead of a table-wide UPDATE afterwards
+    has_coords = "LONGITUDE" in all_cols and "LATITUDE" in all_cols
+    if has_coords:
+        lon_idx, lat_idx = all_cols.index("LONGITUDE"), all_cols.index("LATITUDE")
+        batch = [r + (r[lon_idx], r[lat_idx]) for r in batch]
+        placeholders.append("ST_SetSRID(ST_MakePoint(%s, %s), 4326)::GEOGRAPHY")
+    insert_cols = all_cols + (["location"] if has_coords else [])
+    update_cols = [col for col in insert_cols if col not in KEY_COLUMNS]
+    # the columns were created quoted (upper case), so every reference is quoted too
     insert_sql = f"""
-    INSERT INTO {TABLE_NAME} ({','.join(all_cols)})
+    INSERT INTO {TABLE_NAME} ({quoted(insert_cols)})
     VALUES %s
-    ON CONFLICT (PLATFORM_NUMBER, JULD, PRES) DO UPDATE SET
-        {','.join([f'{col}=EXCLUDED.{col}' for col in all_cols if col not in ['PLATFORM_NUMBER','JULD','PRES']])};
+    ON CONFLICT ({quoted(KEY_COLUMNS)}) DO UPDATE SET
+        {','.join([f'"{col}"=EXCLUDED."{col}"' for col in update_cols])};
     """
     with conn.cursor() as cur:
-        execute_values(cur, insert_sql, batch, page_size=1000)
-        conn.commit()
-        # Update location
-        cur.execute(f"""
-            UPDATE {TABLE_NAME}
-            SET location = ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::GEOGRAPHY
-            WHERE location IS NULL AND longitude IS NOT NULL AND latitude IS NOT NULL;
-        """)
+        execute_values(cur, insert_sql, batch, template="(" + ", ".join(placeholders) + ")",
+                       page_size=1000)
         conn.commit()
     return len(batch)
 
-# ---------- Main ingestion ----------
-def ingest_folder(conn, folder_path, batch_size=BATCH_SIZE):
-    csv_paths = sorted(glob.glob(os.path.join(folder_path, "*.csv")))
-    if not csv_paths:
-        print("No CSV files found at", folder_path)
-        return
+# ---------- Schema and converter plan ----------
+def read_header(path):
+    """Normalized header of one CSV (first line only)."""
+    for enc in ['utf-8-sig','latin1']:
+        try:
+            with open(path, newline='', encoding=enc) as fh:
+                return [normalize(c) for c in next(csv.reader(fh), [])]
+        except UnicodeDecodeError:
+            continue
+    return []
 
-    total_rows = 0
-    skipped_rows = 0
+def scan_schema(csv_paths):
+    """Union of all file headers, in order of first appearance."""
+    seen = {}
+    for path in csv_paths:
+        for c in read_header(path):
+            seen.setdefault(c, None)
+    return list(seen)
+
+CONVERTERS = {"TIMESTAMPTZ": parse_datetime, "REAL": safe_float, "TEXT": clean_text}
+
+def compile_plan(all_cols, types=column_type):
+    """One converter per column of the union, chosen once from its SQL type instead of per cell."""
+    return [CONVERTERS[types(c)] for c in all_cols]
 
-    # Determine all columns from first file
-    first_file = csv_paths[0]
-    with open(first_file, newline='', encoding='utf-8-sig') as fh:
-        reader = csv.DictReader(fh)
-        first_cols = [normalize(c) for c in reader.fieldnames]
+def file_plan(header, all_cols, plan):
+    """[(index in this file's rows or None, converter)] in all_cols order."""
+    pos = {}
+    for i, c in enumerate(header):
+        pos.setdefault(c, i)
+    return [(pos.get(c), conv) for c, conv in zip(all_cols, plan)]
+
+def read_rows(path):
+    """(normalized header, data rows) with the UTF-8 / Latin-1 fallback, or None."""
+    for enc in ['utf-8-sig','latin1']:
+        try:
+            with open(path, newline='', encoding=enc) as fh:
+                reader = csv.reader(fh)
+                header = [normalize(c) for c in next(reader, [])]
+                return header, list(reader)
+        except UnicodeDecodeError:
+            continue
+    return None
 
-    all_cols = first_cols
-    ensure_table(conn, all_cols)
+# ---------- Main ingestion ----------
+def ingest_files(conn, csv_paths, all_cols, batch_size=BATCH_SIZE, layout=LAYOUT, param_ids=None):
+    """
+    Load csv_paths into the wide table with the column union all_cols, or into the long
+    store with each file's own header and parameters (registered as they appear).
+    Returns {"files", "rows", "skipped", "rejects"}; the schema must already exist.
+    """
+    target = "bgc_values" if layout == "long" else TABLE_NAME
+    plan = compile_plan(all_cols)
+    param_ids = dict(param_ids or {})
+    rejects = RejectLog(target)
+    manifest = load_manifest(conn, target)
+    stats = {"files": 0, "rows": 0, "skipped": 0, "rejects": Counter()}
 
+    # wide: one batch in all_cols order; long: records keep their file's own header,
+    # so the batch is grouped by header
     batch = []
+    long_batches = {}
+    # entry path -> [entry, source rows consumed into uncommitted batches, finished reading]
+    pending = {}
+
+    def flush():
+        if layout == "long":
+            inserted = sum(bgc_store.load_records(conn, recs, list(cols), param_ids)
+                           for cols, recs in long_batches.items())
+            long_batches.clear()
+        else:
+            inserted = insert_batch(conn, batch, all_cols)
+        rejects.flush(conn)
+        record_progress(conn, target, [tuple(p) for p in pending.values()])
+        for key in [k for k, p in pending.items() if p[2]]:
+            del pending[key]
+        return inserted
+
+    batched = 0
     for path in csv_paths:
+        # Skip files the manifest says are loaded and unchanged (stat only, file not opened)
+        entry = plan_file(conn, manifest, target, path)
+        if entry["skip"]:
+            stats["skipped"] += 1
+            print(f"Skipping {os.path.basename(path)} (already in DB)")
+            continue
+        start_row = entry["start_row"]
+        if start_row:
+            print(f"Resuming {os.path.basename(path)} after row {start_row}")
+
         # Read CSV robustly
-        for enc in ['utf-8-sig','latin1']:
-            try:
-                with open(path, newline='', encoding=enc) as fh:
-                    reader = csv.DictReader(fh)
-                    rows = list(reader)
-                break
-            except UnicodeDecodeError:
-                continue
-        else:
+        parsed = read_rows(path)
+        if parsed is None:
             print(f"❌ Could not read {os.path.basename(path)}")
             continue
+        header, rows = parsed
+        stats["files"] += 1
 
         if not rows:
+            record_progress(conn, target, [(entry, 0, True)])
             print(f"Empty file {os.path.basename(path)}, skipping")
             continue
 
-        # Skip if already inserted
-        first_row = rows[0]
-        platform = clean_text(first_row.get('platform_number'))
-        juld = parse_datetime(first_row.get('juld'))
-        pres = safe_float(first_row.get('pres'))
-        if platform and juld and pres is not None:
-            with conn.cursor() as cur:
-                cur.execute(
-                    f"SELECT 1 FROM {TABLE_NAME} WHERE platform_number=%s AND juld=%s AND pres=%s LIMIT 1",
-                    (platform, juld, pres)
-                )
-                if cur.fetchone():
-                    print(f"Skipping {os.path.basename(path)} (already in DB)")
-                    continue
-
-        for row in rows:
-            rec = tuple(
-                clean_text(row.get(c)) if c not in ['JULD','LATITUDE','LONGITUDE','PRES']
-                else (parse_datetime(row.get(c)) if c=='JULD' else safe_float(row.get(c)))
-                for c in all_cols
-            )
-            if rec[all_cols.index('JULD')] is None:
-                skipped_rows +=1
+        if layout == "long":
+            # the file's own columns and parameters, whatever the other headers hold
+            cols = tuple(header)
+            names = [n for n in bgc_store.split_columns(header)[2] if n not in param_ids]
+            if names:
+                param_ids.update(bgc_store.register_parameters(conn, names))
+            fplan = list(enumerate(compile_plan(header, store_column_type)))
+            file_batch = long_batches.setdefault(cols, [])
+        else:
+            fplan = file_plan(header, all_cols, plan)
+            cols, file_batch = all_cols, batch
+        juld_idx = cols.index("JULD") if "JULD" in cols else None
+        width = len(header)
+        rows_in_file = start_row
+        for row in rows[start_row:]:
+            rows_in_file += 1
+            pending[entry["path"]] = [entry, rows_in_file, False]
+            if len(row) < width:
+                row = row + [""] * (width - len(row))
+            rec = tuple([conv(row[i]) if i is not None else None for i, conv in fplan])
+            if juld_idx is None or rec[juld_idx] is None:
+                # +1 for the header line
+                rejects.add(path, Reject(rows_in_file + 1, BAD_JULD, dict(zip(header, row))))
                 continue
-            batch.append(rec)
-            if len(batch) >= batch_size:
-                inserted = insert_batch(conn, batch, all_cols)
-                total_rows += inserted
-                print(f"Inserted batch of {inserted} rows (total {total_rows})")
-                batch = []
-
-    if batch:
-        inserted = insert_batch(conn, batch, all_cols)
-        total_rows += inserted
+            file_batch.append(rec)
+            batched += 1
+            if batched >= batch_size:
+                inserted = flush()
+                stats["rows"] += inserted
+                print(f"Inserted batch of {inserted} rows (total {stats['rows']})")
+                batch.clear()
+                batched = 0
+                file_batch = long_batches.setdefault(cols, []) if layout == "long" else batch
+
+        if entry["path"] in pending:
+            pending[entry["path"]][2] = True
+        else:
+            record_progress(conn, target, [(entry, rows_in_file, True)])
+
+    if pending:
+        inserted = flush()
+        stats["rows"] += inserted
         print(f"Inserted final batch of {inserted} rows.")
 
+    stats["rejects"] = rejects.counts
+    return stats
+
+# ---------- Worker pool ----------
+_worker_conn = None
+
+def _init_worker(dsn):
+    """Pool initializer: every worker process keeps a single connection for its lifetime."""
+    global _worker_conn
+    _worker_conn = psycopg2.connect(dsn)
+    # closed when the worker exits normally (pool.close/join), so the server sees a clean disconnect
+    multiprocessing.util.Finalize(None, _worker_conn.close, exitpriority=10)
+
+def _ingest_shard(args):
+    csv_paths, all_cols, batch_size, layout, param_ids = args
+    return ingest_files(_worker_conn, csv_paths, all_cols, batch_size=batch_size, layout=layout,
+                        param_ids=param_ids)
+
+def shard_paths(csv_paths, workers):
+    """Split the file list into ~4 shards per worker so fast workers pick up the slack."""
+    shard_size = max(1, len(csv_paths) // (workers * 4))
+    return [csv_paths[i:i + shard_size] for i in range(0, len(csv_paths), shard_size)]
+
+def ingest_folder(conn, folder_path, batch_size=BATCH_SIZE, layout=LAYOUT, workers=WORKERS, dsn=None):
+    csv_paths = sorted(glob.glob(os.path.join(folder_path, "*.csv")))
+    if not csv_paths:
+        print("No CSV files found at", folder_path)
+        return
+
+    # Column union over every header, so later files with extra parameters still fit
+    all_cols = scan_schema(csv_paths)
+    if "JULD" not in all_cols:
+        print("❌ No JULD column in any header at", folder_path)
+        return
+    print(f"Found {len(csv_paths)} files, {len(all_cols)} columns in the union "
+          f"(layout={layout}, workers={workers}).")
+
+    param_ids = None
+    if layout == "long":
+        bgc_store.ensure_store(conn)
+        # registered up front so pool workers do not race on new parameters;
+        # ingest_files still registers whatever a file's own header adds
+        param_ids = bgc_store.register_parameters(conn, list(bgc_store.split_columns(all_cols)[2]))
+    else:
+        ensure_table(conn, all_cols)
+    ensure_manifest(conn)
+    ensure_rejects(conn)
+
+    if workers <= 1:
+        stats = ingest_files(conn, csv_paths, all_cols, batch_size=batch_size, layout=layout, param_ids=param_ids)
+    else:
+        if dsn is None:
+            raise ValueError("workers > 1 needs a connection string so each worker can open its own connection")
+        stats = {"files": 0, "rows": 0, "skipped": 0, "rejects": Counter()}
+        shards = [(shard, all_cols, batch_size, layout, param_ids) for shard in shard_paths(csv_paths, workers)]
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(dsn,)) as pool:
+            for shard_stats in pool.imap_unordered(_ingest_shard, shards):
+                for key, value in shard_stats.items():
+                    stats[key] += value
+                print(f"[{stats['files'] + stats['skipped']}/{len(csv_paths)}] files done "
+                      f"(total inserted: {stats['rows']})")
+            pool.close()
+            pool.join()
+
     print("---- Done ----")
-    print(f"Total rows inserted/updated: {total_rows}")
-    print(f"Rows skipped due to bad JULD: {skipped_rows}")
+    print(f"Files already in DB: {stats['skipped']}")
+    print(f"Total rows inserted/updated: {stats['rows']}")
+    print_rejects_summary(stats["rejects"])
 
 # ---------- Run ----------
 if __name__ == "__main__":
     conn = psycopg2.connect(DB_CONN_STR)
-    ingest_folder(conn, CSV_FOLDER)
+    ingest_folder(conn, CSV_FOLDER, dsn=DB_CONN_STR)
     conn.close()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+argo_profiles.py
+
+One row per profile next to the one-row-per-level argo_data hypertable.
+- argo_profiles holds the header once (platform, cycle, direction, juld, position, ...)
+  and the levels as pres[] / temp[] / psal[] arrays sorted by pressure.
+- The importers refresh it inside the batch transaction (refresh_profiles): every
+  profile touched by a batch is rebuilt from argo_data, so upserts, replaced
+  delayed-mode profiles and re-runs all leave it consistent with the level table.
+- Header columns are indexed (juld, platform + juld, GIST on location), so profile
+  lookups, trajectories and embedding prep read one row instead of ~500.
+- Accessors: get_profile, iter_profiles, trajectory, profile_frame.
+- --rebuild fills it from an existing argo_data, one hypertable chunk per transaction.
+"""
+
+import argparse
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+DEFAULT_DSN = "dbname=argo_db user=postgres password=1212 host=localhost port=5432"
+
+PROFILES_SQL = """
+CREATE TABLE IF NOT EXISTS argo_profiles (
+    platform_number TEXT NOT NULL,
+    cycle_number INT NOT NULL,
+    direction TEXT NOT NULL,
+    data_mode TEXT,
+    platform_type TEXT,
+    date_creation TIMESTAMPTZ,
+    juld TIMESTAMPTZ NOT NULL,
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION,
+    location GEOGRAPHY(Point, 4326),
+    n_levels INT NOT NULL,
+    pres DOUBLE PRECISION[] NOT NULL,
+    temp DOUBLE PRECISION[] NOT NULL,
+    psal DOUBLE PRECISION[] NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (platform_number, cycle_number, direction)
+);
+CREATE INDEX IF NOT EXISTS idx_argo_profiles_juld ON argo_profiles (juld);
+CREATE INDEX IF NOT EXISTS idx_argo_profiles_platform_juld ON argo_profiles (platform_number, juld);
+CREATE INDEX IF NOT EXISTS idx_argo_profiles_location ON argo_profiles USING GIST (location);
+"""
+
+PROFILE_COLUMNS = [
+    "platform_number", "cycle_number", "direction", "data_mode", "platform_type", "date_creation",
+    "juld", "latitude", "longitude", "location", "n_levels", "pres", "temp", "psal",
+]
+
+# Level rows -> one profile row. All levels of a profile share juld and position, so
+# min/avg only smooth over stray duplicates; NULL direction is taken as ascending.
+PROFILE_SELECT = """
+SELECT
+    a.platform_number, a.cycle_number, COALESCE(a.direction, 'A'),
+    max(a.data_mode), max(a.platform_type), max(a.date_creation),
+    min(a.juld), avg(a.latitude), avg(a.longitude),
+    ST_SetSRID(ST_MakePoint(avg(a.longitude), avg(a.latitude)), 4326)::GEOGRAPHY,
+    count(*),
+    array_agg(a.pres ORDER BY a.pres), array_agg(a.temp ORDER BY a.pres), array_agg(a.psal ORDER BY a.pres)
+FROM {source} a
+{join}
+WHERE a.platform_number IS NOT NULL AND a.cycle_number IS NOT NULL AND a.pres IS NOT NULL{where}
+GROUP BY a.platform_number, a.cycle_number, COALESCE(a.direction, 'A')
+"""
+
+KEYS_JOIN = """
+JOIN unnest(%(platforms)s::text[], %(cycles)s::int[]) AS k(platform_number, cycle_number)
+  ON a.platform_number = k.platform_number AND a.cycle_number = k.cycle_number
+"""
+
+# The batch's juld range bounds the argo_data side, so only the chunks it touched are
+# probed (a profile's levels share juld) instead of every chunk of the hypertable.
+JULD_BOUND = "\n  AND a.juld BETWEEN %(juld_min)s::timestamptz AND %(juld_max)s::timestamptz"
+
+# Two writers may hold batches of the same profile (--pipeline / --workers): the
+# advisory locks (same keys as bulk_import's replace loader) make them take turns, and
+# READ COMMITTED lets the second one see the first one's levels once it gets the lock.
+REFRESH_SQL = f"""
+SELECT pg_advisory_xact_lock(hashtext(k.platform_number || '/' || k.cycle_number))
+FROM unnest(%(platforms)s::text[], %(cycles)s::int[]) AS k(platform_number, cycle_number);
+
+DELETE FROM argo_profiles p
+USING unnest(%(platforms)s::text[], %(cycles)s::int[]) AS k(platform_number, cycle_number)
+WHERE p.platform_number = k.platform_number AND p.cycle_number = k.cycle_number;
+
+INSERT INTO argo_profiles ({', '.join(PROFILE_COLUMNS)})
+{PROFILE_SELECT.format(source="argo_data", join=KEYS_JOIN, where=JULD_BOUND)};
+"""
+
+def ensure_profiles(conn):
+    with conn.cursor() as cur:
+        cur.execute(PROFILES_SQL)
+        conn.commit()
+
+def profile_keys(rows):
+    """Distinct (platform_number, cycle_number) of argo_data record tuples."""
+    return {(r[0], r[1]) for r in rows if r[0] is not None and r[1] is not None}
+
+def juld_bounds(rows):
+    """(min, max) juld of argo_data record tuples, or None when none has one."""
+    julds = [r[5] for r in rows if r[5] is not None]
+    return (min(julds), max(julds)) if julds else None
+
+def refresh_profiles(cur, keys, bounds=None):
+    """
+    Rebuild the given profiles from argo_data on cur's transaction (the caller commits).
+    bounds = juld_bounds(batch rows) limits the argo_data scan to the batch's chunks.
+    """
+    if not keys:
+        return
+    platforms, cycles = zip(*sorted(keys))
+    juld_min, juld_max = bounds or ("-infinity", "infinity")
+    cur.execute(REFRESH_SQL, {"platforms": list(platforms), "cycles": list(cycles),
+                              "juld_min": juld_min, "juld_max": juld_max})
+
+def rebuild_profiles(conn):
+    """Refill argo_profiles from argo_data chunk by chunk (a profile's levels share juld, hence a chunk)."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT show_chunks('argo_data')::text;")
+        chunks = [r[0] for r in cur.fetchall()]
+        cur.execute("TRUNCATE argo_profiles;")
+    conn.commit()
+    total = 0
+    for i, chunk in enumerate(chunks, 1):
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                INSERT INTO argo_profiles ({', '.join(PROFILE_COLUMNS)})
+                {PROFILE_SELECT.format(source=chunk, join="", where="")}
+                ON CONFLICT (platform_number, cycle_number, direction) DO NOTHING;
+            """)
+            added = cur.rowcount
+        conn.commit()
+        total += added
+        print(f"  [{i}/{len(chunks)}] {chunk}: {added} profiles")
+    print(f"✅ argo_profiles rebuilt ({total} profiles).")
+    return total
+
+# ---------- Accessors ----------
+def get_profile(conn, platform_number, cycle_number, direction="A"):
+    """One profile as a dict (header columns plus pres/temp/psal lists), or None."""
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+            SELECT * FROM argo_profiles
+            WHERE platform_number = %s AND cycle_number = %s AND direction = %s;
+        """, (platform_number, cycle_number, direction))
+        return cur.fetchone()
+
+def iter_profiles(conn, start=None, end=None, platform_number=None, columns=None, itersize=1000):
+    """
+    Stream profile dicts ordered by juld through a server-side cursor.
+    columns limits what is fetched, e.g. header columns only for trajectory-style queries.
+    """
+    where, params = [], []
+    if start is not None:
+        where.append("juld >= %s")
+        params.append(start)
+    if end is not None:
+        where.append("juld < %s")
+        params.append(end)
+    if platform_number is not None:
+        where.append("platform_number = %s")
+        params.append(platform_number)
+    select = ", ".join(columns) if columns else "*"
+    sql = f"SELECT {select} FROM argo_profiles"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY juld"
+
+    with conn.cursor(name="iter_profiles", cursor_factory=RealDictCursor) as cur:
+        cur.itersize = itersize
+        cur.execute(sql, params)
+        yield from cur
+
+def trajectory(conn, platform_number):
+    """[(cycle_number, juld, latitude, longitude)] of one float, headers only."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT cycle_number, juld, latitude, longitude FROM argo_profiles
+            WHERE platform_number = %s ORDER BY juld;
+        """, (platform_number,))
+        return cur.fetchall()
+
+def profile_frame(profile):
+    """Levels of a profile dict as a pandas DataFrame (pres, temp, psal)."""
+    import pandas as pd
+    return pd.DataFrame({"pres": profile["pres"], "temp": profile["temp"], "psal": profile["psal"]})
+
+# ---------- CLI ----------
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the one-row-per-profile argo_profiles table.")
+    parser.add_argument("--db", "-d", default=DEFAULT_DSN, help="psycopg2 connection string (or use env vars).")
+    parser.add_argument("--rebuild", action="store_true", help="Refill argo_profiles from argo_data.")
+    parser.add_argument("--show", nargs=2, metavar=("PLATFORM", "CYCLE"), help="Print one profile.")
+    args = parser.parse_args()
+
+    conn = None
+    try:
+        conn = psycopg2.connect(args.db)
+        ensure_profiles(conn)
+        if args.rebuild:
+            rebuild_profiles(conn)
+        if args.show:
+            p = get_profile(conn, args.show[0], int(args.show[1]))
+            if p is None:
+                print("No such profile.")
+            else:
+                print(f"{p['platform_number']} cycle {p['cycle_number']} {p['direction']} {p['juld']} "
+                      f"({p['latitude']}, {p['longitude']}) mode {p['data_mode']}, {p['n_levels']} levels")
+                print(profile_frame(p).to_string(index=False))
+    except Exception as e:
+        print("❌ Fatal error:", e)
+    finally:
+        if conn:
+            conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+bgc_store.py
+
+Long/narrow storage for BGC-Argo, as an alternative to the wide bgc_argo table.
+- bgc_parameters: dictionary of parameters (DOXY, CHLA, BBP700, ...), registered on
+  first sight, so files with different parameter sets load side by side.
+- bgc_profiles: one row per (platform, cycle, direction) with the header and location.
+- bgc_values: (profile_id, juld, pres, parameter_id, value, qc), a hypertable on juld.
+  Every parameter gets a partial covering index
+  (profile_id, pres) INCLUDE (value, qc) WHERE parameter_id = <id>,
+  so a CHLA query is an index-only scan over CHLA entries and never reads other parameters.
+- Rows are sent sorted by parameter, so the heap pages of a batch are grouped per
+  parameter as well.
+Column names are the normalized headers of BGC.py (upper case, no underscores); a
+<PARAM>QC column, when present, becomes the qc of <PARAM>.
+"""
+
+import io
+import csv
+from psycopg2.extras import execute_values
+
+STORE_SQL = """
+CREATE TABLE IF NOT EXISTS bgc_parameters (
+    parameter_id SMALLSERIAL PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    source_name TEXT,
+    units TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS bgc_profiles (
+    profile_id BIGSERIAL PRIMARY KEY,
+    platform_number TEXT NOT NULL,
+    cycle_number INT NOT NULL,
+    direction TEXT NOT NULL,
+    data_mode TEXT,
+    platform_type TEXT,
+    date_creation TEXT,
+    juld TIMESTAMPTZ NOT NULL,
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION,
+    location GEOGRAPHY(Point, 4326),
+    UNIQUE (platform_number, cycle_number, direction)
+);
+CREATE INDEX IF NOT EXISTS idx_bgc_profiles_juld ON bgc_profiles (juld);
+CREATE INDEX IF NOT EXISTS idx_bgc_profiles_location ON bgc_profiles USING GIST (location);
+
+CREATE TABLE IF NOT EXISTS bgc_values (
+    profile_id BIGINT NOT NULL,
+    juld TIMESTAMPTZ NOT NULL,
+    pres REAL NOT NULL,
+    parameter_id SMALLINT NOT NULL,
+    value REAL,
+    qc SMALLINT,
+    PRIMARY KEY (profile_id, parameter_id, pres, juld)
+);
+"""
+
+# Units of the parameters we know; others are registered without.
+KNOWN_UNITS = {
+    "DOXY": "micromole/kg",
+    "CHLA": "mg/m3",
+    "BBP700": "m-1",
+    "CDOM": "ppb",
+    "PHINSITUTOTAL": "dimensionless",
+    "NITRATE": "micromole/kg",
+    "DOWNWELLINGPAR": "microMoleQuanta/m^2/sec",
+}
+
+# normalized header -> bgc_profiles column
+META_COLUMNS = {
+    "PLATFORMNUMBER": "platform_number",
+    "CYCLENUMBER": "cycle_number",
+    "CYCNUMBER": "cycle_number",
+    "DIRECTION": "direction",
+    "DATAMODE": "data_mode",
+    "PLATFORMTYPE": "platform_type",
+    "DATECREATION": "date_creation",
+    "JULD": "juld",
+    "LATITUDE": "latitude",
+    "LONGITUDE": "longitude",
+}
+LEVEL_COLUMN = "PRES"
+
+PROFILE_UPSERT_SQL = """
+INSERT INTO bgc_profiles (platform_number, cycle_number, direction, data_mode, platform_type,
+                          date_creation, juld, latitude, longitude, location)
+VALUES %s
+ON CONFLICT (platform_number, cycle_number, direction) DO UPDATE SET
+    data_mode = EXCLUDED.data_mode,
+    platform_type = COALESCE(EXCLUDED.platform_type, bgc_profiles.platform_type),
+    date_creation = COALESCE(EXCLUDED.date_creation, bgc_profiles.date_creation),
+    juld = EXCLUDED.juld,
+    latitude = COALESCE(EXCLUDED.latitude, bgc_profiles.latitude),
+    longitude = COALESCE(EXCLUDED.longitude, bgc_profiles.longitude),
+    location = COALESCE(EXCLUDED.location, bgc_profiles.location)
+RETURNING platform_number, cycle_number, direction, profile_id;
+"""
+PROFILE_TEMPLATE = "(%s, %s, %s, %s, %s, %s, %s, %s, %s, ST_SetSRID(ST_MakePoint(%s, %s), 4326)::GEOGRAPHY)"
+
+STAGING_SQL = """
+CREATE TEMP TABLE IF NOT EXISTS bgc_values_staging (
+    profile_id BIGINT, juld TIMESTAMPTZ, pres REAL, parameter_id SMALLINT, value REAL, qc SMALLINT
+) ON COMMIT DELETE ROWS;
+"""
+COPY_SQL = "COPY bgc_values_staging (profile_id, juld, pres, parameter_id, value, qc) FROM STDIN WITH (FORMAT csv)"
+MERGE_SQL = """
+INSERT INTO bgc_values (profile_id, juld, pres, parameter_id, value, qc)
+SELECT profile_id, juld, pres, parameter_id, value, qc FROM bgc_values_staging
+ON CONFLICT (profile_id, parameter_id, pres, juld) DO UPDATE SET
+    value = EXCLUDED.value,
+    qc = EXCLUDED.qc;
+"""
+
+def ensure_store(conn):
+    with conn.cursor() as cur:
+        cur.execute(STORE_SQL)
+        cur.execute("SELECT create_hypertable('bgc_values', 'juld', if_not_exists => TRUE);")
+        conn.commit()
+    print("✅ BGC long-format store ensured.")
+
+# ---------- Parameter dictionary ----------
+def split_columns(cols):
+    """
+    Sort normalized header names into (meta {column: index}, level index,
+    parameters {name: index}, qc {name: index}).
+    """
+    meta, params, qc = {}, {}, {}
+    level = None
+    for i, c in enumerate(cols):
+        if c in META_COLUMNS:
+            meta[META_COLUMNS[c]] = i
+        elif c == LEVEL_COLUMN:
+            level = i
+        elif c.endswith("QC") and c[:-2] in cols:
+            qc[c[:-2]] = i
+        elif c.endswith("QC"):
+            continue  # profile-level flags (e.g. POSITIONQC) are not stored per level
+        else:
+            params[c] = i
+    return meta, level, params, qc
+
+def register_parameters(conn, names, source_names=None):
+    """
+    Return {name: parameter_id}, adding unknown names to the dictionary together with
+    their partial covering index.
+    """
+    source_names = source_names or {}
+    if not names:
+        return {}
+    with conn.cursor() as cur:
+        created = execute_values(cur, """
+            INSERT INTO bgc_parameters (name, source_name, units) VALUES %s
+            ON CONFLICT (name) DO NOTHING
+            RETURNING parameter_id, name;
+        """, [(n, source_names.get(n), KNOWN_UNITS.get(n)) for n in names], fetch=True)
+        for pid, name in created:
+            cur.execute(f"""
+                CREATE INDEX IF NOT EXISTS ix_bgc_values_param_{pid}
+                ON bgc_values (profile_id, pres) INCLUDE (value, qc)
+                WHERE parameter_id = {pid};
+            """)
+        cur.execute("SELECT name, parameter_id FROM bgc_parameters WHERE name = ANY(%s);", (list(names),))
+        ids = dict(cur.fetchall())
+        conn.commit()
+    if created:
+        print(f"✅ Registered BGC parameters: {', '.join(n for _, n in created)}")
+    return ids
+
+# ---------- Loading ----------
+def _text(v):
+    if v is None:
+        return None
+    s = str(v).strip()
+    if s.startswith("b'") and s.endswith("'"):
+        s = s[2:-1].strip()
+    return s or None
+
+def _number(v):
+    if v is None or v == "":
+        return None
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+def _int(v):
+    f = _number(_text(v))
+    return int(f) if f is not None else None
+
+def load_records(conn, records, cols, param_ids):
+    """
+    Load wide BGC record tuples (in cols order, as built by BGC.py) in long format.
+    Returns the number of (level, parameter) values written. One transaction.
+    """
+    if not records:
+        return 0
+    meta, level, params, qc = split_columns(cols)
+
+    def m(rec, name):
+        i = meta.get(name)
+        return rec[i] if i is not None else None
+
+    headers = {}
+    for rec in records:
+        key = (_text(m(rec, "platform_number")), _int(m(rec, "cycle_number")), _text(m(rec, "direction")) or "A")
+        if key[0] is None or key[1] is None:
+            continue
+        lat, lon = _number(m(rec, "latitude")), _number(m(rec, "longitude"))
+        headers[key] = key + (_text(m(rec, "data_mode")), _text(m(rec, "platform_type")),
+                              _text(m(rec, "date_creation")), m(rec, "juld"), lat, lon, lon, lat)
+
+    with conn.cursor() as cur:
+        returned = execute_values(cur, PROFILE_UPSERT_SQL, list(headers.values()), template=PROFILE_TEMPLATE,
+                                  fetch=True)
+        profile_ids = {(r[0], r[1], r[2]): r[3] for r in returned}
+
+        values = {}
+        for rec in records:
+            key = (_text(m(rec, "platform_number")), _int(m(rec, "cycle_number")), _text(m(rec, "direction")) or "A")
+            pid = profile_ids.get(key)
+            pres = _number(rec[level]) if level is not None else None
+            juld = m(rec, "juld")
+            if pid is None or pres is None or juld is None:
+                continue
+            for name, i in params.items():
+                value = _number(rec[i])
+                if value is None:
+                    continue
+                flag = _int(rec[qc[name]]) if name in qc else None
+                # last one wins for a repeated (profile, parameter, pres), like deduplicate_batch
+                values[(pid, param_ids[name], pres)] = (pid, juld, pres, param_ids[name], value, flag)
+
+        # grouped by parameter, so each parameter's rows land on their own pages
+        rows = sorted(values.values(), key=lambda r: (r[3], r[0], r[2]))
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for r in rows:
+            writer.writerow([r[0], r[1].isoformat(), r[2], r[3], r[4], r[5]])
+        buf.seek(0)
+        cur.execute(STAGING_SQL)
+        cur.copy_expert(COPY_SQL, buf)
+        cur.execute(MERGE_SQL)
+        conn.commit()
+    return len(rows)
+
+# ---------- Queries ----------
+def parameter_in_region(conn, parameter, lon_min, lat_min, lon_max, lat_max, start=None, end=None):
+    """
+    [(platform_number, cycle_number, juld, latitude, longitude, pres, value, qc)] of one
+    parameter inside a lon/lat box, e.g. CHLA in the Bay of Bengal: (80, 5, 95, 23).
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT parameter_id FROM bgc_parameters WHERE name = %s;", (parameter,))
+        row = cur.fetchone()
+    if row is None:
+        return []
+    # the id is inlined (not a bind parameter) so the planner can match the partial index
+    sql = f"""
+        SELECT p.platform_number, p.cycle_number, p.juld, p.latitude, p.longitude, v.pres, v.value, v.qc
+        FROM bgc_profiles p
+        JOIN bgc_values v ON v.profile_id = p.profile_id
+        WHERE v.parameter_id = {int(row[0])}
+          AND p.location && ST_MakeEnvelope(%(lon_min)s, %(lat_min)s, %(lon_max)s, %(lat_max)s, 4326)::geography
+    """
+    params = {"lon_min": lon_min, "lat_min": lat_min, "lon_max": lon_max, "lat_max": lat_max}
+    if start is not None:
+        sql += " AND p.juld >= %(start)s AND v.juld >= %(start)s"
+        params["start"] = start
+    if end is not None:
+        sql += " AND p.juld < %(end)s AND v.juld < %(end)s"
+        params["end"] = end
+    sql += " ORDER BY p.juld, p.platform_number, v.pres;"
+    with conn.cursor() as cur:
+        cur.execute(sql, params)
+        return cur.fetchall()
@@ -4,22 +4,59 @@ bulk_import.py
 
 Ingest a folder of CSVs (each CSV ~ one profile with ~500 rows) into Postgres (TimescaleDB + PostGIS).
 - Creates schema + hypertable + indices if not present.
-- Inserts in batches using execute_values.
+- Inserts in batches using execute_values, or streams batches through COPY into a
+  temporary staging table (ON COMMIT DELETE ROWS, one per connection) and merges them
+  with one set-based INSERT (--loader copy).
 - Uses ON CONFLICT (platform_number, juld, pres) DO UPDATE to avoid duplicates.
-- Computes location (geography POINT) in the DB after insert.
+- Computes location (geography POINT) as part of the insert; --backfill-locations fills
+  older rows chunk by chunk.
 - Deduplicates rows in each batch by (platform_number, juld, pres) to avoid conflict errors.
+- Keeps argo_profiles (one row per profile, levels as arrays) in step, in the same
+  transaction as each batch (argo_profiles.py), and its profile_metrics summary (mixed layer,
+  thermocline, surface / 1000 m values; profile_metrics.py) and standard-level copy
+  (argo_std_profiles, interpolated onto fixed pressures; standard_levels.py).
+- --loader replace swaps whole (platform_number, cycle_number) profiles per batch so delayed-mode
+  files supersede real-time ones without leaving stale pressure levels behind.
+- Rejected rows (e.g. bad juld) go to ingest_rejects with file, line and reason, written per batch.
+- --qc runs vectorized range / pressure / duplicate-level / spike / gradient checks on each
+  batch and stores pres_qc, temp_qc, psal_qc with the rows (ingest_qc.py).
+- --derive stores TEOS-10 depth, absolute salinity, conservative temperature and sigma0
+  computed per batch (teos10.py); --backfill-derived fills existing chunks.
+- --decoder vectorized decodes whole columns with pandas instead of per-cell helpers;
+  --decoder netcdf loads Argo profile .nc files instead of CSVs (netcdf_import.py).
+- Optionally shards the file list across a process pool (--workers N), one connection per worker,
+  or overlaps parsing and inserting with reader threads and writer connections (--pipeline).
+- --metrics-json / --metrics-prom write per-stage timings, rows/s, batch latency histogram and
+  conflict counts (ingest_metrics.py).
+- --watch keeps running and loads new files in micro-batches as they land (ingest_watch.py).
 """
 
 import os
+import io
 import glob
 import csv
+import time
 import argparse
+import functools
+import multiprocessing
+import multiprocessing.util
+from collections import Counter
 from datetime import datetime
 import psycopg2
 from psycopg2.extras import execute_values
+from argo_profiles import ensure_profiles, juld_bounds, profile_keys, refresh_profiles
+from profile_metrics import ensure_metrics, refresh_metrics
+from standard_levels import ensure_std_levels, refresh_std_levels
+from ingest_metrics import METRICS
+from ingest_qc import QC_COLUMNS, with_qc
+from teos10 import DERIVED_COLUMNS, backfill_derived, with_derived
+from ingest_pipeline import run_pipeline
+from ingest_rejects import BAD_JULD, Reject, RejectLog, ensure_rejects, is_reject
+from ingest_rejects import print_summary as print_rejects_summary
 
 # ---------- CONFIG ----------
 DEFAULT_BATCH_SIZE = 5000
+TABLE_NAME = "argo_data"
 
 # ---------- Helpers ----------
 def clean_text(val):
@@ -91,10 +128,21 @@ CREATE TABLE IF NOT EXISTS argo_data (
     psal DOUBLE PRECISION,
     location GEOGRAPHY(Point, 4326)
 );
+
+-- QC flags of the --qc stage (ingest_qc.py); NULL = not checked
+ALTER TABLE argo_data ADD COLUMN IF NOT EXISTS pres_qc SMALLINT;
+ALTER TABLE argo_data ADD COLUMN IF NOT EXISTS temp_qc SMALLINT;
+ALTER TABLE argo_data ADD COLUMN IF NOT EXISTS psal_qc SMALLINT;
+
+-- TEOS-10 columns of --derive (teos10.py); NULL = not derived
+ALTER TABLE argo_data ADD COLUMN IF NOT EXISTS depth DOUBLE PRECISION;
+ALTER TABLE argo_data ADD COLUMN IF NOT EXISTS abs_salinity DOUBLE PRECISION;
+ALTER TABLE argo_data ADD COLUMN IF NOT EXISTS cons_temp DOUBLE PRECISION;
+ALTER TABLE argo_data ADD COLUMN IF NOT EXISTS sigma0 DOUBLE PRECISION;
 """
 
 def ensure_schema(conn):
-    with conn.cursor() as cur:
+    with METRICS.stage("schema"), conn.cursor() as cur:
         cur.execute(SCHEMA_SQL)
         conn.commit()
 
@@ -113,6 +161,13 @@ def ensure_schema(conn):
         """)
         conn.commit()
 
+        # profile lookups for --loader replace
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_argo_platform_cycle
+            ON argo_data (platform_number, cycle_number);
+        """)
+        conn.commit()
+
         cur.execute("""
             DO $$
             BEGIN
@@ -127,121 +182,554 @@ def ensure_schema(conn):
         conn.commit()
 
         print("✅ Schema, hypertable and indexes ensured.")
+    ensure_rejects(conn)
+    with METRICS.stage("schema"):
+        ensure_profiles(conn)
+        ensure_metrics(conn)
+        ensure_std_levels(conn)
 
 # ---------- Insert batch ----------
+# The geography point is written by the INSERT itself (ST_MakePoint is strict, so a
+# missing coordinate yields NULL) instead of a follow-up UPDATE over the whole table.
+LOCATION_SQL = "ST_SetSRID(ST_MakePoint({lon}, {lat}), 4326)::GEOGRAPHY"
+
+# The upserts report how many rows were new: xmax = 0 only for freshly inserted row
+# versions, so the rest were conflicts resolved by DO UPDATE.
 INSERT_SQL = """
-INSERT INTO argo_data (
-    platform_number, cycle_number, direction, date_creation,
-    platform_type, juld, latitude, longitude,
-    data_mode, pres, temp, psal
-) VALUES %s
-ON CONFLICT (platform_number, juld, pres) DO UPDATE SET
-    temp = EXCLUDED.temp,
-    psal = EXCLUDED.psal,
-    date_creation = COALESCE(EXCLUDED.date_creation, argo_data.date_creation),
-    data_mode = COALESCE(EXCLUDED.data_mode, argo_data.data_mode),
-    latitude = COALESCE(EXCLUDED.latitude, argo_data.latitude),
-    longitude = COALESCE(EXCLUDED.longitude, argo_data.longitude);
+WITH upserted AS (
+    INSERT INTO argo_data (
+        platform_number, cycle_number, direction, date_creation,
+        platform_type, juld, latitude, longitude,
+        data_mode, pres, temp, psal,
+        pres_qc, temp_qc, psal_qc,
+        depth, abs_salinity, cons_temp, sigma0, location
+    ) VALUES %s
+    ON CONFLICT (platform_number, juld, pres) DO UPDATE SET
+        temp = EXCLUDED.temp,
+        psal = EXCLUDED.psal,
+        pres_qc = EXCLUDED.pres_qc,
+        temp_qc = EXCLUDED.temp_qc,
+        psal_qc = EXCLUDED.psal_qc,
+        depth = EXCLUDED.depth,
+        abs_salinity = EXCLUDED.abs_salinity,
+        cons_temp = EXCLUDED.cons_temp,
+        sigma0 = EXCLUDED.sigma0,
+        date_creation = COALESCE(EXCLUDED.date_creation, argo_data.date_creation),
+        data_mode = COALESCE(EXCLUDED.data_mode, argo_data.data_mode),
+        latitude = COALESCE(EXCLUDED.latitude, argo_data.latitude),
+        longitude = COALESCE(EXCLUDED.longitude, argo_data.longitude),
+        location = COALESCE(EXCLUDED.location, argo_data.location)
+    RETURNING (xmax = 0) AS inserted
+)
+SELECT count(*) FILTER (WHERE inserted) FROM upserted;
 """
 
-def deduplicate_batch(batch):
-    # keep only the last row for each (platform_number, juld, pres)
+# 12 record columns, 3 QC flags, 4 TEOS-10 columns, then (longitude, latitude) again for the point
+INSERT_TEMPLATE = "(" + ", ".join(["%s"] * 19) + ", " + LOCATION_SQL.format(lon="%s", lat="%s") + ")"
+
+def deduplicate_batch(batch, qc=False):
+    # keep only the last row for each (platform_number, juld, pres); with QC on, test 8
+    # flags every repeat of a level BAD, so a copy never replaces one with a better pres_qc
     unique = {}
+    pres_qc = len(COLUMNS) + QC_COLUMNS.index("pres_qc")
     for r in batch:
         key = (r[0], r[5], r[9])
+        kept = unique.get(key)
+        if qc and kept is not None and r[pres_qc] > kept[pres_qc]:
+            continue
         unique[key] = r
     return list(unique.values())
 
-def insert_batch(conn, rows):
+def refresh_derived(cur, rows):
+    """
+    Rebuild the per-profile tables for every profile the batch touched, on the batch's
+    own transaction. Returns the seconds spent (kept out of the insert stage).
+    """
+    t0 = time.perf_counter()
+    keys, bounds = profile_keys(rows), juld_bounds(rows)
+    refresh_profiles(cur, keys, bounds)
+    refresh_metrics(cur, keys, bounds)
+    refresh_std_levels(cur, keys, bounds)
+    elapsed = time.perf_counter() - t0
+    if METRICS.enabled:
+        METRICS.add_time("profiles", elapsed)
+    return elapsed
+
+def prepare_rows(rows, qc=False, derive=False):
+    """Append the QC flags and TEOS-10 columns (NULLs for the stages that are off)."""
+    # before dedupe, so a duplicated level is still visible to the QC
+    with METRICS.stage("qc"):
+        rows = with_qc(rows, qc)
+    with METRICS.stage("derive"):
+        rows = with_derived(rows, derive)
+    return rows
+
+def insert_batch(conn, rows, qc=False, derive=False):
     if not rows:
         return 0
-    rows = deduplicate_batch(rows)
+    rows = prepare_rows(rows, qc, derive)
+    with METRICS.stage("dedupe"):
+        rows = deduplicate_batch(rows, qc)
+    t0 = time.perf_counter()
     with conn.cursor() as cur:
-        execute_values(cur, INSERT_SQL, rows, page_size=1000)
+        # one count per page of 1000 rows
+        pages = execute_values(cur, INSERT_SQL, [r + (r[7], r[6]) for r in rows],
+                               template=INSERT_TEMPLATE, page_size=1000, fetch=True)
+        derived_s = refresh_derived(cur, rows)
         conn.commit()
+    latency = time.perf_counter() - t0
+    METRICS.observe_batch(latency, len(rows), sum(p[0] for p in pages), insert_s=latency - derived_s)
+    return len(rows)
+
+# ---------- COPY loader ----------
+COLUMNS = [
+    "platform_number", "cycle_number", "direction", "date_creation",
+    "platform_type", "juld", "latitude", "longitude",
+    "data_mode", "pres", "temp", "psal",
+]
+# what the loaders write: the record columns plus what prepare_rows appends
+LOAD_COLUMNS = COLUMNS + QC_COLUMNS + DERIVED_COLUMNS
+
+# Temporary tables are never WAL-logged and are private to the session, so
+# concurrent importers each get their own staging area.  ON COMMIT DELETE ROWS
+# empties it once the merge has committed.
+STAGING_SQL = """
+CREATE TEMP TABLE IF NOT EXISTS argo_data_staging (
+    platform_number TEXT,
+    cycle_number INT,
+    direction TEXT,
+    date_creation TIMESTAMPTZ,
+    platform_type TEXT,
+    juld TIMESTAMPTZ,
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION,
+    data_mode TEXT,
+    pres DOUBLE PRECISION,
+    temp DOUBLE PRECISION,
+    psal DOUBLE PRECISION,
+    pres_qc SMALLINT,
+    temp_qc SMALLINT,
+    psal_qc SMALLINT,
+    depth DOUBLE PRECISION,
+    abs_salinity DOUBLE PRECISION,
+    cons_temp DOUBLE PRECISION,
+    sigma0 DOUBLE PRECISION
+) ON COMMIT DELETE ROWS;
+"""
+
+COPY_SQL = f"COPY argo_data_staging ({', '.join(LOAD_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+
+# Returns (rows inserted, rows merged), see INSERT_SQL
+MERGE_SQL = f"""
+WITH upserted AS (
+    INSERT INTO argo_data ({', '.join(LOAD_COLUMNS)}, location)
+    SELECT {', '.join(LOAD_COLUMNS)}, {LOCATION_SQL.format(lon="longitude", lat="latitude")}
+    FROM argo_data_staging
+    ON CONFLICT (platform_number, juld, pres) DO UPDATE SET
+        temp = EXCLUDED.temp,
+        psal = EXCLUDED.psal,
+        pres_qc = EXCLUDED.pres_qc,
+        temp_qc = EXCLUDED.temp_qc,
+        psal_qc = EXCLUDED.psal_qc,
+        depth = EXCLUDED.depth,
+        abs_salinity = EXCLUDED.abs_salinity,
+        cons_temp = EXCLUDED.cons_temp,
+        sigma0 = EXCLUDED.sigma0,
+        date_creation = COALESCE(EXCLUDED.date_creation, argo_data.date_creation),
+        data_mode = COALESCE(EXCLUDED.data_mode, argo_data.data_mode),
+        latitude = COALESCE(EXCLUDED.latitude, argo_data.latitude),
+        longitude = COALESCE(EXCLUDED.longitude, argo_data.longitude),
+        location = COALESCE(EXCLUDED.location, argo_data.location)
+    RETURNING (xmax = 0) AS inserted
+)
+SELECT count(*) FILTER (WHERE inserted), count(*) FROM upserted;
+"""
+
+def rows_to_csv(rows):
+    """Serialize record tuples for COPY (None becomes an unquoted empty field, i.e. NULL)."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for r in rows:
+        writer.writerow([v.isoformat() if isinstance(v, datetime) else v for v in r])
+    buf.seek(0)
+    return buf
+
+def copy_batch(conn, rows, qc=False, derive=False):
+    if not rows:
+        return 0
+    rows = prepare_rows(rows, qc, derive)
+    with METRICS.stage("dedupe"):
+        rows = deduplicate_batch(rows, qc)
+    t0 = time.perf_counter()
     with conn.cursor() as cur:
-        cur.execute("""
-            UPDATE argo_data
-            SET location = ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::GEOGRAPHY
-            WHERE location IS NULL AND longitude IS NOT NULL AND latitude IS NOT NULL;
-        """)
+        cur.execute(STAGING_SQL)
+        cur.copy_expert(COPY_SQL, rows_to_csv(rows))
+        cur.execute(MERGE_SQL)
+        inserted, _ = cur.fetchone()
+        derived_s = refresh_derived(cur, rows)
         conn.commit()
+    latency = time.perf_counter() - t0
+    METRICS.observe_batch(latency, len(rows), inserted, insert_s=latency - derived_s)
     return len(rows)
 
+# ---------- Profile replace loader ----------
+# A delayed-mode (D) file re-delivers a whole profile, often on other pressure levels than
+# the real-time (R) one, so the per-level upsert would leave stale R levels behind.
+# replace_batch swaps complete (platform_number, cycle_number) profiles instead, in one
+# transaction per batch: D supersedes A supersedes R, never the other way round, and an
+# equal mode replaces (quarterly D reprocessing).  It relies on a batch never holding part
+# of a profile, so ingest cuts batches at file boundaries for these loaders.
+WHOLE_PROFILE_LOADERS = {"replace"}
+
+def _mode_rank(col):
+    return f"CASE {col} WHEN 'D' THEN 2 WHEN 'A' THEN 1 ELSE 0 END"
+
+REPLACE_SQL = f"""
+-- concurrent writers touching the same profiles take turns (sorted, so no deadlocks)
+SELECT pg_advisory_xact_lock(hashtext(platform_number || '/' || cycle_number))
+FROM (
+    SELECT DISTINCT platform_number, cycle_number FROM argo_data_staging
+    WHERE platform_number IS NOT NULL AND cycle_number IS NOT NULL
+    ORDER BY 1, 2
+) keys;
+
+-- staged profiles already stored at a higher processing level are not loaded
+DELETE FROM argo_data_staging s
+USING argo_data a
+WHERE a.platform_number = s.platform_number AND a.cycle_number = s.cycle_number
+  AND {_mode_rank("a.data_mode")} > {_mode_rank("s.data_mode")};
+
+-- stored profiles being superseded are removed level set and all
+DELETE FROM argo_data a
+USING (
+    SELECT platform_number, cycle_number, max({_mode_rank("data_mode")}) AS mode_rank
+    FROM argo_data_staging
+    GROUP BY platform_number, cycle_number
+) p
+WHERE a.platform_number = p.platform_number AND a.cycle_number = p.cycle_number
+  AND {_mode_rank("a.data_mode")} <= p.mode_rank;
+"""
+
+def replace_batch(conn, rows, qc=False, derive=False):
+    if not rows:
+        return 0
+    rows = prepare_rows(rows, qc, derive)
+    with METRICS.stage("dedupe"):
+        rows = deduplicate_batch(rows, qc)
+    t0 = time.perf_counter()
+    with conn.cursor() as cur:
+        cur.execute(STAGING_SQL)
+        cur.copy_expert(COPY_SQL, rows_to_csv(rows))
+        cur.execute(REPLACE_SQL)
+        # rows without a profile key (or colliding with another cycle) still go through the upsert
+        cur.execute(MERGE_SQL)
+        inserted, merged = cur.fetchone()
+        derived_s = refresh_derived(cur, rows)
+        conn.commit()
+    latency = time.perf_counter() - t0
+    METRICS.observe_batch(latency, merged, inserted, insert_s=latency - derived_s)
+    return merged
+
+LOADERS = {
+    "values": insert_batch,
+    "copy": copy_batch,
+    "replace": replace_batch,
+}
+
+def get_loader(loader, qc=False, derive=False):
+    """LOADERS[loader], with the QC and TEOS-10 stages switched on as asked."""
+    if qc or derive:
+        return functools.partial(LOADERS[loader], qc=qc, derive=derive)
+    return LOADERS[loader]
+
+# ---------- Location backfill ----------
+def backfill_locations(conn, table="argo_data"):
+    """
+    One-off fill of location for rows loaded before it was computed at insert time.
+    Runs one UPDATE + commit per hypertable chunk so no statement scans the whole table
+    and progress survives an interruption.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT show_chunks(%s::regclass)::text;", (table,))
+        chunks = [r[0] for r in cur.fetchall()]
+
+    print(f"Backfilling location over {len(chunks)} chunks of {table}...")
+    total = 0
+    for i, chunk in enumerate(chunks, 1):
+        with METRICS.stage("location_backfill"), conn.cursor() as cur:
+            cur.execute(f"""
+                UPDATE {chunk}
+                SET location = {LOCATION_SQL.format(lon="longitude", lat="latitude")}
+                WHERE location IS NULL AND longitude IS NOT NULL AND latitude IS NOT NULL;
+            """)
+            updated = cur.rowcount
+        conn.commit()
+        total += updated
+        print(f"  [{i}/{len(chunks)}] {chunk}: {updated} rows")
+    print(f"✅ Location backfill done ({total} rows updated).")
+    return total
+
 # ---------- Main ingestion ----------
-def ingest_folder(conn, folder_path, batch_size=DEFAULT_BATCH_SIZE, pattern="*.csv"):
-    csv_paths = sorted(glob.glob(os.path.join(folder_path, pattern)))
-    if not csv_paths:
-        print("No CSV files found at", folder_path)
-        return
+def parse_row(row):
+    """Convert a csv.DictReader row into an argo_data record tuple (None if juld is bad)."""
+    juld = parse_datetime(row.get('juld'))
+    if not juld:
+        return None
+    return (
+        clean_text(row.get('platform_number')),
+        safe_int(row.get('cycle_number')),
+        clean_text(row.get('direction')),
+        parse_datetime(row.get('date_creation')),
+        clean_text(row.get('platform_type')),
+        juld,
+        safe_float(row.get('latitude')),
+        safe_float(row.get('longitude')),
+        clean_text(row.get('data_mode')),
+        safe_float(row.get('pres')),
+        safe_float(row.get('temp')),
+        safe_float(row.get('psal'))
+    )
 
-    total_files = len(csv_paths)
-    print(f"Found {total_files} files. Starting ingestion (batch_size={batch_size})...")
+def iter_records(path):
+    """Stream one CSV file: yields a record tuple per row, or a Reject for a row with a bad juld."""
+    with open(path, newline='', encoding='utf-8') as fh:
+        reader = csv.DictReader(fh)
+        parse = METRICS.timed(parse_row, "parse")
+        for row in METRICS.timed_iter(reader, "read"):
+            rec = parse(row)
+            yield rec if rec is not None else Reject(reader.line_num, BAD_JULD, row)
+
+def get_decoder(decoder):
+    """
+    decoder is "python", "vectorized", "netcdf" (Argo profile .nc files, netcdf_import.py)
+    or a callable with the iter_records(path) contract.
+    """
+    if callable(decoder):
+        return decoder
+    if decoder == "vectorized":
+        # pandas is only needed for this path
+        import csv_decode
+        return csv_decode.iter_records
+    if decoder == "netcdf":
+        # xarray too; netcdf_import imports this module, so not at the top
+        import netcdf_import
+        return netcdf_import.iter_netcdf_records
+    return iter_records
 
+def ingest_files(conn, csv_paths, batch_size=DEFAULT_BATCH_SIZE, loader="values", total_files=None,
+                 decoder="python", file_rows=None, qc=False, derive=False):
+    """
+    Ingest the given CSV files over one connection and return the counters.
+    total_files is only used for the progress prefix; pass None to print bare file names.
+    file_rows, if given, is filled with {path: source rows read}.
+    qc runs the vectorized QC stage on every batch (ingest_qc.py), derive adds the
+    TEOS-10 columns (teos10.py).
+    """
+    load_batch = get_loader(loader, qc, derive)
+    decode_file = get_decoder(decoder)
+    # replace loaders must see each file's profile in one batch
+    whole_files = loader in WHOLE_PROFILE_LOADERS
     batch = []
-    file_count = 0
-    total_rows = 0
-    skipped_rows = 0
+    rejects = RejectLog(TABLE_NAME)
+    stats = {"files": 0, "rows": 0, "skipped": 0, "rejects": rejects.counts}
+
+    def flush():
+        inserted = load_batch(conn, batch)
+        with METRICS.stage("rejects"):
+            rejects.flush(conn)
+        stats["rows"] += inserted
+        print(f"  inserted batch of {inserted} rows (total inserted: {stats['rows']})")
 
     for path in csv_paths:
-        file_count += 1
-        with open(path, newline='', encoding='utf-8') as fh:
-            reader = csv.DictReader(fh)
-            rows_in_file = 0
-            for row in reader:
-                rows_in_file += 1
-                juld = parse_datetime(row.get('juld'))
-                if not juld:
-                    skipped_rows += 1
-                    continue
-                rec = (
-                    clean_text(row.get('platform_number')),
-                    safe_int(row.get('cycle_number')),
-                    clean_text(row.get('direction')),
-                    parse_datetime(row.get('date_creation')),
-                    clean_text(row.get('platform_type')),
-                    juld,
-                    safe_float(row.get('latitude')),
-                    safe_float(row.get('longitude')),
-                    clean_text(row.get('data_mode')),
-                    safe_float(row.get('pres')),
-                    safe_float(row.get('temp')),
-                    safe_float(row.get('psal'))
-                )
-                batch.append(rec)
-
-                if len(batch) >= batch_size:
-                    inserted = insert_batch(conn, batch)
-                    total_rows += inserted
-                    print(f"  inserted batch of {inserted} rows (total inserted: {total_rows})")
-                    batch = []
-
-        print(f"[{file_count}/{total_files}] processed '{os.path.basename(path)}' ({rows_in_file} rows)")
+        stats["files"] += 1
+        rows_in_file = 0
+        for rec in decode_file(path):
+            rows_in_file += 1
+            if is_reject(rec):
+                stats["skipped"] += 1
+                rejects.add(path, rec)
+                continue
+            batch.append(rec)
+
+            if not whole_files and len(batch) >= batch_size:
+                flush()
+                batch = []
+
+        if whole_files and len(batch) >= batch_size:
+            flush()
+            batch = []
+
+        if file_rows is not None:
+            file_rows[path] = rows_in_file
+        prefix = f"[{stats['files']}/{total_files}] " if total_files else f"[pid {os.getpid()}] "
+        print(f"{prefix}processed '{os.path.basename(path)}' ({rows_in_file} rows)")
 
     if batch:
-        inserted = insert_batch(conn, batch)
-        total_rows += inserted
+        inserted = load_batch(conn, batch)
+        stats["rows"] += inserted
         print(f"Inserted final batch of {inserted} rows.")
+    with METRICS.stage("rejects"):
+        rejects.flush(conn)
+
+    return stats
 
+# ---------- Worker pool ----------
+_worker_conn = None
+
+def _init_worker(dsn, metrics=False):
+    """Pool initializer: every worker process keeps a single connection for its lifetime."""
+    global _worker_conn
+    _worker_conn = psycopg2.connect(dsn)
+    # closed when the worker exits normally (pool.close/join), so the server sees a clean disconnect
+    multiprocessing.util.Finalize(None, _worker_conn.close, exitpriority=10)
+    METRICS.enabled = metrics
+
+def _ingest_shard(args):
+    csv_paths, batch_size, loader, decoder, qc, derive = args
+    METRICS.reset()
+    stats = ingest_files(_worker_conn, csv_paths, batch_size=batch_size, loader=loader, decoder=decoder, qc=qc,
+                         derive=derive)
+    if METRICS.enabled:
+        # merged into the parent's registry by ingest_folder
+        stats["metrics"] = METRICS.snapshot()
+    return stats
+
+def shard_paths(csv_paths, workers):
+    """Split the file list into ~4 shards per worker so fast workers pick up the slack."""
+    shard_size = max(1, len(csv_paths) // (workers * 4))
+    return [csv_paths[i:i + shard_size] for i in range(0, len(csv_paths), shard_size)]
+
+def ingest_folder(conn, folder_path, batch_size=DEFAULT_BATCH_SIZE, pattern="*.csv", loader="values",
+                  workers=1, dsn=None, decoder="python", pipeline=None, qc=False, derive=False):
+    """
+    pipeline: None for the sequential / --workers paths, or a dict with readers, writers
+    and queue_size to overlap parsing and inserting (see ingest_pipeline.py).
+    """
+    csv_paths = sorted(glob.glob(os.path.join(folder_path, pattern)))
+    if not csv_paths:
+        print(f"No files matching '{pattern}' found at", folder_path)
+        return
+
+    total_files = len(csv_paths)
+    print(f"Found {total_files} files. Starting ingestion "
+          f"(batch_size={batch_size}, loader={loader}, workers={workers}, decoder={getattr(decoder, '__name__', decoder)})...")
+
+    started = time.perf_counter()
+    if pipeline:
+        if dsn is None:
+            raise ValueError("--pipeline needs a connection string so each writer can open its own connection")
+        stats = run_pipeline(csv_paths, get_decoder(decoder), get_loader(loader, qc, derive), lambda: psycopg2.connect(dsn),
+                             batch_size, reject_table=TABLE_NAME, whole_files=loader in WHOLE_PROFILE_LOADERS,
+                             **pipeline)
+    elif workers <= 1:
+        stats = ingest_files(conn, csv_paths, batch_size=batch_size, loader=loader, total_files=total_files,
+                             decoder=decoder, qc=qc, derive=derive)
+    else:
+        if dsn is None:
+            raise ValueError("--workers needs a connection string so each worker can open its own connection")
+        stats = {"files": 0, "rows": 0, "skipped": 0, "rejects": Counter()}
+        shards = [(shard, batch_size, loader, decoder, qc, derive) for shard in shard_paths(csv_paths, workers)]
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(dsn, METRICS.enabled)) as pool:
+            for shard_stats in pool.imap_unordered(_ingest_shard, shards):
+                if "metrics" in shard_stats:
+                    METRICS.merge(shard_stats.pop("metrics"))
+                for key, value in shard_stats.items():
+                    stats[key] += value
+                print(f"[{stats['files']}/{total_files}] files done "
+                      f"(total inserted: {stats['rows']}, skipped: {stats['skipped']})")
+            pool.close()
+            pool.join()
+
+    elapsed = time.perf_counter() - started
     print("---- Done ----")
-    print(f"Files processed: {file_count}")
-    print(f"Total rows inserted/updated: {total_rows}")
-    print(f"Rows skipped due to bad juld: {skipped_rows}")
+    print(f"Files processed: {stats['files']}")
+    print(f"Total rows inserted/updated: {stats['rows']}")
+    print_rejects_summary(stats["rejects"])
+    print(f"Elapsed: {elapsed:.1f}s ({stats['rows'] / elapsed if elapsed > 0 else 0:.0f} rows/s, "
+          f"loader={loader}, workers={workers})")
+    METRICS.count("files", stats["files"])
+    METRICS.count("rejected", sum(stats["rejects"].values()))
+    if METRICS.report():
+        print(f"Metrics written to {', '.join(p for p in (METRICS.json_path, METRICS.prom_path) if p)}")
 
 # ---------- CLI ----------
 def main():
     parser = argparse.ArgumentParser(description="Bulk ingest CSV folder into argo_data (TimescaleDB+PostGIS).")
-    parser.add_argument("--folder", "-f", required=True, help="Path to folder containing CSV files.")
+    parser.add_argument("--folder", "-f", help="Path to folder containing CSV files.")
     parser.add_argument("--db", "-d", default="dbname=argo_db user=postgres password=1212 host=localhost port=5432", help="psycopg2 connection string (or use env vars).")
     parser.add_argument("--batch", "-b", type=int, default=DEFAULT_BATCH_SIZE, help="Batch size for inserts.")
-    parser.add_argument("--pattern", "-p", default="*.csv", help="glob pattern for files (default *.csv).")
+    parser.add_argument("--pattern", "-p", help="glob pattern for files (default *.csv, *.nc with --decoder netcdf).")
+    parser.add_argument("--loader", "-l", choices=sorted(LOADERS), default="values",
+                        help="values = execute_values upsert; copy = COPY into staging table + set-based merge; "
+                             "replace = copy, but whole (platform_number, cycle_number) profiles are replaced "
+                             "(D supersedes A supersedes R).")
+    parser.add_argument("--workers", "-w", type=int, default=1,
+                        help="Number of worker processes, each with its own DB connection (default 1).")
+    parser.add_argument("--decoder", choices=["python", "vectorized", "netcdf"], default="python",
+                        help="python = per-cell helpers; vectorized = column-at-a-time pandas decoder (csv_decode.py); "
+                             "netcdf = Argo profile NetCDF files (netcdf_import.py).")
+    parser.add_argument("--qc", action="store_true",
+                        help="Run range, pressure, duplicate-level, spike and gradient checks on every batch "
+                             "and store pres_qc/temp_qc/psal_qc with the rows (ingest_qc.py).")
+    parser.add_argument("--derive", action="store_true",
+                        help="Store TEOS-10 depth, abs_salinity, cons_temp and sigma0 with the rows (teos10.py, needs gsw).")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Overlap parsing and inserting: reader threads feed a bounded queue drained by writer connections.")
+    parser.add_argument("--readers", type=int, default=2, help="Reader threads in --pipeline mode (default 2).")
+    parser.add_argument("--writers", type=int, default=2, help="Writer connections in --pipeline mode (default 2).")
+    parser.add_argument("--queue-size", type=int, default=4, help="Batches buffered between readers and writers (default 4).")
+    parser.add_argument("--metrics-json", help="Write per-stage timings, rows/s, batch latencies and conflicts here as JSON.")
+    parser.add_argument("--metrics-prom",
+                        help="Write the same metrics as a Prometheus textfile (e.g. for node_exporter's textfile collector).")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running: poll --folder and load new files in micro-batches (see ingest_watch.py).")
+    parser.add_argument("--poll", type=float, default=2.0, help="Seconds between folder polls in --watch mode (default 2).")
+    parser.add_argument("--max-files", type=int, default=200, help="Files per micro-batch in --watch mode (default 200).")
+    parser.add_argument("--max-mb", type=int, default=256, help="MB of files per micro-batch in --watch mode (default 256).")
+    parser.add_argument("--max-wait", type=float, default=10.0,
+                        help="Seconds a ready file may wait for its micro-batch to fill in --watch mode (default 10).")
+    parser.add_argument("--backfill-locations", action="store_true",
+                        help="Fill NULL locations of existing rows chunk by chunk, then exit.")
+    parser.add_argument("--backfill-derived", action="store_true",
+                        help="Compute the TEOS-10 columns of existing rows chunk by chunk, then exit.")
     args = parser.parse_args()
+    backfill = args.backfill_locations or args.backfill_derived
+    if not args.folder and not backfill:
+        parser.error("--folder is required unless --backfill-locations / --backfill-derived is given")
+    if args.pipeline and args.workers > 1:
+        parser.error("--pipeline and --workers are alternative modes; pick one")
+    if args.watch and (args.pipeline or args.workers > 1):
+        parser.error("--watch loads micro-batches over one persistent connection; drop --pipeline/--workers")
+    if args.pattern is None:
+        args.pattern = "*.nc" if args.decoder == "netcdf" else "*.csv"
+    pipeline = ({"readers": args.readers, "writers": args.writers, "queue_size": args.queue_size}
+                if args.pipeline else None)
+
+    METRICS.configure(json_path=args.metrics_json, prom_path=args.metrics_prom)
+
+    if args.watch and not backfill:
+        from ingest_watch import watch_folder
+        watch_folder(args.db, args.folder, pattern=args.pattern, poll_interval=args.poll, max_files=args.max_files,
+                     max_bytes=args.max_mb << 20, max_wait=args.max_wait, table=TABLE_NAME,
+                     ingest_kwargs={"batch_size": args.batch, "loader": args.loader, "decoder": args.decoder,
+                                    "qc": args.qc, "derive": args.derive})
+        return
 
     conn = None
     try:
         conn = psycopg2.connect(args.db)
         ensure_schema(conn)
-        ingest_folder(conn, args.folder, batch_size=args.batch, pattern=args.pattern)
+        if backfill:
+            if args.backfill_locations:
+                backfill_locations(conn)
+            if args.backfill_derived:
+                with METRICS.stage("derive"):
+                    backfill_derived(conn)
+            METRICS.report()
+            return
+        ingest_folder(conn, args.folder, batch_size=args.batch, pattern=args.pattern, loader=args.loader,
+                      workers=args.workers, dsn=args.db, decoder=args.decoder, pipeline=pipeline, qc=args.qc,
+                      derive=args.derive)
     except Exception as e:
         print("❌ Fatal error:", e)
     finally:
@@ -6,22 +6,42 @@ Ingest a folder of CSVs (each CSV ~ one profile with ~500 rows) into Postgres (T
 - Creates schema + hypertable + indices if not present.
 - Inserts in batches using execute_values.
 - Uses ON CONFLICT (platform_number, juld, pres) DO UPDATE to avoid duplicates.
-- Computes location (geography POINT) in the DB after insert.
+- Computes location (geography POINT) as part of the insert.
 - Deduplicates rows in each batch by (platform_number, juld, pres) to avoid conflict errors.
 - Robustly handles UTF-8 / Latin-1 encoding.
-- Skips files that are already fully inserted.
+- Tracks loaded files in ingest_manifest (size, mtime, sha256): unchanged files are
+  skipped without being opened and partial files resume after their last committed batch.
+- Keeps argo_profiles (one row per profile, levels as arrays), profile_metrics and
+  argo_std_profiles in step with each batch.
+- Streams each file row by row (no full-file materialization).
+- Rejected rows (e.g. bad juld) go to ingest_rejects with file, line and reason, written per batch.
+- Optionally shards the file list across a process pool (--workers N), one connection per worker,
+  or overlaps parsing and inserting with reader threads and writer connections (--pipeline).
 """
 
 import os
 import glob
 import csv
 import argparse
+import itertools
+import multiprocessing
+import multiprocessing.util
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import psycopg2
 from psycopg2.extras import execute_values
+from ingest_pipeline import run_pipeline
+from argo_profiles import ensure_profiles, juld_bounds, profile_keys, refresh_profiles
+from profile_metrics import ensure_metrics, refresh_metrics
+from standard_levels import ensure_std_levels, refresh_std_levels
+from ingest_manifest import ensure_manifest, load_manifest, plan_file, record_progress
+from ingest_rejects import BAD_JULD, Reject, RejectLog, ensure_rejects
+from ingest_rejects import print_summary as print_rejects_summary
 
 # ---------- CONFIG ----------
 DEFAULT_BATCH_SIZE = 5000
+TABLE_NAME = "argo_data"
 
 # ---------- Helpers ----------
 def clean_text(val):
@@ -109,6 +129,12 @@ def ensure_schema(conn):
             ON argo_data (platform_number, juld DESC);
         """)
         conn.commit()
+        # per-batch argo_profiles refresh looks levels up by profile
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_argo_platform_cycle
+            ON argo_data (platform_number, cycle_number);
+        """)
+        conn.commit()
         cur.execute("""
             DO $$
             BEGIN
@@ -122,13 +148,17 @@ def ensure_schema(conn):
         """)
         conn.commit()
         print("✅ Schema, hypertable and indexes ensured.")
+    ensure_rejects(conn)
+    ensure_profiles(conn)
+    ensure_metrics(conn)
+    ensure_std_levels(conn)
 
 # ---------- Insert batch ----------
 INSERT_SQL = """
 INSERT INTO argo_data (
     platform_number, cycle_number, direction, date_creation,
     platform_type, juld, latitude, longitude,
-    data_mode, pres, temp, psal
+    data_mode, pres, temp, psal, location
 ) VALUES %s
 ON CONFLICT (platform_number, juld, pres) DO UPDATE SET
     temp = EXCLUDED.temp,
@@ -136,9 +166,13 @@ ON CONFLICT (platform_number, juld, pres) DO UPDATE SET
     date_creation = COALESCE(EXCLUDED.date_creation, argo_data.date_creation),
     data_mode = COALESCE(EXCLUDED.data_mode, argo_data.data_mode),
     latitude = COALESCE(EXCLUDED.latitude, argo_data.latitude),
-    longitude = COALESCE(EXCLUDED.longitude, argo_data.longitude);
+    longitude = COALESCE(EXCLUDED.longitude, argo_data.longitude),
+    location = COALESCE(EXCLUDED.location, argo_data.location);
 """
 
+# 12 record columns followed by (longitude, latitude) again for the geography point
+INSERT_TEMPLATE = "(" + ", ".join(["%s"] * 12) + ", ST_SetSRID(ST_MakePoint(%s, %s), 4326)::GEOGRAPHY)"
+
 def deduplicate_batch(batch):
     unique = {}
     for r in batch:
@@ -151,107 +185,229 @@ def insert_batch(conn, rows):
         return 0
     rows = deduplicate_batch(rows)
     with conn.cursor() as cur:
-        execute_values(cur, INSERT_SQL, rows, page_size=1000)
-        conn.commit()
-    with conn.cursor() as cur:
-        cur.execute("""
-            UPDATE argo_data
-            SET location = ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::GEOGRAPHY
-            WHERE location IS NULL AND longitude IS NOT NULL AND latitude IS NOT NULL;
-        """)
+        execute_values(cur, INSERT_SQL, [r + (r[7], r[6]) for r in rows],
+                       template=INSERT_TEMPLATE, page_size=1000)
+        keys, bounds = profile_keys(rows), juld_bounds(rows)
+        refresh_profiles(cur, keys, bounds)
+        refresh_metrics(cur, keys, bounds)
+        refresh_std_levels(cur, keys, bounds)
         conn.commit()
     return len(rows)
 
 # ---------- Main ingestion ----------
-def ingest_folder(conn, folder_path, batch_size=DEFAULT_BATCH_SIZE, pattern="*.csv"):
-    csv_paths = sorted(glob.glob(os.path.join(folder_path, pattern)))
-    if not csv_paths:
-        print("No CSV files found at", folder_path)
+def iter_csv_rows(path):
+    """
+    Stream csv.DictReader rows without loading the file. UTF-8 is tried first; if the
+    file turns out not to be UTF-8 it is reopened as latin1 and the rows already
+    yielded are skipped.
+    """
+    emitted = 0
+    try:
+        with open(path, newline='', encoding='utf-8') as fh:
+            for row in csv.DictReader(fh):
+                yield row
+                emitted += 1
         return
+    except UnicodeDecodeError:
+        pass
+    with open(path, newline='', encoding='latin1') as fh:
+        for i, row in enumerate(csv.DictReader(fh)):
+            if i >= emitted:
+                yield row
 
-    total_files = len(csv_paths)
-    print(f"Found {total_files} files. Starting ingestion (batch_size={batch_size})...")
+def parse_row(row):
+    """Convert a csv.DictReader row into an argo_data record tuple (None if juld is bad)."""
+    juld = parse_datetime(row.get('juld'))
+    if not juld:
+        return None
+    return (
+        clean_text(row.get('platform_number')),
+        safe_int(row.get('cycle_number')),
+        clean_text(row.get('direction')),
+        parse_datetime(row.get('date_creation')),
+        clean_text(row.get('platform_type')),
+        juld,
+        safe_float(row.get('latitude')),
+        safe_float(row.get('longitude')),
+        clean_text(row.get('data_mode')),
+        safe_float(row.get('pres')),
+        safe_float(row.get('temp')),
+        safe_float(row.get('psal'))
+    )
 
+def ingest_files(conn, csv_paths, manifest, batch_size=DEFAULT_BATCH_SIZE, total_files=None):
+    """
+    Ingest the given CSV files over one connection and return the counters.
+    manifest is the {path: entry} map from ingest_manifest.load_manifest().
+    total_files is only used for the progress prefix; pass None to print bare file names.
+    """
     batch = []
-    file_count = 0
-    total_rows = 0
-    skipped_rows = 0
+    # entry path -> [entry, source rows consumed into uncommitted batches, finished reading]
+    pending = {}
+    rejects = RejectLog(TABLE_NAME)
+    stats = {"files": 0, "rows": 0, "skipped": 0, "already_loaded": 0, "empty": 0, "resumed": 0,
+             "rejects": rejects.counts}
+
+    def flush():
+        inserted = insert_batch(conn, batch)
+        stats["rows"] += inserted
+        rejects.flush(conn)
+        record_progress(conn, TABLE_NAME, [tuple(p) for p in pending.values()])
+        for key in [k for k, p in pending.items() if p[2]]:
+            del pending[key]
+        return inserted
 
     for path in csv_paths:
-        file_count += 1
-        rows_in_file = 0
-        # Attempt UTF-8, fallback to latin1
-        for enc in ['utf-8', 'latin1']:
-            try:
-                with open(path, newline='', encoding=enc) as fh:
-                    reader = csv.DictReader(fh)
-                    rows = list(reader)
-                break
-            except UnicodeDecodeError:
-                if enc == 'latin1':
-                    raise
-        else:
-            print(f"❌ Could not read {os.path.basename(path)}")
-            continue
+        stats["files"] += 1
+        prefix = f"[{stats['files']}/{total_files}] " if total_files else f"[pid {os.getpid()}] "
 
-        if not rows:
-            print(f"[{file_count}/{total_files}] empty file '{os.path.basename(path)}', skipping")
+        entry = plan_file(conn, manifest, TABLE_NAME, path)
+        if entry["skip"]:
+            stats["already_loaded"] += 1
+            print(f"{prefix}already in DB '{os.path.basename(path)}', skipping")
             continue
+        start_row = entry["start_row"]
+        if start_row:
+            stats["resumed"] += 1
+            print(f"{prefix}resuming '{os.path.basename(path)}' after row {start_row}")
 
-        # Check first row in DB to skip fully inserted files
-        first_row = rows[0]
-        platform = clean_text(first_row.get('platform_number'))
-        juld = parse_datetime(first_row.get('juld'))
-        pres = safe_float(first_row.get('pres'))
-        if platform and juld and pres is not None:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT 1 FROM argo_data WHERE platform_number=%s AND juld=%s AND pres=%s LIMIT 1",
-                    (platform, juld, pres)
-                )
-                if cur.fetchone():
-                    print(f"[{file_count}/{total_files}] already in DB '{os.path.basename(path)}', skipping")
-                    continue
-
-        for row in rows:
+        rows_in_file = start_row
+        for row in itertools.islice(iter_csv_rows(path), start_row, None):
             rows_in_file += 1
-            juld = parse_datetime(row.get('juld'))
-            if not juld:
-                skipped_rows += 1
+            pending[entry["path"]] = [entry, rows_in_file, False]
+            rec = parse_row(row)
+            if rec is None:
+                stats["skipped"] += 1
+                # +1 for the header line
+                rejects.add(path, Reject(rows_in_file + 1, BAD_JULD, row))
                 continue
-            rec = (
-                clean_text(row.get('platform_number')),
-                safe_int(row.get('cycle_number')),
-                clean_text(row.get('direction')),
-                parse_datetime(row.get('date_creation')),
-                clean_text(row.get('platform_type')),
-                juld,
-                safe_float(row.get('latitude')),
-                safe_float(row.get('longitude')),
-                clean_text(row.get('data_mode')),
-                safe_float(row.get('pres')),
-                safe_float(row.get('temp')),
-                safe_float(row.get('psal'))
-            )
             batch.append(rec)
 
             if len(batch) >= batch_size:
-                inserted = insert_batch(conn, batch)
-                total_rows += inserted
-                print(f"  inserted batch of {inserted} rows (total inserted: {total_rows})")
+                inserted = flush()
+                print(f"  inserted batch of {inserted} rows (total inserted: {stats['rows']})")
                 batch = []
 
-        print(f"[{file_count}/{total_files}] processed '{os.path.basename(path)}' ({rows_in_file} rows)")
+        if rows_in_file == 0:
+            stats["empty"] += 1
+            record_progress(conn, TABLE_NAME, [(entry, 0, True)])
+            print(f"{prefix}empty file '{os.path.basename(path)}', skipping")
+            continue
 
-    if batch:
-        inserted = insert_batch(conn, batch)
-        total_rows += inserted
+        if entry["path"] in pending:
+            pending[entry["path"]][2] = True
+        else:
+            # Every row of the file is already covered by committed batches
+            record_progress(conn, TABLE_NAME, [(entry, rows_in_file, True)])
+        print(f"{prefix}processed '{os.path.basename(path)}' ({rows_in_file - start_row} rows)")
+
+    if pending:
+        inserted = flush()
         print(f"Inserted final batch of {inserted} rows.")
 
+    return stats
+
+# ---------- Worker pool ----------
+_worker_conn = None
+
+def _init_worker(dsn):
+    """Pool initializer: every worker process keeps a single connection for its lifetime."""
+    global _worker_conn
+    _worker_conn = psycopg2.connect(dsn)
+    # closed when the worker exits normally (pool.close/join), so the server sees a clean disconnect
+    multiprocessing.util.Finalize(None, _worker_conn.close, exitpriority=10)
+
+def _ingest_shard(args):
+    csv_paths, manifest, batch_size = args
+    return ingest_files(_worker_conn, csv_paths, manifest, batch_size=batch_size)
+
+def shard_paths(csv_paths, workers):
+    """Split the file list into ~4 shards per worker so fast workers pick up the slack."""
+    shard_size = max(1, len(csv_paths) // (workers * 4))
+    return [csv_paths[i:i + shard_size] for i in range(0, len(csv_paths), shard_size)]
+
+# ---------- Pipeline mode ----------
+def ingest_pipelined(conn, csv_paths, manifest, dsn, batch_size=DEFAULT_BATCH_SIZE, readers=2, writers=2,
+                     queue_size=4):
+    """
+    Overlapped parse/insert (ingest_pipeline.py). Files are planned against the manifest up
+    front (stat, plus hashing only for new/changed files, on a thread pool); a file is marked
+    done once all of its batches have committed. Partial checkpoints are not written in this
+    mode because writers may commit a file's batches out of order.
+    """
+    with ThreadPoolExecutor(max_workers=readers) as pool:
+        entries = list(pool.map(lambda p: plan_file(conn, manifest, TABLE_NAME, p), csv_paths))
+    plans = {e["path"]: e for e in entries if not e["skip"]}
+    already_loaded = len(entries) - len(plans)
+
+    def iter_file(path):
+        start_row = plans[path]["start_row"]
+        for line, row in enumerate(itertools.islice(iter_csv_rows(path), start_row, None), start_row + 2):
+            rec = parse_row(row)
+            yield rec if rec is not None else Reject(line, BAD_JULD, row)
+
+    def on_file_done(writer_conn, path, rows_in_file):
+        entry = plans[path]
+        record_progress(writer_conn, TABLE_NAME, [(entry, entry["start_row"] + rows_in_file, True)])
+
+    stats = run_pipeline(list(plans), iter_file, insert_batch, lambda: psycopg2.connect(dsn), batch_size,
+                         readers=readers, writers=writers, queue_size=queue_size, on_file_done=on_file_done,
+                         reject_table=TABLE_NAME)
+    stats.update({
+        "files": stats["files"] + already_loaded,
+        "already_loaded": already_loaded,
+        "resumed": sum(1 for e in plans.values() if e["start_row"]),
+        "empty": 0,
+    })
+    return stats
+
+def ingest_folder(conn, folder_path, batch_size=DEFAULT_BATCH_SIZE, pattern="*.csv", workers=1, dsn=None,
+                  pipeline=None):
+    """
+    pipeline: None for the sequential / --workers paths, or a dict with readers, writers
+    and queue_size for ingest_pipelined().
+    """
+    csv_paths = sorted(glob.glob(os.path.join(folder_path, pattern)))
+    if not csv_paths:
+        print("No CSV files found at", folder_path)
+        return
+
+    total_files = len(csv_paths)
+    print(f"Found {total_files} files. Starting ingestion (batch_size={batch_size}, workers={workers})...")
+
+    ensure_manifest(conn)
+    manifest = load_manifest(conn, TABLE_NAME)
+    if pipeline:
+        if dsn is None:
+            raise ValueError("--pipeline needs a connection string so each writer can open its own connection")
+        stats = ingest_pipelined(conn, csv_paths, manifest, dsn, batch_size=batch_size, **pipeline)
+    elif workers <= 1:
+        stats = ingest_files(conn, csv_paths, manifest, batch_size=batch_size, total_files=total_files)
+    else:
+        if dsn is None:
+            raise ValueError("--workers needs a connection string so each worker can open its own connection")
+        stats = {"files": 0, "rows": 0, "skipped": 0, "already_loaded": 0, "empty": 0, "resumed": 0,
+                 "rejects": Counter()}
+        shards = []
+        for shard in shard_paths(csv_paths, workers):
+            known = {p: manifest[p] for p in map(os.path.abspath, shard) if p in manifest}
+            shards.append((shard, known, batch_size))
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(dsn,)) as pool:
+            for shard_stats in pool.imap_unordered(_ingest_shard, shards):
+                for key, value in shard_stats.items():
+                    stats[key] += value
+                print(f"[{stats['files']}/{total_files}] files done "
+                      f"(total inserted: {stats['rows']}, skipped: {stats['skipped']})")
+            pool.close()
+            pool.join()
+
     print("---- Done ----")
-    print(f"Files processed: {file_count}")
-    print(f"Total rows inserted/updated: {total_rows}")
-    print(f"Rows skipped due to bad juld: {skipped_rows}")
+    print(f"Files processed: {stats['files']}")
+    print(f"Files already in DB: {stats['already_loaded']}")
+    print(f"Files resumed from checkpoint: {stats['resumed']}")
+    print(f"Empty files: {stats['empty']}")
+    print(f"Total rows inserted/updated: {stats['rows']}")
+    print_rejects_summary(stats["rejects"])
 
 # ---------- CLI ----------
 def main():
@@ -260,13 +416,25 @@ def main():
     parser.add_argument("--db", "-d", default="dbname=argo_db user=postgres password=1212 host=localhost port=5432", help="psycopg2 connection string (or use env vars).")
     parser.add_argument("--batch", "-b", type=int, default=DEFAULT_BATCH_SIZE, help="Batch size for inserts.")
     parser.add_argument("--pattern", "-p", default="*.csv", help="glob pattern for files (default *.csv).")
+    parser.add_argument("--workers", "-w", type=int, default=1,
+                        help="Number of worker processes, each with its own DB connection (default 1).")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Overlap parsing and inserting: reader threads feed a bounded queue drained by writer connections.")
+    parser.add_argument("--readers", type=int, default=2, help="Reader threads in --pipeline mode (default 2).")
+    parser.add_argument("--writers", type=int, default=2, help="Writer connections in --pipeline mode (default 2).")
+    parser.add_argument("--queue-size", type=int, default=4, help="Batches buffered between readers and writers (default 4).")
     args = parser.parse_args()
+    if args.pipeline and args.workers > 1:
+        parser.error("--pipeline and --workers are alternative modes; pick one")
+    pipeline = ({"readers": args.readers, "writers": args.writers, "queue_size": args.queue_size}
+                if args.pipeline else None)
 
     conn = None
     try:
         conn = psycopg2.connect(args.db)
         ensure_schema(conn)
-        ingest_folder(conn, args.folder, batch_size=args.batch, pattern=args.pattern)
+        ingest_folder(conn, args.folder, batch_size=args.batch, pattern=args.pattern,
+                      workers=args.workers, dsn=args.db, pipeline=pipeline)
     except Exception as e:
         print("❌ Fatal error:", e)
     finally:
@@ -0,0 +1,132 @@
+"""
+csv_decode.py
+
+Column-at-a-time decoder for Argo profile CSVs (pandas).
+- Reads every field as a string once, then decodes whole columns instead of calling
+  clean_text / safe_float / safe_int / parse_datetime per cell.
+- Strips the b'...' byte-literal wrappers with one regex per column.
+- Parses juld with the fixed %Y%m%d%H%M%S format and only retries the values that did
+  not match with the other formats parse_datetime accepts.
+- Produces argo_data column arrays (Python scalars, None for missing) ready for
+  execute_values or COPY.
+
+Semantics match the per-cell helpers in bulk_import.py: whitespace is stripped before
+the b'' wrapper is removed, empty strings become NULL, ints are truncated floats.
+"""
+
+import numpy as np
+import pandas as pd
+
+from ingest_metrics import METRICS
+from ingest_rejects import BAD_JULD, Reject
+
+COLUMNS = [
+    "platform_number", "cycle_number", "direction", "date_creation",
+    "platform_type", "juld", "latitude", "longitude",
+    "data_mode", "pres", "temp", "psal",
+]
+TEXT_COLUMNS = ["platform_number", "direction", "platform_type", "data_mode"]
+INT_COLUMNS = ["cycle_number"]
+FLOAT_COLUMNS = ["latitude", "longitude", "pres", "temp", "psal"]
+DATETIME_COLUMNS = ["juld", "date_creation"]
+
+JULD_FORMAT = "%Y%m%d%H%M%S"
+# the other formats of bulk_import.parse_datetime, in its order
+FALLBACK_FORMATS = ["%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S"]
+
+def read_raw(path):
+    """
+    Read the known columns of a CSV as strings, UTF-8 with a latin1 fallback.
+    A file whose header has no juld column (e.g. a header-less file) is read whole,
+    so that decode_frame drops, and iter_records rejects, every row, as the
+    csv.DictReader path does.
+    """
+    for enc in ["utf-8", "latin1"]:
+        try:
+            header = pd.read_csv(path, dtype=str, nrows=0, encoding=enc).columns
+            usecols = (lambda c: c in COLUMNS) if "juld" in header else None
+            return pd.read_csv(path, dtype=str, keep_default_na=False, na_filter=False,
+                               encoding=enc, usecols=usecols)
+        except UnicodeDecodeError:
+            if enc == "latin1":
+                raise
+
+def data_line_numbers(path):
+    """
+    1-based file line numbers of the rows read_raw returns: pandas skips empty and
+    whitespace-only lines, and the first remaining line is the header.
+    Assumes no quoted multi-line fields.
+    """
+    with open(path, "rb") as fh:
+        lines = [n for n, line in enumerate(fh, 1) if line.strip()]
+    return lines[1:]
+
+def clean_text_column(col):
+    s = col.str.strip()
+    s = s.where(s != "")
+    return s.str.replace(r"^b'(.*)'$", r"\1", regex=True)
+
+def float_column(col):
+    return pd.to_numeric(clean_text_column(col), errors="coerce")
+
+def int_column(col):
+    return np.trunc(float_column(col)).astype("Int64")
+
+def datetime_column(col):
+    s = clean_text_column(col)
+    parsed = pd.to_datetime(s, format=JULD_FORMAT, errors="coerce").astype("datetime64[us]")
+    for fmt in FALLBACK_FORMATS:
+        retry = parsed.isna() & s.notna()
+        if not retry.any():
+            break
+        # Sub-microsecond digits are truncated, as parse_datetime does
+        fallback = pd.to_datetime(s[retry], format=fmt, errors="coerce").dt.floor("us")
+        parsed = parsed.where(~retry, fallback.astype("datetime64[us]"))
+    return parsed
+
+def decode_frame(raw):
+    """
+    Decode a string frame into typed argo_data columns.
+    Returns (frame, dropped) where rows without a parseable juld are dropped and
+    dropped is their index in raw.
+    """
+    out = pd.DataFrame(index=raw.index)
+    for c in COLUMNS:
+        if c not in raw.columns:
+            out[c] = None
+        elif c in TEXT_COLUMNS:
+            out[c] = clean_text_column(raw[c])
+        elif c in INT_COLUMNS:
+            out[c] = int_column(raw[c])
+        elif c in FLOAT_COLUMNS:
+            out[c] = float_column(raw[c])
+        else:
+            out[c] = datetime_column(raw[c])
+    keep = out["juld"].notna()
+    return out[keep], raw.index[~keep.to_numpy()]
+
+def to_column_arrays(frame):
+    """{column: list of Python scalars with None for missing}, ready for the DB driver."""
+    return {c: frame[c].astype(object).where(frame[c].notna(), None).tolist() for c in COLUMNS}
+
+def to_records(frame):
+    """Row tuples in COLUMNS order, the shape bulk_import.insert_batch expects."""
+    arrays = to_column_arrays(frame)
+    return list(zip(*(arrays[c] for c in COLUMNS)))
+
+def iter_records(path):
+    """
+    Decode one CSV file and yield one item per source row: a record tuple, or a Reject
+    for a row dropped for a bad juld (the same contract as bulk_import.iter_records).
+    """
+    with METRICS.stage("read"):
+        raw = read_raw(path)
+    with METRICS.stage("parse"):
+        frame, dropped = decode_frame(raw)
+        records = to_records(frame)
+    yield from records
+    if len(dropped):
+        # raw is indexed by data row, not by file line
+        line_numbers = data_line_numbers(path)
+        for idx, row in zip(dropped, raw.loc[dropped].to_dict("records")):
+            yield Reject(line_numbers[idx], BAD_JULD, row)
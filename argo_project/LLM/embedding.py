@@ -3,7 +3,8 @@
 argo_chroma_ingest.py
 
 Pipeline:
-1. Load aggregated Argo profiles from Postgres (argo_data table).
+1. Load Argo profiles from Postgres (argo_profiles: one row per profile, see argo_profiles.py,
+   with the profile_metrics summary).
 2. Prepare textual documents + metadata.
 3. Encode embeddings using SentenceTransformer (all-MiniLM-L6-v2).
 4. Store embeddings in ChromaDB.
@@ -29,12 +30,17 @@ def load_profiles():
         port="5432"
     )
     cur = conn.cursor(cursor_factory=RealDictCursor)
+    # pres[] is sorted, so its ends are the pressure range; no scan of the level rows.
+    # The oceanographic summary comes precomputed from profile_metrics.
     cur.execute("""
-        SELECT platform_number, cycle_number, juld, latitude, longitude,
-               MIN(pres) AS min_pres, MAX(pres) AS max_pres,
-               AVG(temp) AS avg_temp, AVG(psal) AS avg_psal
-        FROM argo_data
-        GROUP BY platform_number, cycle_number, juld, latitude, longitude
+        SELECT p.platform_number, p.cycle_number, p.juld, p.latitude, p.longitude,
+               p.pres[1] AS min_pres, p.pres[p.n_levels] AS max_pres,
+               (SELECT AVG(t) FROM unnest(p.temp) t) AS avg_temp,
+               (SELECT AVG(s) FROM unnest(p.psal) s) AS avg_psal,
+               m.mld, m.thermocline_depth, m.thermocline_strength,
+               m.surface_temp, m.temp_1000, m.max_depth
+        FROM argo_profiles p
+        LEFT JOIN profile_metrics m USING (platform_number, cycle_number, direction)
     """)
     rows = cur.fetchall()
     conn.close()
@@ -55,12 +61,29 @@ def prepare_documents(rows):
         avg_psal = r["avg_psal"] if r["avg_psal"] is not None else 0.0
         min_pres = r["min_pres"] if r["min_pres"] is not None else 0.0
         max_pres = r["max_pres"] if r["max_pres"] is not None else 0.0
+        # Metrics the profile does not allow (e.g. too shallow for 1000 m) are left out
+        summary = {k: float(r[k]) for k in ("mld", "thermocline_depth", "thermocline_strength",
+                                            "surface_temp", "temp_1000", "max_depth")
+                   if r.get(k) is not None}
+        facts = []
+        if "mld" in summary:
+            facts.append(f"mixed layer depth {summary['mld']:.1f} m")
+        if "thermocline_depth" in summary and "thermocline_strength" in summary:
+            facts.append(f"thermocline at {summary['thermocline_depth']:.1f} m "
+                         f"({summary['thermocline_strength']:.3f} degC/m)")
+        if "surface_temp" in summary:
+            facts.append(f"surface temp {summary['surface_temp']:.2f}")
+        if "temp_1000" in summary:
+            facts.append(f"temp at 1000 m {summary['temp_1000']:.2f}")
+        if "max_depth" in summary:
+            facts.append(f"max depth {summary['max_depth']:.0f} m")
 
         doc = (
             f"Profile: platform {r['platform_number']}, cycle {r['cycle_number']}, "
             f"juld {juld_str}, location ({lat:.5f}, {lon:.5f}), "
             f"pressure {min_pres:.2f}-{max_pres:.2f}, "
             f"avg_temp {avg_temp:.3f}, avg_psal {avg_psal:.3f}"
+            + "".join(f", {f}" for f in facts)
         )
         docs.append(doc)
 
@@ -77,7 +100,9 @@ def prepare_documents(rows):
             "avg_psal": float(avg_psal),
             "year": int(juld.year) if isinstance(juld, datetime) else 0,
             "month": int(juld.month) if isinstance(juld, datetime) else 0,
-            "pres": float(min_pres)
+            "pres": float(min_pres),
+            # missing metrics have no key (Chroma rejects None)
+            **summary,
         })
     return docs, metadatas
 
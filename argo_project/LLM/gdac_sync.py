@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+gdac_sync.py
+
+Incremental ingest from a local mirror of the Argo GDAC, driven by its profile index
+(ar_index_global_prof.txt) instead of a scan of the mirror directory.
+- The index is streamed once into a temporary table with COPY (comment lines and
+  the header skipped) and diffed in SQL against gdac_index_snapshot, the index as of
+  the last sync: files that are new or have a later date_update are queued in
+  ingest_jobs (ingest_jobs.py) and a finished job is re-opened when its file changed.
+  A file whose job is still running is not queued and keeps its old snapshot entry,
+  so the next sync picks the change up (the index is then diffed even if unchanged).
+- Queue and snapshot are updated in one transaction, so an interrupted sync simply
+  produces the same diff next time.
+- The index's size and mtime are remembered (gdac_sync_state): an unchanged index is
+  not even reopened. Profile files are never opened here.
+- Entries that left the index are reported and dropped from the snapshot; their rows
+  stay in argo_data.
+Load the queue with the NetCDF decoder:
+    python gdac_sync.py --index /mirror/ar_index_global_prof.txt
+    python ingest_jobs.py work --decoder netcdf --loader replace
+"""
+
+import os
+import argparse
+import psycopg2
+
+from ingest_jobs import ensure_jobs
+from bulk_import import TABLE_NAME
+
+DEFAULT_DSN = "dbname=argo_db user=postgres password=1212 host=localhost port=5432"
+
+INDEX_COLUMNS = ["file", "date", "latitude", "longitude", "ocean", "profiler_type", "institution", "date_update"]
+
+SYNC_SQL = """
+CREATE TABLE IF NOT EXISTS gdac_index_snapshot (
+    file TEXT PRIMARY KEY,
+    date TIMESTAMPTZ,
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION,
+    ocean TEXT,
+    profiler_type INT,
+    institution TEXT,
+    date_update TIMESTAMPTZ,
+    synced_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS gdac_sync_state (
+    index_path TEXT PRIMARY KEY,
+    file_size BIGINT NOT NULL,
+    file_mtime DOUBLE PRECISION NOT NULL,
+    entries INT NOT NULL,
+    synced_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
+
+STAGING_SQL = """
+CREATE TEMP TABLE IF NOT EXISTS gdac_index_staging (
+    file TEXT, date TEXT, latitude TEXT, longitude TEXT, ocean TEXT,
+    profiler_type TEXT, institution TEXT, date_update TEXT
+) ON COMMIT DELETE ROWS;
+"""
+COPY_SQL = f"COPY gdac_index_staging ({', '.join(INDEX_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+
+# Index dates are YYYYMMDDHHMISS in UTC (read as wall clock, then placed in UTC); fields may be empty.
+TYPED_INDEX = """
+SELECT DISTINCT ON (file)
+    file,
+    to_timestamp(NULLIF(date, ''), 'YYYYMMDDHH24MISS')::timestamp AT TIME ZONE 'UTC' AS date,
+    NULLIF(latitude, '')::double precision AS latitude,
+    NULLIF(longitude, '')::double precision AS longitude,
+    NULLIF(ocean, '') AS ocean,
+    NULLIF(profiler_type, '')::int AS profiler_type,
+    NULLIF(institution, '') AS institution,
+    to_timestamp(NULLIF(date_update, ''), 'YYYYMMDDHH24MISS')::timestamp AT TIME ZONE 'UTC' AS date_update
+FROM gdac_index_staging
+WHERE file <> ''
+ORDER BY file, date_update DESC NULLS LAST
+"""
+
+DIFF_SQL = f"""
+CREATE TEMP TABLE gdac_index_changed ON COMMIT DROP AS
+SELECT i.* FROM ({TYPED_INDEX}) i
+LEFT JOIN gdac_index_snapshot s USING (file)
+WHERE s.file IS NULL OR i.date_update > s.date_update OR (s.date_update IS NULL AND i.date_update IS NOT NULL);
+"""
+
+# A running job is left alone: its worker may already have read the older version.
+ENQUEUE_SQL = """
+INSERT INTO ingest_jobs (file_path, target_table)
+SELECT %(root)s || '/' || file, %(table)s FROM gdac_index_changed ORDER BY file
+ON CONFLICT (file_path, target_table) DO UPDATE SET
+    status = 'pending', attempts = 0, worker_id = NULL, claimed_at = NULL, heartbeat_at = NULL,
+    finished_at = NULL, last_error = NULL
+WHERE ingest_jobs.status <> 'running';
+"""
+
+# Changes that could not be queued (job running) stay out of the snapshot, so the next
+# sync diffs them again and queues the newer version once the job has finished.
+DEFERRED_SQL = """
+DELETE FROM gdac_index_changed c
+USING ingest_jobs j
+WHERE j.file_path = %(root)s || '/' || c.file AND j.target_table = %(table)s AND j.status = 'running';
+"""
+
+SNAPSHOT_SQL = """
+INSERT INTO gdac_index_snapshot (file, date, latitude, longitude, ocean, profiler_type, institution, date_update)
+SELECT file, date, latitude, longitude, ocean, profiler_type, institution, date_update FROM gdac_index_changed
+ON CONFLICT (file) DO UPDATE SET
+    date = EXCLUDED.date, latitude = EXCLUDED.latitude, longitude = EXCLUDED.longitude,
+    ocean = EXCLUDED.ocean, profiler_type = EXCLUDED.profiler_type, institution = EXCLUDED.institution,
+    date_update = EXCLUDED.date_update, synced_at = now();
+"""
+
+REMOVED_SQL = """
+DELETE FROM gdac_index_snapshot s
+WHERE NOT EXISTS (SELECT 1 FROM gdac_index_staging g WHERE g.file = s.file);
+"""
+
+STATE_SQL = """
+INSERT INTO gdac_sync_state (index_path, file_size, file_mtime, entries) VALUES (%s, %s, %s, %s)
+ON CONFLICT (index_path) DO UPDATE SET
+    file_size = EXCLUDED.file_size, file_mtime = EXCLUDED.file_mtime,
+    entries = EXCLUDED.entries, synced_at = now();
+"""
+
+def ensure_sync(conn):
+    ensure_jobs(conn)
+    with conn.cursor() as cur:
+        cur.execute(SYNC_SQL)
+        conn.commit()
+
+def index_unchanged(conn, index_path, st):
+    with conn.cursor() as cur:
+        cur.execute("SELECT file_size, file_mtime FROM gdac_sync_state WHERE index_path = %s;", (index_path,))
+        row = cur.fetchone()
+    conn.commit()
+    return row is not None and row[0] == st.st_size and row[1] == st.st_mtime
+
+def open_index(index_path):
+    """The index opened just past its '#' comment block and header line."""
+    fh = open(index_path, newline="", encoding="utf-8", errors="replace")
+    while True:
+        pos = fh.tell()
+        line = fh.readline()
+        if not line:
+            break
+        if line.startswith("#"):
+            continue
+        if line.startswith("file,"):
+            return fh
+        # no header: rewind to this first data line
+        fh.seek(pos)
+        return fh
+    return fh
+
+def sync_index(conn, index_path, mirror_root, table=TABLE_NAME, dry_run=False, force=False):
+    """
+    Diff index_path against the last snapshot and queue new / updated profile files
+    (paths under mirror_root). Returns {"entries", "changed", "queued", "deferred", "removed"},
+    or None when the index has not changed since the last sync. Deferred files had a
+    running job; they are diffed again by the next sync.
+    """
+    index_path = os.path.abspath(index_path)
+    st = os.stat(index_path)
+    if not force and index_unchanged(conn, index_path, st):
+        return None
+
+    root = os.path.abspath(mirror_root).replace(os.sep, "/").rstrip("/")
+    with conn.cursor() as cur:
+        cur.execute(STAGING_SQL)
+        with open_index(index_path) as fh:
+            cur.copy_expert(COPY_SQL, fh)
+        cur.execute("SELECT count(*) FROM gdac_index_staging;")
+        entries = cur.fetchone()[0]
+        cur.execute(DIFF_SQL)
+        cur.execute("SELECT count(*) FROM gdac_index_changed;")
+        changed = cur.fetchone()[0]
+        cur.execute(ENQUEUE_SQL, {"root": root, "table": table})
+        queued = cur.rowcount
+        cur.execute(DEFERRED_SQL, {"root": root, "table": table})
+        deferred = cur.rowcount
+        cur.execute(SNAPSHOT_SQL)
+        cur.execute(REMOVED_SQL)
+        removed = cur.rowcount
+        if deferred:
+            # not fully synced: the next run must diff even an unchanged index
+            cur.execute("DELETE FROM gdac_sync_state WHERE index_path = %s;", (index_path,))
+        else:
+            cur.execute(STATE_SQL, (index_path, st.st_size, st.st_mtime, entries))
+    if dry_run:
+        conn.rollback()
+    else:
+        conn.commit()
+    return {"entries": entries, "changed": changed, "queued": queued, "deferred": deferred, "removed": removed}
+
+# ---------- CLI ----------
+def main():
+    parser = argparse.ArgumentParser(description="Queue new and updated GDAC profile files from the local index mirror.")
+    parser.add_argument("--db", "-d", default=DEFAULT_DSN, help="psycopg2 connection string (or use env vars).")
+    parser.add_argument("--index", "-i", required=True, help="Path of the mirrored ar_index_global_prof.txt.")
+    parser.add_argument("--mirror", "-m",
+                        help="Directory the index paths are relative to (default: dac/ next to the index).")
+    parser.add_argument("--dry-run", action="store_true", help="Report the diff, queue nothing, keep the old snapshot.")
+    parser.add_argument("--force", action="store_true", help="Diff even if the index file looks unchanged.")
+    args = parser.parse_args()
+    mirror = args.mirror or os.path.join(os.path.dirname(os.path.abspath(args.index)), "dac")
+
+    conn = None
+    try:
+        conn = psycopg2.connect(args.db)
+        ensure_sync(conn)
+        result = sync_index(conn, args.index, mirror, dry_run=args.dry_run, force=args.force)
+        if result is None:
+            print("✅ Index unchanged since the last sync, nothing to do.")
+            return
+        label = "Would queue" if args.dry_run else "Queued"
+        print(f"Index entries: {result['entries']}, new or updated: {result['changed']}, "
+              f"gone from the index: {result['removed']}")
+        print(f"✅ {label} {result['queued']} files under {mirror} for {TABLE_NAME}.")
+        if result["deferred"]:
+            print(f"⚠ {result['deferred']} changed files have a running job; the next sync queues them.")
+    except Exception as e:
+        print("❌ Fatal error:", e)
+    finally:
+        if conn:
+            conn.close()
+
+if __name__ == "__main__":
+    main()
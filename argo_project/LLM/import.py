@@ -2,6 +2,11 @@ import psycopg2
 from psycopg2.extras import execute_values
 import csv
 from datetime import datetime
+from ingest_rejects import BAD_JULD, PARSE_ERROR, Reject, RejectLog, ensure_rejects
+from ingest_rejects import print_summary as print_rejects_summary
+from argo_profiles import ensure_profiles, juld_bounds, profile_keys, refresh_profiles
+from profile_metrics import ensure_metrics, refresh_metrics
+from standard_levels import ensure_std_levels, refresh_std_levels
 
 # Database configuration – update password as needed
 DB_CONFIG = {
@@ -57,7 +62,6 @@ def parse_datetime(val):
         except ValueError:
             continue
 
-    print(f"❌ Failed to parse datetime from '{val}'")
     return None
 
 
@@ -117,6 +121,10 @@ def create_table(conn):
         """)
         conn.commit()
         print("✅ Table created with hypertable.")
+    ensure_rejects(conn)
+    ensure_profiles(conn)
+    ensure_metrics(conn)
+    ensure_std_levels(conn)
 
 
 # ------------------ Import CSV ------------------
@@ -124,15 +132,14 @@ def create_table(conn):
 def import_csv(conn):
     """Import data from CSV file into the database."""
     tuples = []
-    skipped = 0
+    rejects = RejectLog("argo_data")
     with open(CSV_FILE, newline='', encoding='utf-8') as csvfile:
         reader = csv.DictReader(csvfile)
         for row in reader:
             try:
                 juld = parse_datetime(row.get('juld'))
                 if not juld:
-                    skipped += 1
-                    print("⚠ Skipping row with invalid 'juld':", row)
+                    rejects.add(CSV_FILE, Reject(reader.line_num, BAD_JULD, row))
                     continue
 
                 record = (
@@ -151,8 +158,7 @@ def import_csv(conn):
                 )
                 tuples.append(record)
             except Exception as e:
-                print("❌ Error parsing row:", row)
-                print("   →", e)
+                rejects.add(CSV_FILE, Reject(reader.line_num, PARSE_ERROR, row, str(e)))
 
     if tuples:
         query = """
@@ -164,10 +170,15 @@ def import_csv(conn):
         """
         with conn.cursor() as cur:
             execute_values(cur, query, tuples)
+            # rebuild the profiles of these rows in the same transaction, like bulk_import
+            keys, bounds = profile_keys(tuples), juld_bounds(tuples)
+            refresh_profiles(cur, keys, bounds)
+            refresh_metrics(cur, keys, bounds)
+            refresh_std_levels(cur, keys, bounds)
             conn.commit()
         print(f"✅ Loaded {len(tuples)} rows from CSV.")
-    if skipped > 0:
-        print(f"⚠ Skipped {skipped} rows due to invalid 'juld'.")
+    rejects.flush(conn)
+    print_rejects_summary(rejects.counts)
 
 
 # ------------------ Main ------------------
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+ingest_jobs.py
+
+Postgres work queue so several machines can share one backfill into argo_data.
+- enqueue: a coordinator registers the files of a folder as rows of ingest_jobs
+  (already known files are left alone, so it can be re-run as new files arrive).
+- work: workers on any node claim a few pending files at a time with
+  SELECT ... FOR UPDATE SKIP LOCKED, load them with bulk_import.ingest_files and mark
+  them done. Claims never block each other and no file is handed to two live workers.
+- Every worker heartbeats its running jobs from a side connection. Jobs whose heartbeat
+  is older than --stale seconds (worker crashed, node lost) go back to pending and
+  are claimed again; after --max-attempts failures a job is marked failed.
+- status: job counts per state.
+File paths are stored as given to enqueue, so every node needs the folder at the same
+path (shared mount).
+
+Example:
+    python ingest_jobs.py enqueue --folder /mnt/argo/csv
+    python ingest_jobs.py work --workers 4          # on each node
+    python ingest_jobs.py status
+"""
+
+import os
+import glob
+import time
+import socket
+import argparse
+import threading
+import multiprocessing
+import psycopg2
+from psycopg2.extras import execute_values
+
+from bulk_import import DEFAULT_BATCH_SIZE, LOADERS, TABLE_NAME, ensure_schema, ingest_files
+
+DEFAULT_DSN = "dbname=argo_db user=postgres password=1212 host=localhost port=5432"
+
+JOBS_SQL = """
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    file_path TEXT NOT NULL,
+    target_table TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    claimed_at TIMESTAMPTZ,
+    heartbeat_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ,
+    rows_loaded INT,
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    UNIQUE (file_path, target_table)
+);
+CREATE INDEX IF NOT EXISTS idx_ingest_jobs_pending ON ingest_jobs (target_table, id) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_ingest_jobs_running ON ingest_jobs (heartbeat_at) WHERE status = 'running';
+"""
+
+CLAIM_SQL = """
+UPDATE ingest_jobs j
+SET status = 'running', worker_id = %(worker)s, attempts = j.attempts + 1,
+    claimed_at = now(), heartbeat_at = now()
+WHERE j.id IN (
+    SELECT id FROM ingest_jobs
+    WHERE target_table = %(table)s AND status = 'pending'
+    ORDER BY id
+    LIMIT %(limit)s
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING j.id, j.file_path;
+"""
+
+# A running job whose worker stopped heartbeating is handed back (or failed for good).
+RECLAIM_SQL = """
+UPDATE ingest_jobs j
+SET status = CASE WHEN j.attempts >= %(max_attempts)s THEN 'failed' ELSE 'pending' END,
+    worker_id = NULL,
+    last_error = COALESCE(j.last_error, '') || 'heartbeat lost (' || j.worker_id || '); '
+WHERE j.id IN (
+    SELECT id FROM ingest_jobs
+    WHERE status = 'running' AND heartbeat_at < now() - make_interval(secs => %(stale)s)
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING j.id;
+"""
+
+HEARTBEAT_SQL = "UPDATE ingest_jobs SET heartbeat_at = now() WHERE worker_id = %s AND status = 'running';"
+
+# Only the worker still holding the job may close it: a reclaimed job belongs to someone else now.
+COMPLETE_SQL = """
+UPDATE ingest_jobs AS j
+SET status = 'done', finished_at = now(), rows_loaded = v.rows_loaded, last_error = NULL
+FROM (VALUES %s) AS v(id, rows_loaded, worker_id)
+WHERE j.id = v.id AND j.worker_id = v.worker_id AND j.status = 'running';
+"""
+
+RELEASE_SQL = """
+UPDATE ingest_jobs
+SET status = CASE WHEN attempts >= %(max_attempts)s THEN 'failed' ELSE 'pending' END,
+    worker_id = NULL,
+    last_error = %(error)s
+WHERE id = ANY(%(ids)s) AND worker_id = %(worker)s AND status = 'running';
+"""
+
+def ensure_jobs(conn):
+    with conn.cursor() as cur:
+        cur.execute(JOBS_SQL)
+        conn.commit()
+
+# ---------- Coordinator ----------
+def enqueue_folder(conn, folder_path, pattern="*.csv", table=TABLE_NAME):
+    paths = sorted(os.path.abspath(p) for p in glob.glob(os.path.join(folder_path, pattern)))
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO ingest_jobs (file_path, target_table)
+            SELECT p, %s FROM unnest(%s::text[]) AS p
+            ON CONFLICT (file_path, target_table) DO NOTHING;
+        """, (table, paths))
+        added = cur.rowcount
+        conn.commit()
+    print(f"✅ {len(paths)} files found, {added} new jobs queued for {table}.")
+    return added
+
+def print_status(conn, table=TABLE_NAME):
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT status, count(*), COALESCE(sum(rows_loaded), 0), count(DISTINCT worker_id)
+            FROM ingest_jobs WHERE target_table = %s GROUP BY status ORDER BY status;
+        """, (table,))
+        rows = cur.fetchall()
+    if not rows:
+        print(f"No jobs for {table}.")
+    for status, jobs, loaded, workers in rows:
+        extra = f", {loaded} rows" if status == "done" else (f", {workers} workers" if status == "running" else "")
+        print(f"{status:<8} {jobs} jobs{extra}")
+
+# ---------- Worker ----------
+class Heartbeat(threading.Thread):
+    """Side connection that keeps this worker's running jobs alive while the main one is busy loading."""
+
+    def __init__(self, dsn, worker_id, interval):
+        super().__init__(name="heartbeat", daemon=True)
+        self.dsn = dsn
+        self.worker_id = worker_id
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        conn = None
+        while not self.stopped.wait(self.interval):
+            try:
+                if conn is None or conn.closed:
+                    conn = psycopg2.connect(self.dsn)
+                with conn.cursor() as cur:
+                    cur.execute(HEARTBEAT_SQL, (self.worker_id,))
+                conn.commit()
+            except psycopg2.Error as e:
+                print(f"⚠ [{self.worker_id}] heartbeat failed: {e}")
+                if conn is not None:
+                    conn.close()
+                conn = None
+        if conn is not None:
+            conn.close()
+
+def run_worker(dsn, table=TABLE_NAME, claim=20, stale=120, heartbeat=15, max_attempts=3, idle_exit=True,
+               poll_interval=5.0, ingest_kwargs=None):
+    """Claim and load jobs until none are pending or running (or forever with idle_exit=False)."""
+    ingest_kwargs = ingest_kwargs or {}
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    totals = {"files": 0, "rows": 0, "failed": 0}
+    conn = psycopg2.connect(dsn)
+    beat = Heartbeat(dsn, worker_id, heartbeat)
+    beat.start()
+    try:
+        while True:
+            with conn.cursor() as cur:
+                cur.execute(RECLAIM_SQL, {"stale": stale, "max_attempts": max_attempts})
+                reclaimed = cur.rowcount
+                cur.execute(CLAIM_SQL, {"worker": worker_id, "table": table, "limit": claim})
+                jobs = cur.fetchall()
+            conn.commit()
+            if reclaimed:
+                print(f"♻ [{worker_id}] reclaimed {reclaimed} jobs from dead workers")
+
+            if not jobs:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT count(*) FROM ingest_jobs WHERE target_table = %s AND status = 'running';",
+                                (table,))
+                    running = cur.fetchone()[0]
+                conn.commit()
+                if idle_exit and not running:
+                    break
+                # others still hold jobs that may come back if their worker dies
+                time.sleep(poll_interval)
+                continue
+
+            ids = [j[0] for j in jobs]
+            file_rows = {}
+            try:
+                stats = ingest_files(conn, [j[1] for j in jobs], file_rows=file_rows, **ingest_kwargs)
+            except Exception as e:
+                conn.rollback()
+                with conn.cursor() as cur:
+                    cur.execute(RELEASE_SQL, {"ids": ids, "worker": worker_id, "max_attempts": max_attempts,
+                                              "error": f"{type(e).__name__}: {e}"})
+                conn.commit()
+                totals["failed"] += len(jobs)
+                print(f"❌ [{worker_id}] {len(jobs)} jobs released after error: {e}")
+                continue
+
+            with conn.cursor() as cur:
+                execute_values(cur, COMPLETE_SQL, [(i, file_rows.get(p, 0), worker_id) for i, p in jobs])
+            conn.commit()
+            totals["files"] += len(jobs)
+            totals["rows"] += stats["rows"]
+            print(f"✅ [{worker_id}] {len(jobs)} files, {stats['rows']} rows "
+                  f"(worker total {totals['files']} files, {totals['rows']} rows)")
+    finally:
+        beat.stopped.set()
+        beat.join()
+        conn.close()
+    return totals
+
+def _worker_main(args):
+    dsn, kwargs = args
+    return run_worker(dsn, **kwargs)
+
+# ---------- CLI ----------
+def main():
+    parser = argparse.ArgumentParser(description="Share an argo_data backfill across nodes through an ingest_jobs queue.")
+    parser.add_argument("--db", "-d", default=DEFAULT_DSN, help="psycopg2 connection string (or use env vars).")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    enq = sub.add_parser("enqueue", help="Register the files of a folder as pending jobs.")
+    enq.add_argument("--folder", "-f", required=True, help="Folder with CSV files, at the same path on every node.")
+    enq.add_argument("--pattern", "-p", default="*.csv", help="glob pattern for files (default *.csv).")
+
+    work = sub.add_parser("work", help="Claim and load pending jobs.")
+    work.add_argument("--workers", "-w", type=int, default=1, help="Worker processes on this node (default 1).")
+    work.add_argument("--claim", type=int, default=20, help="Files claimed (and loaded) per round trip (default 20).")
+    work.add_argument("--batch", "-b", type=int, default=DEFAULT_BATCH_SIZE, help="Batch size for inserts.")
+    work.add_argument("--loader", "-l", choices=sorted(LOADERS), default="values", help="bulk_import loader.")
+    work.add_argument("--decoder", choices=["python", "vectorized", "netcdf"], default="python",
+                      help="bulk_import decoder (netcdf for profile .nc files, e.g. queued by gdac_sync.py).")
+    work.add_argument("--qc", action="store_true", help="Run bulk_import's QC stage and store the flags.")
+    work.add_argument("--derive", action="store_true", help="Store bulk_import's TEOS-10 columns (needs gsw).")
+    work.add_argument("--heartbeat", type=float, default=15, help="Seconds between heartbeats (default 15).")
+    work.add_argument("--stale", type=float, default=120,
+                      help="Seconds without heartbeat before a running job is reclaimed (default 120).")
+    work.add_argument("--max-attempts", type=int, default=3, help="Claims before a job is marked failed (default 3).")
+    work.add_argument("--forever", action="store_true", help="Keep polling for new jobs instead of exiting when idle.")
+
+    sub.add_parser("status", help="Show job counts per state.")
+    args = parser.parse_args()
+    if args.command == "work" and args.stale <= args.heartbeat * 2:
+        parser.error("--stale must be well above --heartbeat or live workers lose their jobs")
+
+    conn = None
+    try:
+        conn = psycopg2.connect(args.db)
+        ensure_jobs(conn)
+        if args.command == "enqueue":
+            enqueue_folder(conn, args.folder, pattern=args.pattern)
+        elif args.command == "status":
+            print_status(conn)
+        else:
+            ensure_schema(conn)
+            kwargs = {"claim": args.claim, "stale": args.stale, "heartbeat": args.heartbeat,
+                      "max_attempts": args.max_attempts, "idle_exit": not args.forever,
+                      "ingest_kwargs": {"batch_size": args.batch, "loader": args.loader, "decoder": args.decoder,
+                                        "qc": args.qc, "derive": args.derive}}
+            if args.workers <= 1:
+                totals = run_worker(args.db, **kwargs)
+                results = [totals]
+            else:
+                with multiprocessing.Pool(args.workers) as pool:
+                    results = pool.map(_worker_main, [(args.db, kwargs)] * args.workers)
+            print("---- Done ----")
+            print(f"Files loaded on this node: {sum(r['files'] for r in results)}")
+            print(f"Rows inserted/updated on this node: {sum(r['rows'] for r in results)}")
+            print(f"Job failures on this node: {sum(r['failed'] for r in results)}")
+            print_status(conn)
+    except Exception as e:
+        print("❌ Fatal error:", e)
+    finally:
+        if conn:
+            conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+ingest_metrics.py
+
+Structured ingest metrics for bulk_import.py (--metrics-json / --metrics-prom).
+- Per-stage wall time: schema, read, parse, qc, derive, dedupe, insert, profiles (derived per-profile
+  tables), rejects, location_backfill.
+- Counters: files, rows written, rows inserted vs. updated on conflict, batches, rejects.
+- Batch latency histogram (seconds per loader call, commit included).
+- Reported as JSON or as a Prometheus textfile (node_exporter textfile collector);
+  both files are replaced atomically so a scraper never sees half a report.
+- Off unless a report path is configured: the per-row timing hooks are then no-ops.
+- One process-wide METRICS registry, thread safe for --pipeline; --workers processes
+  send snapshots back to the parent, which merges them.
+"""
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+BATCH_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PROM_PREFIX = "argo_ingest"
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.enabled = False
+        self.json_path = None
+        self.prom_path = None
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.stages = {}
+            self.counters = {}
+            self.buckets = [0] * (len(BATCH_BUCKETS) + 1)
+            self.batch_sum = 0.0
+            self.batch_count = 0
+
+    def configure(self, json_path=None, prom_path=None):
+        self.json_path, self.prom_path = json_path, prom_path
+        self.enabled = bool(json_path or prom_path)
+
+    # ---------- recording ----------
+    def add_time(self, stage, seconds):
+        with self.lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - t0)
+
+    def timed(self, fn, stage):
+        """fn wrapped to add its run time to stage (fn itself when metrics are off)."""
+        if not self.enabled:
+            return fn
+
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add_time(stage, time.perf_counter() - t0)
+        return wrapper
+
+    def timed_iter(self, iterable, stage):
+        """Iterate, adding only the time spent producing items (not consuming them) to stage."""
+        if not self.enabled:
+            return iterable
+
+        def gen():
+            it = iter(iterable)
+            while True:
+                t0 = time.perf_counter()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    self.add_time(stage, time.perf_counter() - t0)
+                    return
+                self.add_time(stage, time.perf_counter() - t0)
+                yield item
+        return gen()
+
+    def observe_batch(self, seconds, rows, inserted=None, insert_s=None):
+        """
+        One loader call: latency into the histogram, rows and conflict counts into the counters.
+        insert_s is the part of it booked on the insert stage (default: all of it).
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            i = next((i for i, b in enumerate(BATCH_BUCKETS) if seconds <= b), len(BATCH_BUCKETS))
+            self.buckets[i] += 1
+            self.batch_sum += seconds
+            self.batch_count += 1
+            self.stages["insert"] = self.stages.get("insert", 0.0) + (seconds if insert_s is None else insert_s)
+            self.counters["rows"] = self.counters.get("rows", 0) + rows
+            if inserted is not None:
+                self.counters["inserted"] = self.counters.get("inserted", 0) + inserted
+                self.counters["conflicts"] = self.counters.get("conflicts", 0) + rows - inserted
+
+    # ---------- reporting ----------
+    def snapshot(self):
+        with self.lock:
+            elapsed = time.time() - self.started
+            rows = self.counters.get("rows", 0)
+            return {
+                "started": self.started,
+                "elapsed_s": elapsed,
+                "rows_per_s": rows / elapsed if elapsed > 0 else 0.0,
+                "stages_s": dict(self.stages),
+                "counters": dict(self.counters),
+                "batch_latency_s": {
+                    "buckets": dict(zip([str(b) for b in BATCH_BUCKETS] + ["+Inf"], self.buckets)),
+                    "sum": self.batch_sum,
+                    "count": self.batch_count,
+                },
+            }
+
+    def merge(self, snap):
+        """Fold a snapshot from another process into this registry (wall time stays ours)."""
+        with self.lock:
+            for k, v in snap["stages_s"].items():
+                self.stages[k] = self.stages.get(k, 0.0) + v
+            for k, v in snap["counters"].items():
+                self.counters[k] = self.counters.get(k, 0) + v
+            for i, n in enumerate(snap["batch_latency_s"]["buckets"].values()):
+                self.buckets[i] += n
+            self.batch_sum += snap["batch_latency_s"]["sum"]
+            self.batch_count += snap["batch_latency_s"]["count"]
+
+    def to_prometheus(self, snap):
+        p = PROM_PREFIX
+        lines = [
+            f"# HELP {p}_stage_seconds_total Wall time spent per ingest stage.",
+            f"# TYPE {p}_stage_seconds_total counter",
+        ]
+        lines += [f'{p}_stage_seconds_total{{stage="{k}"}} {v:.6f}' for k, v in sorted(snap["stages_s"].items())]
+        for name, v in sorted(snap["counters"].items()):
+            lines += [f"# TYPE {p}_{name}_total counter", f"{p}_{name}_total {v}"]
+        lines += [
+            f"# HELP {p}_rows_per_second Rows written per second of wall time since the run started.",
+            f"# TYPE {p}_rows_per_second gauge",
+            f"{p}_rows_per_second {snap['rows_per_s']:.3f}",
+            f"# HELP {p}_batch_seconds Latency of one loader call (commit included).",
+            f"# TYPE {p}_batch_seconds histogram",
+        ]
+        cumulative = 0
+        for le, n in snap["batch_latency_s"]["buckets"].items():
+            cumulative += n
+            lines.append(f'{p}_batch_seconds_bucket{{le="{le}"}} {cumulative}')
+        lines += [
+            f"{p}_batch_seconds_sum {snap['batch_latency_s']['sum']:.6f}",
+            f"{p}_batch_seconds_count {snap['batch_latency_s']['count']}",
+            f"{p}_last_report_timestamp_seconds {time.time():.0f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def report(self):
+        """Write the configured report files (no-op when none are configured)."""
+        if not self.enabled:
+            return None
+        snap = self.snapshot()
+        if self.json_path:
+            _write_atomic(self.json_path, json.dumps(snap, indent=2))
+        if self.prom_path:
+            _write_atomic(self.prom_path, self.to_prometheus(snap))
+        return snap
+
+def _write_atomic(path, text):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as fh:
+        fh.write(text)
+    os.replace(tmp, path)
+
+METRICS = Metrics()
@@ -0,0 +1,163 @@
+"""
+ingest_pipeline.py
+
+Overlapped parse/insert pipeline shared by the bulk importers.
+- Reader threads take files off a work list, parse them row by row and cut the
+  records into batches on a bounded queue.
+- Writer threads, each holding its own DB connection, drain the queue and load
+  the batches, so parsing continues while the database is busy and vice versa.
+- The queue is bounded: when writers fall behind, readers block (backpressure),
+  so at most (queue_size + readers + writers) batches are in memory no matter how
+  many files the folder holds.
+- Batches remember which files they came from. Once a file has been read to the end
+  and every batch holding its rows has been committed, on_file_done(conn, path,
+  rows_in_file) runs on the writer's connection (e.g. to update ingest_manifest).
+- whole_files=True only cuts batches at file boundaries, so no file is split across
+  batches (needed by loaders that replace whole profiles).
+
+iter_file(path) must yield one item per source row: a record tuple, or an
+ingest_rejects.Reject for a row that was read but rejected. With reject_table set,
+rejects travel with the batch and each writer stores them in ingest_rejects right
+after loading it.
+"""
+
+import os
+import queue
+import threading
+from collections import Counter
+
+from ingest_rejects import RejectLog, is_reject
+
+_STOP = object()
+
+def run_pipeline(paths, iter_file, load_batch, connect, batch_size,
+                 readers=2, writers=2, queue_size=4, on_file_done=None, reject_table=None,
+                 whole_files=False):
+    """Run the pipeline over paths and return the merged counters."""
+    path_q = queue.Queue()
+    for p in paths:
+        path_q.put(p)
+    batch_q = queue.Queue(maxsize=queue_size)
+
+    lock = threading.Lock()
+    stats = {"files": 0, "rows": 0, "skipped": 0, "batches": 0, "rejects": Counter()}
+    # path -> [batches holding its rows not committed yet (incl. the one being built),
+    #          finished reading, rows_in_file]
+    open_files = {}
+    errors = []
+    total_files = len(paths)
+
+    def reader():
+        batch, sources, rejects = [], set(), []
+
+        def emit():
+            nonlocal batch, sources, rejects
+            batch_q.put((batch, sources, rejects))
+            batch, sources, rejects = [], set(), []
+
+        try:
+            while not errors:
+                try:
+                    path = path_q.get_nowait()
+                except queue.Empty:
+                    break
+                with lock:
+                    open_files[path] = [0, False, 0]
+                rows_in_file = skipped = 0
+                for rec in iter_file(path):
+                    rows_in_file += 1
+                    if is_reject(rec):
+                        skipped += 1
+                        rejects.append((path, rec))
+                        continue
+                    batch.append(rec)
+                    if path not in sources:
+                        # counted as soon as the batch being built holds its rows, so the
+                        # file cannot look finished while a tail batch is still unsent
+                        with lock:
+                            open_files[path][0] += 1
+                        sources.add(path)
+                    if not whole_files and len(batch) >= batch_size:
+                        emit()
+                if whole_files and len(batch) >= batch_size:
+                    emit()
+
+                with lock:
+                    state = open_files[path]
+                    state[1], state[2] = True, rows_in_file
+                    stats["files"] += 1
+                    stats["skipped"] += skipped
+                    # Nothing of this file is in flight: send an empty batch so a writer
+                    # still reports it as done on its connection.
+                    needs_marker = state[0] == 0
+                    if needs_marker:
+                        state[0] += 1
+                    done = stats["files"]
+                if needs_marker:
+                    batch_q.put(([], {path}, []))
+                print(f"[{done}/{total_files}] parsed '{os.path.basename(path)}' ({rows_in_file} rows)")
+
+            if batch or rejects:
+                emit()
+        except Exception as e:
+            errors.append(e)
+
+    def writer():
+        conn = None
+        reject_log = RejectLog(reject_table) if reject_table else None
+        try:
+            conn = connect()
+            while True:
+                item = batch_q.get()
+                if item is _STOP:
+                    break
+                if errors:
+                    # keep draining so blocked readers can exit
+                    continue
+                batch, sources, rejects = item
+                inserted = load_batch(conn, batch) if batch else 0
+                if reject_log:
+                    for path, reject in rejects:
+                        reject_log.add(path, reject)
+                    reject_log.flush(conn)
+                finished = []
+                with lock:
+                    stats["rows"] += inserted
+                    stats["rejects"].update(reject.reason for _, reject in rejects)
+                    total = stats["rows"]
+                    if batch:
+                        stats["batches"] += 1
+                    for p in sources:
+                        state = open_files[p]
+                        state[0] -= 1
+                        if state[0] == 0 and state[1]:
+                            finished.append((p, state[2]))
+                            del open_files[p]
+                if batch:
+                    print(f"  inserted batch of {inserted} rows (total inserted: {total})")
+                if on_file_done:
+                    for p, rows_in_file in finished:
+                        on_file_done(conn, p, rows_in_file)
+        except Exception as e:
+            errors.append(e)
+            # drain until told to stop so readers never block on a dead writer
+            while batch_q.get() is not _STOP:
+                pass
+        finally:
+            if conn:
+                conn.close()
+
+    reader_threads = [threading.Thread(target=reader, name=f"reader-{i}") for i in range(readers)]
+    writer_threads = [threading.Thread(target=writer, name=f"writer-{i}") for i in range(writers)]
+    for t in reader_threads + writer_threads:
+        t.start()
+    for t in reader_threads:
+        t.join()
+    for _ in writer_threads:
+        batch_q.put(_STOP)
+    for t in writer_threads:
+        t.join()
+
+    if errors:
+        raise errors[0]
+    return stats
@@ -0,0 +1,117 @@
+"""
+ingest_qc.py
+
+Vectorized real-time QC for the CSV bulk importers (bulk_import.py --qc).
+- Runs on a whole batch of record tuples at once as NumPy arrays, inside the loader,
+  so the flags are written with the data instead of by a later SQL pass over the hypertable.
+- Tests (numbering of the Argo real-time QC manual):
+  6  global range       pres >= -5, temp -2.5..40, psal 2..41               -> 4
+  8  pressure increasing pres not above the previous level of the profile   -> pres 4
+     duplicate level     pres already seen earlier in the same profile       -> pres 4
+  9  spike              |V2 - (V1+V3)/2| - |(V3-V1)/2| over the threshold   -> 4
+  11 gradient           |V2 - (V1+V3)/2| over the threshold                 -> 4
+  Thresholds of 9 and 11 are the manual's, tighter below 500 dbar.
+- Flags follow the Argo scale: 1 good, 4 bad, 9 missing value; NULL means not checked.
+- Profiles are (platform_number, cycle_number, direction) and keep their file order
+  (the decoders emit levels as they appear); spike and gradient only compare
+  neighbours of the same profile, so a profile cut across two batches loses them at
+  the cut (the replace loader always gets whole files).
+"""
+
+import numpy as np
+
+GOOD, BAD, MISSING = 1, 4, 9
+
+# (min, max) of test 6
+RANGES = {"pres": (-5.0, None), "temp": (-2.5, 40.0), "psal": (2.0, 41.0)}
+# (threshold above 500 dbar, threshold at/below 500 dbar)
+SPIKE = {"temp": (6.0, 2.0), "psal": (0.9, 0.3)}
+GRADIENT = {"temp": (9.0, 3.0), "psal": (1.5, 0.5)}
+DEEP_PRES = 500.0
+
+# record tuple positions (bulk_import.COLUMNS)
+PLATFORM, CYCLE, DIRECTION, PRES, TEMP, PSAL = 0, 1, 2, 9, 10, 11
+
+QC_COLUMNS = ["pres_qc", "temp_qc", "psal_qc"]
+
+def _floats(rows, idx):
+    return np.fromiter((np.nan if r[idx] is None else r[idx] for r in rows), dtype=np.float64, count=len(rows))
+
+def _profile_ids(rows):
+    """Integer profile id per row (ids are only compared for equality)."""
+    ids = {}
+    return np.fromiter((ids.setdefault((r[PLATFORM], r[CYCLE], r[DIRECTION]), len(ids)) for r in rows),
+                       dtype=np.int64, count=len(rows))
+
+def _neighbour_tests(v, pres, same_prev, same_next, spike, gradient):
+    """Boolean mask of test 9 / 11 failures; end levels and gaps are never flagged."""
+    bad = np.zeros(len(v), dtype=bool)
+    if len(v) < 3:
+        return bad
+    v1, v2, v3 = v[:-2], v[1:-1], v[2:]
+    inner = same_prev[1:-1] & same_next[1:-1]
+    deep = pres[1:-1] >= DEEP_PRES
+    with np.errstate(invalid="ignore"):
+        mid = np.abs(v2 - (v1 + v3) / 2)
+        spike_lim = np.where(deep, spike[1], spike[0])
+        grad_lim = np.where(deep, gradient[1], gradient[0])
+        fail = (mid - np.abs((v3 - v1) / 2) > spike_lim) | (mid > grad_lim)
+    bad[1:-1] = inner & fail  # comparisons with NaN are False
+    return bad
+
+def qc_flags(rows):
+    """
+    [(pres_qc, temp_qc, psal_qc)] for a batch of argo_data record tuples, in batch order.
+    """
+    n = len(rows)
+    if n == 0:
+        return []
+    profile = _profile_ids(rows)
+    # group profiles together but keep each profile's own level order
+    order = np.argsort(profile, kind="stable")
+    profile = profile[order]
+    values = {name: _floats(rows, idx)[order] for name, idx in (("pres", PRES), ("temp", TEMP), ("psal", PSAL))}
+    pres = values["pres"]
+
+    same_prev = np.zeros(n, dtype=bool)
+    same_prev[1:] = profile[1:] == profile[:-1]
+    same_next = np.zeros(n, dtype=bool)
+    same_next[:-1] = same_prev[1:]
+
+    flags = {}
+    for name, v in values.items():
+        lo, hi = RANGES[name]
+        with np.errstate(invalid="ignore"):
+            bad = v < lo if hi is None else (v < lo) | (v > hi)
+        flags[name] = np.where(np.isnan(v), MISSING, np.where(bad, BAD, GOOD)).astype(np.int8)
+
+    # test 8: pressure must increase level by level within a profile
+    with np.errstate(invalid="ignore"):
+        not_increasing = np.zeros(n, dtype=bool)
+        not_increasing[1:] = same_prev[1:] & (pres[1:] <= pres[:-1])
+    # duplicate levels: the same pressure anywhere earlier in the profile
+    dup = np.zeros(n, dtype=bool)
+    has_pres = ~np.isnan(pres)
+    if has_pres.any():
+        keys = np.stack([profile[has_pres], pres[has_pres]], axis=1)
+        _, first = np.unique(keys, axis=0, return_index=True)
+        seen_before = np.ones(has_pres.sum(), dtype=bool)
+        seen_before[first] = False
+        dup[np.flatnonzero(has_pres)] = seen_before
+    flags["pres"][(not_increasing | dup) & has_pres] = BAD
+
+    # tests 9 and 11 on the levels whose pressure and value passed so far
+    for name in ("temp", "psal"):
+        v = np.where((flags[name] == GOOD) & (flags["pres"] == GOOD), values[name], np.nan)
+        bad = _neighbour_tests(v, pres, same_prev, same_next, SPIKE[name], GRADIENT[name])
+        flags[name][bad] = BAD
+
+    out = np.empty((n, 3), dtype=np.int8)
+    out[order] = np.stack([flags["pres"], flags["temp"], flags["psal"]], axis=1)
+    return [tuple(r) for r in out.tolist()]
+
+def with_qc(rows, enabled=True):
+    """Record tuples with (pres_qc, temp_qc, psal_qc) appended (NULLs when QC is off)."""
+    if not enabled:
+        return [r + (None, None, None) for r in rows]
+    return [r + f for r, f in zip(rows, qc_flags(rows))]
@@ -0,0 +1,79 @@
+"""
+ingest_rejects.py
+
+Quarantine for source rows the importers cannot load.
+- Decoders yield a Reject (line number, reason code, raw row) in place of a record.
+- RejectLog buffers them per connection and writes them to ingest_rejects with one
+  execute_values per batch, right after the data batch it belongs to.
+- Nothing is printed per row; print_summary() gives counts per reason at the end.
+"""
+
+import json
+from collections import Counter, namedtuple
+from psycopg2.extras import execute_values
+
+# Reason codes
+BAD_JULD = "bad_juld"
+PARSE_ERROR = "parse_error"
+
+Reject = namedtuple("Reject", ["line", "reason", "raw", "detail"])
+Reject.__new__.__defaults__ = (None,)
+
+REJECTS_SQL = """
+CREATE TABLE IF NOT EXISTS ingest_rejects (
+    id BIGSERIAL PRIMARY KEY,
+    target_table TEXT NOT NULL,
+    source_file TEXT NOT NULL,
+    line_no INT,
+    reason TEXT NOT NULL,
+    detail TEXT,
+    raw_row JSONB,
+    rejected_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS idx_ingest_rejects_file ON ingest_rejects (source_file);
+"""
+
+INSERT_SQL = """
+INSERT INTO ingest_rejects (target_table, source_file, line_no, reason, detail, raw_row)
+VALUES %s;
+"""
+
+def ensure_rejects(conn):
+    with conn.cursor() as cur:
+        cur.execute(REJECTS_SQL)
+        conn.commit()
+
+def is_reject(item):
+    return isinstance(item, Reject)
+
+class RejectLog:
+    """Per-connection buffer of rejected rows plus running counts by reason."""
+
+    def __init__(self, target_table):
+        self.target_table = target_table
+        self.pending = []
+        self.counts = Counter()
+
+    def add(self, source_file, reject):
+        raw = json.dumps(reject.raw, default=str) if reject.raw is not None else None
+        self.pending.append((self.target_table, source_file, reject.line, reject.reason, reject.detail, raw))
+        self.counts[reject.reason] += 1
+
+    def flush(self, conn):
+        """Write buffered rejects in one statement and commit. Returns how many were written."""
+        if not self.pending:
+            return 0
+        with conn.cursor() as cur:
+            execute_values(cur, INSERT_SQL, self.pending, page_size=1000)
+            conn.commit()
+        written = len(self.pending)
+        self.pending = []
+        return written
+
+def print_summary(counts):
+    total = sum(counts.values())
+    if not total:
+        print("Rows rejected: 0")
+        return
+    by_reason = ", ".join(f"{reason}={n}" for reason, n in counts.most_common())
+    print(f"Rows rejected: {total} ({by_reason}); details in ingest_rejects")
@@ -0,0 +1,179 @@
+"""
+ingest_watch.py
+
+Watch-folder daemon for bulk_import.py (--watch): new CSVs are loaded seconds after they land.
+- Polls the folder with os.scandir every --poll seconds and nothing is re-globbed.
+  Files are only stat'ed until they are ready; a ready file is then read once to
+  hash it for the manifest (plan_file) and again when its micro-batch is ingested.
+  A ready file that cannot be read yet (e.g. PermissionError) is retried next poll.
+- A file is picked up once its size and mtime have not changed for one poll, so
+  files still being written by the converters are left alone.
+- Ready files are grouped into micro-batches, flushed when --max-files or --max-bytes
+  is reached or the oldest waiting file is --max-wait seconds old.
+- Each micro-batch goes through bulk_import.ingest_files on one persistent connection;
+  its files are then marked done in ingest_manifest, so a restart skips them.
+- The connection is only re-opened (with backoff) after it has actually failed;
+  the micro-batch that hit the failure is retried. A micro-batch whose ingest fails
+  for any other reason is reported and dropped; its files are picked up again once
+  they change.
+- With --metrics-json / --metrics-prom the reports are rewritten after every micro-batch.
+- SIGINT / SIGTERM finish the current micro-batch and exit.
+"""
+
+import os
+import time
+import signal
+import fnmatch
+import psycopg2
+
+from ingest_manifest import ensure_manifest, load_manifest, plan_file, record_progress
+from ingest_metrics import METRICS
+
+class FolderWatcher:
+    """Tracks directory entries between polls and reports files that became ready."""
+
+    def __init__(self, folder, pattern):
+        self.folder = folder
+        self.pattern = pattern
+        self.candidates = {}   # path -> (size, mtime) seen on the previous poll
+        self.handled = set()   # (path, (size, mtime)) already queued or loaded
+
+    def poll(self):
+        """Return [(path, size)] of files whose size and mtime held still since the last poll."""
+        current = {}
+        with os.scandir(self.folder) as it:
+            for e in it:
+                if e.is_file() and fnmatch.fnmatch(e.name, self.pattern):
+                    st = e.stat()
+                    current[os.path.abspath(e.path)] = (st.st_size, st.st_mtime)
+
+        ready = []
+        for path, sig in current.items():
+            if (path, sig) in self.handled:
+                continue
+            if self.candidates.get(path) == sig:
+                self.handled.add((path, sig))
+                ready.append((path, sig[0]))
+        self.candidates = current
+        # forget files that were removed so the set does not grow forever
+        self.handled = {(p, sig) for p, sig in self.handled if current.get(p) == sig}
+        return ready
+
+    def retry(self, path):
+        """Report path as ready again on the next poll (if it is still unchanged)."""
+        self.handled = {(p, sig) for p, sig in self.handled if p != path}
+
+def watch_folder(dsn, folder, pattern="*.csv", poll_interval=2.0, max_files=200, max_bytes=256 << 20,
+                 max_wait=10.0, ingest_kwargs=None, table="argo_data"):
+    """
+    Run until SIGINT/SIGTERM. ingest_kwargs are passed to bulk_import.ingest_files
+    (batch_size, loader, decoder).
+    """
+    from bulk_import import ensure_schema, ingest_files
+
+    ingest_kwargs = ingest_kwargs or {}
+    stopping = []
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stopping.append(True))
+
+    conn = None
+    manifest = {}
+    watcher = FolderWatcher(folder, pattern)
+    waiting = []          # [(entry, size)] ready but not loaded yet
+    waiting_since = None
+    backoff = 1.0
+    totals = {"files": 0, "rows": 0, "batches": 0}
+
+    print(f"👀 Watching {folder} for '{pattern}' (poll {poll_interval}s, max {max_files} files / "
+          f"{max_bytes >> 20} MB / {max_wait}s per micro-batch). Ctrl+C to stop.")
+    while True:
+        try:
+            if conn is None or conn.closed:
+                conn = psycopg2.connect(dsn)
+                ensure_schema(conn)
+                ensure_manifest(conn)
+                manifest = load_manifest(conn, table)
+                backoff = 1.0
+
+            if not stopping:
+                ready = watcher.poll()
+                for i, (path, size) in enumerate(ready):
+                    try:
+                        entry = plan_file(conn, manifest, table, path)
+                    except FileNotFoundError:
+                        continue  # removed again before we got to it
+                    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                        for p, _ in ready[i:]:
+                            watcher.retry(p)
+                        raise
+                    except Exception as e:
+                        watcher.retry(path)
+                        print(f"⚠ Cannot read {os.path.basename(path)} yet ({e}); retrying next poll")
+                        continue
+                    if entry["skip"]:
+                        continue
+                    waiting.append((entry, size))
+                    if waiting_since is None:
+                        waiting_since = time.monotonic()
+
+            due = waiting and (stopping
+                               or len(waiting) >= max_files
+                               or sum(size for _, size in waiting) >= max_bytes
+                               or time.monotonic() - waiting_since >= max_wait)
+            if due:
+                batch = waiting[:max_files]
+                file_rows = {}
+                started = time.perf_counter()
+                try:
+                    stats = ingest_files(conn, [e["path"] for e, _ in batch], file_rows=file_rows,
+                                         **ingest_kwargs)
+                except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                    raise
+                except Exception as e:
+                    conn.rollback()
+                    waiting = waiting[len(batch):]
+                    waiting_since = time.monotonic() if waiting else None
+                    print(f"❌ micro-batch of {len(batch)} files failed: {e}")
+                    continue
+                record_progress(conn, table, [(e, file_rows.get(e["path"], 0), True) for e, _ in batch])
+                for e, _ in batch:
+                    manifest[e["path"]] = {"size": e["size"], "mtime": e["mtime"], "sha256": e["sha256"],
+                                           "rows_committed": file_rows.get(e["path"], 0), "status": "done"}
+                waiting = waiting[len(batch):]
+                waiting_since = time.monotonic() if waiting else None
+                totals["files"] += len(batch)
+                totals["rows"] += stats["rows"]
+                totals["batches"] += 1
+                METRICS.count("files", len(batch))
+                METRICS.count("rejected", sum(stats["rejects"].values()))
+                METRICS.report()
+                print(f"✅ micro-batch {totals['batches']}: {len(batch)} files, {stats['rows']} rows in "
+                      f"{time.perf_counter() - started:.2f}s (total {totals['files']} files, {totals['rows']} rows)")
+                continue
+
+            if stopping:
+                break
+            time.sleep(poll_interval)
+
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            print(f"⚠ Database connection lost ({e}); reconnecting in {backoff:.0f}s")
+            if conn is not None:
+                conn.close()
+            conn = None
+            if stopping:
+                break
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+        except Exception as e:
+            # not the ingest itself (handled above): keep the waiting files and try again
+            if conn is not None and not conn.closed:
+                conn.rollback()
+            print(f"⚠ Watch loop error ({e}); retrying in {poll_interval}s")
+            if stopping:
+                break
+            time.sleep(poll_interval)
+
+    if conn is not None:
+        conn.close()
+    print(f"---- Watch stopped: {totals['files']} files, {totals['rows']} rows in {totals['batches']} micro-batches ----")
+    return totals
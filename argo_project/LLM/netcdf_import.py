@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+netcdf_import.py
+
+Ingest Argo profile NetCDF files (*.nc) straight into argo_data, without the CSV round trip.
+- Applies the same calibration filter and raw-vs-adjusted QC selection as the upload
+  service (argo_netcdf.apply_qc, used by clean_and_bin_netcdf), but keeps every level
+  instead of binning.
+- Maps the cleaned frame onto the argo_data columns and hands the records to the
+  bulk_import loaders (execute_values, COPY or profile replace), so schema, upsert semantics, --workers
+  and --pipeline behave exactly as for CSV folders.
+- --derive stores the TEOS-10 columns (depth, SA, CT, sigma0) computed per batch.
+"""
+
+import os
+import sys
+import argparse
+import psycopg2
+import pandas as pd
+
+import bulk_import
+from bulk_import import DEFAULT_BATCH_SIZE, LOADERS, ensure_schema, ingest_folder
+from ingest_rejects import BAD_JULD, Reject
+
+# argo_netcdf.py lives next to clean.py in argo_project/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from argo_netcdf import apply_qc, load_netcdf_frame  # noqa: E402
+
+COLUMNS = bulk_import.COLUMNS
+TEXT_COLUMNS = ["platform_number", "direction", "platform_type", "data_mode"]
+
+# ---------- Frame -> records ----------
+def text_column(col):
+    """bytes/str column -> stripped str, empty -> None (what clean.py + clean_text produced)."""
+    if col.dtype == object:
+        col = col.map(lambda x: x.decode("utf-8", errors="ignore") if isinstance(x, (bytes, bytearray)) else x)
+    s = col.astype("string").str.strip()
+    return s.where(s != "")
+
+def to_argo_frame(df):
+    """Select and type the argo_data columns from a cleaned NetCDF frame."""
+    out = pd.DataFrame(index=df.index)
+    for c in COLUMNS:
+        if c not in df.columns:
+            out[c] = None
+        elif c in TEXT_COLUMNS:
+            out[c] = text_column(df[c])
+        elif c == "cycle_number":
+            out[c] = pd.to_numeric(df[c], errors="coerce").astype("Int64")
+        elif c == "date_creation":
+            # stored as a YYYYMMDDHHMMSS character array, not decoded by xarray
+            out[c] = pd.to_datetime(text_column(df[c]), format="%Y%m%d%H%M%S", errors="coerce")
+        elif c == "juld":
+            out[c] = pd.to_datetime(df[c], errors="coerce")
+        else:
+            out[c] = pd.to_numeric(df[c], errors="coerce")
+    return out
+
+def iter_netcdf_records(path):
+    """
+    Yield one item per cleaned level: an argo_data record tuple, or a Reject for a level
+    without a usable juld (same contract as bulk_import.iter_records).
+    """
+    df, _, error = apply_qc(load_netcdf_frame(path), debug=False)
+    if error:
+        print(f"⚠ {os.path.basename(path)}: {error}")
+        return
+    frame = to_argo_frame(df)
+    keep = frame["juld"].notna()
+    arrays = {c: frame.loc[keep, c].astype(object).where(frame.loc[keep, c].notna(), None).tolist()
+              for c in COLUMNS}
+    yield from zip(*(arrays[c] for c in COLUMNS))
+    for idx in frame.index[~keep.to_numpy()]:
+        yield Reject(None, BAD_JULD, None, f"level {idx} of the cleaned frame")
+
+# ---------- CLI ----------
+def main():
+    parser = argparse.ArgumentParser(description="Ingest Argo NetCDF profile files directly into argo_data.")
+    parser.add_argument("--folder", "-f", required=True, help="Path to folder containing .nc files.")
+    parser.add_argument("--db", "-d", default="dbname=argo_db user=postgres password=1212 host=localhost port=5432", help="psycopg2 connection string (or use env vars).")
+    parser.add_argument("--batch", "-b", type=int, default=DEFAULT_BATCH_SIZE, help="Batch size for inserts.")
+    parser.add_argument("--pattern", "-p", default="*.nc", help="glob pattern for files (default *.nc).")
+    parser.add_argument("--loader", "-l", choices=sorted(LOADERS), default="values",
+                        help="values = execute_values upsert; copy = COPY into staging table + set-based merge; "
+                             "replace = replace whole profiles (delayed-mode reprocessing).")
+    parser.add_argument("--workers", "-w", type=int, default=1,
+                        help="Number of worker processes, each with its own DB connection (default 1).")
+    parser.add_argument("--derive", action="store_true",
+                        help="Store TEOS-10 depth, abs_salinity, cons_temp and sigma0 with the rows (needs gsw).")
+    args = parser.parse_args()
+
+    conn = None
+    try:
+        conn = psycopg2.connect(args.db)
+        ensure_schema(conn)
+        ingest_folder(conn, args.folder, batch_size=args.batch, pattern=args.pattern, loader=args.loader,
+                      workers=args.workers, dsn=args.db, decoder=iter_netcdf_records,
+                      derive=args.derive)
+    except Exception as e:
+        print("❌ Fatal error:", e)
+    finally:
+        if conn:
+            conn.close()
+
+if __name__ == "__main__":
+    main()
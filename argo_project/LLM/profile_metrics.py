@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+profile_metrics.py
+
+Per-profile oceanographic summary next to argo_profiles, for questions like
+"profiles with a deep mixed layer" or "strong thermocline in 2023".
+- profile_metrics: one row per (platform, cycle, direction) with juld and location,
+  max_pres / max_depth, mixed layer depth, thermocline depth and strength,
+  surface and 1000 m temperature / salinity.
+- Mixed layer depth: temperature criterion of de Boyer Montegut et al. (2004),
+  |T - T(10 m)| > 0.2 degC, interpolated between levels; mixed to the bottom gives max_depth.
+- Thermocline: the layer below the mixed layer (and above 1000 m) with the steepest
+  temperature decrease; depth is its midpoint, strength the gradient in degC/m.
+- Surface values come from the shallowest level if it is within 10 dbar; 1000 m values
+  are interpolated at 1000 dbar when the profile brackets it.
+- Depths use the UNESCO 1983 pressure-to-depth formula (no extra dependency).
+- The importers refresh it in the batch transaction right after argo_profiles
+  (refresh_metrics), from the fresh profile arrays; --rebuild fills it from argo_profiles.
+- Each metric has a B-tree index (plus juld and a GIST on location), so range questions
+  are index range scans instead of aggregations over argo_data.
+"""
+
+import argparse
+import numpy as np
+import psycopg2
+from psycopg2.extras import execute_values
+
+DEFAULT_DSN = "dbname=argo_db user=postgres password=1212 host=localhost port=5432"
+
+MLD_REF_PRES = 10.0
+MLD_MAX_REF_PRES = 20.0  # no reference level this shallow -> no MLD
+MLD_DELTA_T = 0.2
+SURFACE_MAX_PRES = 10.0
+DEEP_PRES = 1000.0
+
+METRICS_SQL = """
+CREATE TABLE IF NOT EXISTS profile_metrics (
+    platform_number TEXT NOT NULL,
+    cycle_number INT NOT NULL,
+    direction TEXT NOT NULL,
+    juld TIMESTAMPTZ NOT NULL,
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION,
+    location GEOGRAPHY(Point, 4326),
+    n_levels INT NOT NULL,
+    max_pres DOUBLE PRECISION,
+    max_depth DOUBLE PRECISION,
+    mld DOUBLE PRECISION,
+    thermocline_depth DOUBLE PRECISION,
+    thermocline_strength DOUBLE PRECISION,
+    surface_temp DOUBLE PRECISION,
+    surface_psal DOUBLE PRECISION,
+    temp_1000 DOUBLE PRECISION,
+    psal_1000 DOUBLE PRECISION,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (platform_number, cycle_number, direction)
+);
+CREATE INDEX IF NOT EXISTS idx_profile_metrics_juld ON profile_metrics (juld);
+CREATE INDEX IF NOT EXISTS idx_profile_metrics_location ON profile_metrics USING GIST (location);
+CREATE INDEX IF NOT EXISTS idx_profile_metrics_mld ON profile_metrics (mld);
+CREATE INDEX IF NOT EXISTS idx_profile_metrics_thermocline_strength ON profile_metrics (thermocline_strength);
+CREATE INDEX IF NOT EXISTS idx_profile_metrics_thermocline_depth ON profile_metrics (thermocline_depth);
+CREATE INDEX IF NOT EXISTS idx_profile_metrics_max_depth ON profile_metrics (max_depth);
+CREATE INDEX IF NOT EXISTS idx_profile_metrics_surface_temp ON profile_metrics (surface_temp);
+CREATE INDEX IF NOT EXISTS idx_profile_metrics_temp_1000 ON profile_metrics (temp_1000);
+"""
+
+METRIC_COLUMNS = [
+    "platform_number", "cycle_number", "direction", "juld", "latitude", "longitude", "location",
+    "n_levels", "max_pres", "max_depth", "mld", "thermocline_depth", "thermocline_strength",
+    "surface_temp", "surface_psal", "temp_1000", "psal_1000",
+]
+# (longitude, latitude) fill the location slot
+INSERT_TEMPLATE = "(%s, %s, %s, %s, %s, %s, ST_SetSRID(ST_MakePoint(%s, %s), 4326)::GEOGRAPHY, " \
+                  + ", ".join(["%s"] * 10) + ")"
+INSERT_SQL = f"INSERT INTO profile_metrics ({', '.join(METRIC_COLUMNS)}) VALUES %s"
+
+PROFILE_FIELDS = "platform_number, cycle_number, direction, juld, latitude, longitude, pres, temp, psal"
+
+# Runs after argo_profiles.refresh_profiles on the same transaction, which already
+# holds the advisory locks of these profiles.
+SELECT_KEYS_SQL = f"""
+SELECT {PROFILE_FIELDS} FROM argo_profiles p
+JOIN unnest(%(platforms)s::text[], %(cycles)s::int[]) AS k(platform_number, cycle_number)
+  USING (platform_number, cycle_number)
+WHERE p.juld BETWEEN %(juld_min)s::timestamptz AND %(juld_max)s::timestamptz;
+"""
+DELETE_KEYS_SQL = """
+DELETE FROM profile_metrics m
+USING unnest(%(platforms)s::text[], %(cycles)s::int[]) AS k(platform_number, cycle_number)
+WHERE m.platform_number = k.platform_number AND m.cycle_number = k.cycle_number;
+"""
+
+def ensure_metrics(conn):
+    with conn.cursor() as cur:
+        cur.execute(METRICS_SQL)
+        conn.commit()
+
+# ---------- Metrics ----------
+def pres_to_depth(pres, lat):
+    """Depth in m from pressure in dbar (UNESCO 1983, Fofonoff & Millard)."""
+    x = np.sin(np.radians(lat if lat is not None else 45.0)) ** 2
+    g = 9.780318 * (1.0 + (5.2788e-3 + 2.36e-5 * x) * x) + 1.092e-6 * pres
+    return ((((-1.82e-15 * pres + 2.279e-10) * pres - 2.2512e-5) * pres + 9.72659) * pres) / g
+
+def _float(v):
+    return None if v is None or v != v else float(v)
+
+def compute_metrics(pres, temp, psal, lat=None):
+    """
+    Metrics of one profile from its level arrays (sorted by pressure, None for gaps).
+    Returns (n_levels, max_pres, max_depth, mld, thermocline_depth, thermocline_strength,
+    surface_temp, surface_psal, temp_1000, psal_1000).
+    """
+    p = np.array([np.nan if v is None else v for v in pres], dtype=np.float64)
+    t = np.array([np.nan if v is None else v for v in temp], dtype=np.float64)
+    s = np.array([np.nan if v is None else v for v in psal], dtype=np.float64)
+    n_levels = len(p)
+    has_p = ~np.isnan(p)
+    if not has_p.any():
+        return (n_levels,) + (None,) * 9
+    max_pres = float(p[has_p].max())
+    max_depth = float(pres_to_depth(max_pres, lat))
+
+    # temperature levels with strictly increasing pressure
+    ok = has_p & ~np.isnan(t)
+    tp, tt = p[ok], t[ok]
+    if len(tp):
+        keep = np.concatenate(([True], np.diff(tp) > 0))
+        tp, tt = tp[keep], tt[keep]
+    z = pres_to_depth(tp, lat)
+
+    surface_temp = float(tt[0]) if len(tp) and tp[0] <= SURFACE_MAX_PRES else None
+    sp = p[has_p & ~np.isnan(s)]
+    ss = s[has_p & ~np.isnan(s)]
+    surface_psal = float(ss[0]) if len(sp) and sp[0] <= SURFACE_MAX_PRES else None
+    temp_1000 = float(np.interp(DEEP_PRES, tp, tt)) if len(tp) and tp[0] <= DEEP_PRES <= tp[-1] else None
+    psal_1000 = (float(np.interp(DEEP_PRES, sp, ss))
+                 if len(sp) > 1 and np.all(np.diff(sp) > 0) and sp[0] <= DEEP_PRES <= sp[-1] else None)
+
+    mld = None
+    if len(tp) >= 2 and tp[0] <= MLD_MAX_REF_PRES:
+        ref_p = max(MLD_REF_PRES, tp[0])
+        ref_t = np.interp(ref_p, tp, tt)
+        below = tp > ref_p
+        crossed = np.flatnonzero(below & (np.abs(tt - ref_t) > MLD_DELTA_T))
+        if len(crossed):
+            i = crossed[0]
+            # interpolate to where |T - ref| reaches the threshold, starting from the
+            # level above (or the reference level itself when that is deeper)
+            if tp[i - 1] >= ref_p:
+                z0, d0 = z[i - 1], abs(tt[i - 1] - ref_t)
+            else:
+                z0, d0 = pres_to_depth(ref_p, lat), 0.0
+            d1 = abs(tt[i] - ref_t)
+            frac = (MLD_DELTA_T - d0) / (d1 - d0) if d1 != d0 else 1.0
+            mld = float(z0 + np.clip(frac, 0.0, 1.0) * (z[i] - z0))
+        else:
+            mld = float(z[-1])
+
+    thermocline_depth = thermocline_strength = None
+    if len(tp) >= 2:
+        gradient = -np.diff(tt) / np.diff(z)  # degC per m, positive when cooling with depth
+        mid = (z[:-1] + z[1:]) / 2
+        layer = (mid <= pres_to_depth(DEEP_PRES, lat)) & (mid >= (mld or 0.0))
+        if layer.any():
+            i = np.flatnonzero(layer)[np.argmax(gradient[layer])]
+            if gradient[i] > 0:
+                thermocline_depth, thermocline_strength = float(mid[i]), float(gradient[i])
+
+    return (n_levels, max_pres, max_depth, mld, thermocline_depth, thermocline_strength,
+            surface_temp, surface_psal, temp_1000, psal_1000)
+
+def metric_rows(profiles):
+    """INSERT_TEMPLATE tuples for profile rows in PROFILE_FIELDS order."""
+    out = []
+    for platform, cycle, direction, juld, lat, lon, pres, temp, psal in profiles:
+        m = compute_metrics(pres, temp, psal, lat)
+        out.append((platform, cycle, direction, juld, lat, lon, lon, lat) + tuple(_float(v) for v in m))
+    return out
+
+# ---------- Refresh ----------
+def refresh_metrics(cur, keys, bounds=None):
+    """
+    Recompute the given profiles from argo_profiles on cur's transaction (the caller commits).
+    bounds is the batch's (min, max) juld, as for refresh_profiles.
+    """
+    if not keys:
+        return
+    platforms, cycles = zip(*sorted(keys))
+    juld_min, juld_max = bounds or ("-infinity", "infinity")
+    params = {"platforms": list(platforms), "cycles": list(cycles), "juld_min": juld_min, "juld_max": juld_max}
+    cur.execute(SELECT_KEYS_SQL, params)
+    rows = metric_rows(cur.fetchall())
+    cur.execute(DELETE_KEYS_SQL, params)
+    if rows:
+        execute_values(cur, INSERT_SQL, rows, template=INSERT_TEMPLATE, page_size=1000)
+
+def rebuild_metrics(conn, page=5000):
+    """Refill profile_metrics from argo_profiles, committing every page of profiles."""
+    with conn.cursor() as cur:
+        cur.execute("TRUNCATE profile_metrics;")
+    conn.commit()
+    total = 0
+    with conn.cursor(name="profile_metrics_rebuild", withhold=True) as read_cur:
+        read_cur.itersize = page
+        read_cur.execute(f"SELECT {PROFILE_FIELDS} FROM argo_profiles;")
+        conn.commit()
+        while True:
+            profiles = read_cur.fetchmany(page)
+            if not profiles:
+                break
+            with conn.cursor() as cur:
+                execute_values(cur, INSERT_SQL + " ON CONFLICT DO NOTHING", metric_rows(profiles),
+                               template=INSERT_TEMPLATE, page_size=1000)
+            conn.commit()
+            total += len(profiles)
+            print(f"  {total} profiles")
+    print(f"✅ profile_metrics rebuilt ({total} profiles).")
+    return total
+
+# ---------- CLI ----------
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the per-profile profile_metrics table.")
+    parser.add_argument("--db", "-d", default=DEFAULT_DSN, help="psycopg2 connection string (or use env vars).")
+    parser.add_argument("--rebuild", action="store_true", help="Refill profile_metrics from argo_profiles.")
+    args = parser.parse_args()
+
+    conn = None
+    try:
+        conn = psycopg2.connect(args.db)
+        ensure_metrics(conn)
+        if args.rebuild:
+            rebuild_metrics(conn)
+    except Exception as e:
+        print("❌ Fatal error:", e)
+    finally:
+        if conn:
+            conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+standard_levels.py
+
+Profiles interpolated onto fixed standard pressure levels, one row per profile.
+- argo_std_profiles stores temp[] / psal[] as REAL arrays aligned with STANDARD_LEVELS
+  (element i is the value at STANDARD_LEVELS[i] dbar, NULL where the profile has no data),
+  so depth-slice maps and profile comparisons read one pre-aligned row per profile
+  instead of binning raw argo_data rows per request.
+- Linear interpolation between the two observed levels around each standard level,
+  only if they are no further apart than MAX_GAP allows at that depth; no extrapolation
+  above the shallowest or below the deepest level.
+- Interpolation runs on a whole batch of profiles at once: all levels are laid out
+  flat, offset per profile, so one np.searchsorted finds every bracketing pair.
+- The importers refresh it in the batch transaction after argo_profiles
+  (refresh_std_levels); --rebuild fills it from argo_profiles.
+- depth_slice(conn, pres, start, end) reads one level of every profile in a time window.
+"""
+
+import argparse
+import numpy as np
+import psycopg2
+from psycopg2.extras import execute_values
+
+DEFAULT_DSN = "dbname=argo_db user=postgres password=1212 host=localhost port=5432"
+
+# dbar; WOA-style spacing, finer near the surface
+STANDARD_LEVELS = [
+    10, 20, 30, 50, 75, 100, 125, 150, 200, 250, 300, 400, 500, 600, 700, 800, 900,
+    1000, 1100, 1200, 1300, 1400, 1500, 1750, 2000,
+]
+
+# (down to pres, largest gap between the bracketing levels); deeper levels are sparser
+MAX_GAP = [(100, 50.0), (1000, 200.0), (float("inf"), 500.0)]
+
+# keeps every profile's pressures in its own range of the flat layout
+PROFILE_STRIDE = 100000.0
+
+STD_SQL = """
+CREATE TABLE IF NOT EXISTS argo_std_profiles (
+    platform_number TEXT NOT NULL,
+    cycle_number INT NOT NULL,
+    direction TEXT NOT NULL,
+    juld TIMESTAMPTZ NOT NULL,
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION,
+    location GEOGRAPHY(Point, 4326),
+    temp REAL[] NOT NULL,
+    psal REAL[] NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (platform_number, cycle_number, direction)
+);
+CREATE INDEX IF NOT EXISTS idx_argo_std_profiles_juld ON argo_std_profiles (juld);
+CREATE INDEX IF NOT EXISTS idx_argo_std_profiles_location ON argo_std_profiles USING GIST (location);
+
+-- the level grid, for joins and for readers that do not import this module
+CREATE TABLE IF NOT EXISTS argo_std_levels (
+    level_index INT PRIMARY KEY,  -- 1-based, like the array subscripts
+    pres REAL NOT NULL
+);
+"""
+
+STD_COLUMNS = ["platform_number", "cycle_number", "direction", "juld", "latitude", "longitude",
+               "location", "temp", "psal"]
+INSERT_TEMPLATE = ("(%s, %s, %s, %s, %s, %s, ST_SetSRID(ST_MakePoint(%s, %s), 4326)::GEOGRAPHY, "
+                   "%s::real[], %s::real[])")
+INSERT_SQL = f"INSERT INTO argo_std_profiles ({', '.join(STD_COLUMNS)}) VALUES %s"
+
+PROFILE_FIELDS = "platform_number, cycle_number, direction, juld, latitude, longitude, pres, temp, psal"
+
+# Runs after argo_profiles.refresh_profiles on the same transaction (advisory locks held).
+SELECT_KEYS_SQL = f"""
+SELECT {PROFILE_FIELDS} FROM argo_profiles p
+JOIN unnest(%(platforms)s::text[], %(cycles)s::int[]) AS k(platform_number, cycle_number)
+  USING (platform_number, cycle_number)
+WHERE p.juld BETWEEN %(juld_min)s::timestamptz AND %(juld_max)s::timestamptz;
+"""
+DELETE_KEYS_SQL = """
+DELETE FROM argo_std_profiles s
+USING unnest(%(platforms)s::text[], %(cycles)s::int[]) AS k(platform_number, cycle_number)
+WHERE s.platform_number = k.platform_number AND s.cycle_number = k.cycle_number;
+"""
+
+def ensure_std_levels(conn):
+    with conn.cursor() as cur:
+        cur.execute(STD_SQL)
+        execute_values(cur, "INSERT INTO argo_std_levels (level_index, pres) VALUES %s "
+                            "ON CONFLICT (level_index) DO UPDATE SET pres = EXCLUDED.pres;",
+                       list(enumerate(STANDARD_LEVELS, 1)))
+        conn.commit()
+
+# ---------- Interpolation ----------
+def _max_gap(levels):
+    gaps = np.empty(len(levels))
+    for i, p in enumerate(levels):
+        gaps[i] = next(g for limit, g in MAX_GAP if p <= limit)
+    return gaps
+
+STD = np.array(STANDARD_LEVELS, dtype=np.float64)
+STD_GAP = _max_gap(STANDARD_LEVELS)
+
+def interpolate_profiles(pres_list, value_list):
+    """
+    Interpolate many profiles at once: pres_list / value_list hold one sequence per profile
+    (None for gaps). Returns an (n_profiles, len(STANDARD_LEVELS)) float array, NaN where
+    a level cannot be interpolated.
+    """
+    n = len(pres_list)
+    out = np.full((n, len(STD)), np.nan)
+    if n == 0:
+        return out
+    lengths = np.array([len(p) for p in pres_list])
+    pid = np.repeat(np.arange(n), lengths)
+    p = np.array([np.nan if v is None else v for seq in pres_list for v in seq], dtype=np.float64)
+    v = np.array([np.nan if x is None else x for seq in value_list for x in seq], dtype=np.float64)
+    ok = ~np.isnan(p) & ~np.isnan(v) & (p >= 0) & (p < PROFILE_STRIDE)
+    pid, p, v = pid[ok], p[ok], v[ok]
+    if not len(p):
+        return out
+
+    key = pid * PROFILE_STRIDE + p
+    order = np.argsort(key, kind="stable")
+    key, pid, p, v = key[order], pid[order], p[order], v[order]
+
+    targets = (np.arange(n)[:, None] * PROFILE_STRIDE + STD[None, :]).ravel()
+    hi = np.searchsorted(key, targets, side="left")
+    lo = hi - 1
+    target_pid = np.repeat(np.arange(n), len(STD))
+    hi_c, lo_c = np.clip(hi, 0, len(key) - 1), np.clip(lo, 0, len(key) - 1)
+
+    # exact hits
+    exact = (hi < len(key)) & (key[hi_c] == targets)
+    # a bracketing pair inside the same profile, close enough together
+    gap = np.tile(STD_GAP, n)
+    inside = ((lo >= 0) & (hi < len(key)) & (pid[lo_c] == target_pid) & (pid[hi_c] == target_pid)
+              & (p[hi_c] - p[lo_c] <= gap) & (p[hi_c] > p[lo_c]))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        frac = (np.tile(STD, n) - p[lo_c]) / (p[hi_c] - p[lo_c])
+        interp = v[lo_c] + frac * (v[hi_c] - v[lo_c])
+    flat = np.where(exact, v[hi_c], np.where(inside, interp, np.nan))
+    return flat.reshape(n, len(STD))
+
+def _arrays(matrix):
+    """Rows of a float matrix as lists for REAL[] (NaN -> NULL)."""
+    return [[None if x != x else round(x, 4) for x in row] for row in matrix.tolist()]
+
+def std_rows(profiles):
+    """INSERT_TEMPLATE tuples for profile rows in PROFILE_FIELDS order."""
+    if not profiles:
+        return []
+    temps = _arrays(interpolate_profiles([r[6] for r in profiles], [r[7] for r in profiles]))
+    psals = _arrays(interpolate_profiles([r[6] for r in profiles], [r[8] for r in profiles]))
+    return [(platform, cycle, direction, juld, lat, lon, lon, lat, t, s)
+            for (platform, cycle, direction, juld, lat, lon, _, _, _), t, s in zip(profiles, temps, psals)]
+
+# ---------- Refresh ----------
+def refresh_std_levels(cur, keys, bounds=None):
+    """
+    Re-interpolate the given profiles from argo_profiles on cur's transaction (the caller commits).
+    bounds is the batch's (min, max) juld, as for refresh_profiles.
+    """
+    if not keys:
+        return
+    platforms, cycles = zip(*sorted(keys))
+    juld_min, juld_max = bounds or ("-infinity", "infinity")
+    params = {"platforms": list(platforms), "cycles": list(cycles), "juld_min": juld_min, "juld_max": juld_max}
+    cur.execute(SELECT_KEYS_SQL, params)
+    rows = std_rows(cur.fetchall())
+    cur.execute(DELETE_KEYS_SQL, params)
+    if rows:
+        execute_values(cur, INSERT_SQL, rows, template=INSERT_TEMPLATE, page_size=1000)
+
+def rebuild_std_levels(conn, page=5000):
+    """Refill argo_std_profiles from argo_profiles, one page of profiles per transaction."""
+    with conn.cursor() as cur:
+        cur.execute("TRUNCATE argo_std_profiles;")
+    conn.commit()
+    total = 0
+    with conn.cursor(name="std_levels_rebuild", withhold=True) as read_cur:
+        read_cur.itersize = page
+        read_cur.execute(f"SELECT {PROFILE_FIELDS} FROM argo_profiles;")
+        conn.commit()
+        while True:
+            profiles = read_cur.fetchmany(page)
+            if not profiles:
+                break
+            with conn.cursor() as cur:
+                execute_values(cur, INSERT_SQL + " ON CONFLICT DO NOTHING", std_rows(profiles),
+                               template=INSERT_TEMPLATE, page_size=1000)
+            conn.commit()
+            total += len(profiles)
+            print(f"  {total} profiles")
+    print(f"✅ argo_std_profiles rebuilt ({total} profiles).")
+    return total
+
+# ---------- Accessors ----------
+def depth_slice(conn, pres, start=None, end=None):
+    """
+    [(platform_number, cycle_number, juld, latitude, longitude, temp, psal)] at one
+    standard level for every profile in [start, end), e.g. a 500 dbar temperature map.
+    """
+    if pres not in STANDARD_LEVELS:
+        raise ValueError(f"{pres} dbar is not a standard level; pick one of {STANDARD_LEVELS}")
+    i = STANDARD_LEVELS.index(pres) + 1
+    where, params = [f"temp[{i}] IS NOT NULL OR psal[{i}] IS NOT NULL"], []
+    if start is not None:
+        where.append("juld >= %s")
+        params.append(start)
+    if end is not None:
+        where.append("juld < %s")
+        params.append(end)
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT platform_number, cycle_number, juld, latitude, longitude, temp[{i}], psal[{i}]
+            FROM argo_std_profiles WHERE {' AND '.join(f'({w})' for w in where)} ORDER BY juld;
+        """, params)
+        return cur.fetchall()
+
+# ---------- CLI ----------
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the standard-level profile table argo_std_profiles.")
+    parser.add_argument("--db", "-d", default=DEFAULT_DSN, help="psycopg2 connection string (or use env vars).")
+    parser.add_argument("--rebuild", action="store_true", help="Refill argo_std_profiles from argo_profiles.")
+    args = parser.parse_args()
+
+    conn = None
+    try:
+        conn = psycopg2.connect(args.db)
+        ensure_std_levels(conn)
+        if args.rebuild:
+            rebuild_std_levels(conn)
+    except Exception as e:
+        print("❌ Fatal error:", e)
+    finally:
+        if conn:
+            conn.close()
+
+if __name__ == "__main__":
+    main()
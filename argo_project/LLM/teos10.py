@@ -0,0 +1,101 @@
+"""
+teos10.py
+
+TEOS-10 variables derived at ingest time (bulk_import.py / netcdf_import.py --derive),
+so read paths get them as plain columns of argo_data instead of recomputing per query.
+- depth (m, positive down)       = -gsw.z_from_p(pres, latitude)
+- abs_salinity (SA, g/kg)         = gsw.SA_from_SP(psal, pres, longitude, latitude)
+- cons_temp (CT, degC)            = gsw.CT_from_t(SA, temp, pres)
+- sigma0 (potential density anomaly at 0 dbar, kg/m3) = gsw.sigma0(SA, CT)
+- Computed for a whole batch at once as NumPy arrays; a missing input gives NULL.
+- backfill_derived fills rows loaded before, one hypertable chunk per transaction.
+gsw (the TEOS-10 package) is only imported when derived columns are asked for.
+"""
+
+import time
+import numpy as np
+from psycopg2.extras import execute_values
+
+DERIVED_COLUMNS = ["depth", "abs_salinity", "cons_temp", "sigma0"]
+
+# record tuple positions (bulk_import.COLUMNS)
+LATITUDE, LONGITUDE, PRES, TEMP, PSAL = 6, 7, 9, 10, 11
+
+BACKFILL_PAGE = 50000
+
+def _floats(rows, idx):
+    return np.fromiter((np.nan if r[idx] is None else r[idx] for r in rows), dtype=np.float64, count=len(rows))
+
+def derive(pres, temp, psal, lon, lat):
+    """(depth, SA, CT, sigma0) float arrays from equally long input arrays (NaN = missing)."""
+    import gsw
+    depth = -gsw.z_from_p(pres, lat)
+    sa = gsw.SA_from_SP(psal, pres, lon, lat)
+    ct = gsw.CT_from_t(sa, temp, pres)
+    return depth, sa, ct, gsw.sigma0(sa, ct)
+
+def _as_rows(*arrays):
+    """Column arrays -> row tuples of Python floats, NaN -> None."""
+    stacked = np.stack(arrays, axis=1)
+    return [tuple(None if v != v else v for v in r) for r in stacked.tolist()]
+
+def derived_values(rows):
+    """[(depth, abs_salinity, cons_temp, sigma0)] for argo_data record tuples, in order."""
+    if not rows:
+        return []
+    return _as_rows(*derive(_floats(rows, PRES), _floats(rows, TEMP), _floats(rows, PSAL),
+                            _floats(rows, LONGITUDE), _floats(rows, LATITUDE)))
+
+def with_derived(rows, enabled=True):
+    """Record tuples with the DERIVED_COLUMNS appended (NULLs when derivation is off)."""
+    if not enabled:
+        return [r + (None, None, None, None) for r in rows]
+    return [r + d for r, d in zip(rows, derived_values(rows))]
+
+# ---------- Backfill ----------
+BACKFILL_UPDATE_SQL = """
+UPDATE {chunk} a
+SET depth = v.depth, abs_salinity = v.abs_salinity, cons_temp = v.cons_temp, sigma0 = v.sigma0
+FROM (VALUES %s) AS v(platform_number, juld, pres, depth, abs_salinity, cons_temp, sigma0)
+WHERE a.platform_number = v.platform_number AND a.juld = v.juld AND a.pres = v.pres;
+"""
+BACKFILL_TEMPLATE = "(%s, %s::timestamptz, %s::float8, %s::float8, %s::float8, %s::float8, %s::float8)"
+
+def backfill_derived(conn, table="argo_data", page=BACKFILL_PAGE):
+    """
+    Fill the derived columns of rows that have none yet, chunk by chunk: each chunk is
+    read in pages through a server-side cursor, derived in NumPy and written back with
+    one UPDATE ... FROM (VALUES ...) per page, then committed.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT show_chunks(%s::regclass)::text;", (table,))
+        chunks = [r[0] for r in cur.fetchall()]
+    conn.commit()
+
+    print(f"Deriving TEOS-10 columns over {len(chunks)} chunks of {table}...")
+    total = 0
+    for i, chunk in enumerate(chunks, 1):
+        t0 = time.perf_counter()
+        updated = 0
+        with conn.cursor(name="teos10_backfill") as read_cur, conn.cursor() as cur:
+            read_cur.itersize = page
+            read_cur.execute(f"""
+                SELECT platform_number, juld, pres, temp, psal, longitude, latitude FROM {chunk}
+                WHERE sigma0 IS NULL AND depth IS NULL AND pres IS NOT NULL AND latitude IS NOT NULL;
+            """)
+            while True:
+                rows = read_cur.fetchmany(page)
+                if not rows:
+                    break
+                cols = [np.array([np.nan if r[j] is None else r[j] for r in rows], dtype=np.float64)
+                        for j in range(2, 7)]
+                values = _as_rows(*derive(*cols))
+                execute_values(cur, BACKFILL_UPDATE_SQL.format(chunk=chunk),
+                               [(r[0], r[1], r[2]) + v for r, v in zip(rows, values)],
+                               template=BACKFILL_TEMPLATE, page_size=1000)
+                updated += len(rows)
+        conn.commit()
+        total += updated
+        print(f"  [{i}/{len(chunks)}] {chunk}: {updated} rows ({time.perf_counter() - t0:.1f}s)")
+    print(f"✅ TEOS-10 backfill done ({total} rows updated).")
+    return total
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+timescale_admin.py
+
+Chunk-interval and native-compression management for the argo_data / bgc_argo hypertables.
+- Chunk interval: given explicitly (--chunk-interval '30 days') or sized from the ingest
+  volume (--chunk-interval auto): bytes stored per day of juld, so one chunk plus its
+  indexes stays around --target-chunk-mb. Only chunks created afterwards use it.
+- Compression: ALTER TABLE ... SET (timescaledb.compress) with segmentby platform_number
+  and orderby pres, plus a compression policy for chunks older than --compress-after.
+  --compress-now also compresses the already eligible chunks right away.
+- Reports hypertable size and the scan time of the dashboard queries
+  (WHERE juld BETWEEN ..., see neersense/app/api/stats and temperature) before and after.
+Delayed-mode files update old profiles: upserts into compressed chunks work on
+TimescaleDB >= 2.11 but are slower, so keep --compress-after beyond the usual D-mode delay.
+
+Example:
+    python timescale_admin.py --table argo_data --chunk-interval auto --compress --compress-now
+"""
+
+import time
+import argparse
+import psycopg2
+
+DEFAULT_DSN = "dbname=argo_db user=postgres password=1212 host=localhost port=5432"
+
+# logical column -> name looked up in the table (BGC.py stores normalized upper-case headers)
+COLUMN_KEYS = {
+    "time": "JULD",
+    "platform": "PLATFORMNUMBER",
+    "pres": "PRES",
+    "temp": "TEMP",
+}
+
+# Dashboard-shaped probes; {time}/{platform}/{pres}/{temp} are resolved per table.
+BENCH_QUERIES = {
+    "daily_means": """
+        SELECT date({time}), avg({pres}), count(*)
+        FROM {table} WHERE {time} BETWEEN %(start)s AND %(end)s
+        GROUP BY 1 ORDER BY 1;
+    """,
+    "active_floats": """
+        SELECT count(DISTINCT {platform}) FROM {table} WHERE {time} BETWEEN %(start)s AND %(end)s;
+    """,
+    "depth_bins": """
+        SELECT round({pres} / 50) * 50 AS depth, avg({temp})
+        FROM {table} WHERE {time} BETWEEN %(start)s AND %(end)s AND {pres} IS NOT NULL
+        GROUP BY 1 ORDER BY 1 LIMIT 100;
+    """,
+    "one_float": """
+        SELECT {time}, {pres}, {temp} FROM {table}
+        WHERE {time} BETWEEN %(start)s AND %(end)s AND {platform} = %(platform)s
+        ORDER BY {time} DESC LIMIT 5000;
+    """,
+}
+
+# ---------- Introspection ----------
+def resolve_columns(conn, table):
+    """Map logical names to quoted column identifiers; missing ones map to None."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = 'public' AND table_name = %s;
+        """, (table,))
+        names = [r[0] for r in cur.fetchall()]
+    cols = {}
+    for key, wanted in COLUMN_KEYS.items():
+        match = next((n for n in names if n.replace("_", "").upper() == wanted), None)
+        cols[key] = f'"{match}"' if match else None
+    return cols
+
+def table_size(conn, table):
+    """(total bytes, compressed chunks, total chunks) of a hypertable."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT hypertable_size(%s::regclass);", (table,))
+        size = cur.fetchone()[0] or 0
+        cur.execute("""
+            SELECT count(*) FILTER (WHERE is_compressed), count(*)
+            FROM timescaledb_information.chunks WHERE hypertable_name = %s;
+        """, (table,))
+        compressed, chunks = cur.fetchone()
+    return size, compressed, chunks
+
+def bench_window(conn, table, cols, days=365):
+    """Default probe window: the last `days` of data, plus the busiest platform in it."""
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT max({cols['time']}) FROM {table};")
+        end = cur.fetchone()[0]
+        if end is None:
+            return None
+        cur.execute("SELECT %s::timestamptz - make_interval(days => %s);", (end, days))
+        start = cur.fetchone()[0]
+        platform = None
+        if cols["platform"]:
+            cur.execute(f"""
+                SELECT {cols['platform']} FROM {table}
+                WHERE {cols['time']} BETWEEN %s AND %s
+                GROUP BY 1 ORDER BY count(*) DESC LIMIT 1;
+            """, (start, end))
+            row = cur.fetchone()
+            platform = row[0] if row else None
+    return {"start": start, "end": end, "platform": platform}
+
+def time_queries(conn, table, cols, window, repeats=3):
+    """Best-of-N wall time per probe query (the first run also warms the cache)."""
+    timings = {}
+    for name, sql in BENCH_QUERIES.items():
+        if any(f"{{{k}}}" in sql and not cols[k] for k in cols):
+            continue
+        if "%(platform)s" in sql and window["platform"] is None:
+            continue
+        sql = sql.format(table=table, **cols)
+        best = None
+        for _ in range(repeats):
+            with conn.cursor() as cur:
+                t0 = time.perf_counter()
+                cur.execute(sql, window)
+                cur.fetchall()
+                elapsed = time.perf_counter() - t0
+            conn.rollback()
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best
+    return timings
+
+def report(conn, table, cols, window, repeats):
+    size, compressed, chunks = table_size(conn, table)
+    timings = time_queries(conn, table, cols, window, repeats) if window else {}
+    return {"bytes": size, "compressed_chunks": compressed, "chunks": chunks, "queries_s": timings}
+
+# ---------- Management ----------
+def auto_chunk_interval(conn, table, cols, target_mb):
+    """Days of juld whose rows take about target_mb, from the current size and time span."""
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT extract(epoch FROM max({cols['time']}) - min({cols['time']})) / 86400 FROM {table};")
+        span_days = cur.fetchone()[0]
+    size, _, _ = table_size(conn, table)
+    if not span_days or not size:
+        return None
+    bytes_per_day = size / max(float(span_days), 1.0)
+    days = int(target_mb * 1024 * 1024 / bytes_per_day)
+    return max(1, min(days, 365))
+
+def set_chunk_interval(conn, table, interval):
+    with conn.cursor() as cur:
+        cur.execute("SELECT set_chunk_time_interval(%s::regclass, %s::interval);", (table, interval))
+    conn.commit()
+
+def enable_compression(conn, table, segmentby, orderby, compress_after):
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            ALTER TABLE {table} SET (
+                timescaledb.compress,
+                timescaledb.compress_segmentby = %s,
+                timescaledb.compress_orderby = %s
+            );
+        """, (segmentby, orderby))
+        cur.execute("SELECT add_compression_policy(%s::regclass, %s::interval, if_not_exists => TRUE);",
+                    (table, compress_after))
+    conn.commit()
+
+def compress_now(conn, table, compress_after):
+    """Compress every chunk the policy would pick up, one transaction per chunk."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT c::text FROM show_chunks(%s::regclass, older_than => %s::interval) c;",
+                    (table, compress_after))
+        chunks = [r[0] for r in cur.fetchall()]
+    conn.commit()
+    for i, chunk in enumerate(chunks, 1):
+        with conn.cursor() as cur:
+            cur.execute("SELECT compress_chunk(%s::regclass, if_not_compressed => TRUE);", (chunk,))
+        conn.commit()
+        print(f"  [{i}/{len(chunks)}] compressed {chunk}")
+    return len(chunks)
+
+def print_report(label, r):
+    queries = ", ".join(f"{k} {v * 1000:.0f} ms" for k, v in r["queries_s"].items()) or "no data"
+    print(f"{label}: {r['bytes'] / 1024 ** 2:.1f} MB, {r['compressed_chunks']}/{r['chunks']} chunks compressed; "
+          f"{queries}")
+
+# ---------- CLI ----------
+def main():
+    parser = argparse.ArgumentParser(description="Manage chunk intervals and compression of the Argo hypertables.")
+    parser.add_argument("--db", "-d", default=DEFAULT_DSN, help="psycopg2 connection string (or use env vars).")
+    parser.add_argument("--table", "-t", choices=["argo_data", "bgc_argo"], default="argo_data")
+    parser.add_argument("--chunk-interval", help="New chunk interval, e.g. '30 days', or 'auto' to size it from the data.")
+    parser.add_argument("--target-chunk-mb", type=int, default=1024,
+                        help="Chunk size aimed at by --chunk-interval auto (default 1024; ~25%% of RAM is the usual ceiling).")
+    parser.add_argument("--compress", action="store_true", help="Enable native compression and a compression policy.")
+    parser.add_argument("--segmentby", help="compress_segmentby column (default: the platform number column).")
+    parser.add_argument("--orderby", help="compress_orderby (default: the pressure column).")
+    parser.add_argument("--compress-after", default="180 days",
+                        help="Compress chunks older than this (default '180 days', beyond the usual delayed-mode delay).")
+    parser.add_argument("--compress-now", action="store_true", help="Also compress the already eligible chunks now.")
+    parser.add_argument("--window-days", type=int, default=365, help="Days of data scanned by the probe queries (default 365).")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per probe query, best one is reported (default 3).")
+    args = parser.parse_args()
+
+    conn = None
+    try:
+        conn = psycopg2.connect(args.db)
+        table = args.table
+        cols = resolve_columns(conn, table)
+        if not cols["time"]:
+            raise ValueError(f"{table} has no juld column - is it created yet?")
+        window = bench_window(conn, table, cols, args.window_days)
+        before = report(conn, table, cols, window, args.repeats)
+        print_report("Before", before)
+
+        if args.chunk_interval:
+            interval = args.chunk_interval
+            if interval == "auto":
+                days = auto_chunk_interval(conn, table, cols, args.target_chunk_mb)
+                if days is None:
+                    raise ValueError("table is empty; pass an explicit --chunk-interval")
+                interval = f"{days} days"
+            set_chunk_interval(conn, table, interval)
+            print(f"✅ Chunk interval of {table} set to {interval} (applies to new chunks).")
+
+        if args.compress or args.compress_now:
+            segmentby = args.segmentby or cols["platform"] or ""
+            orderby = args.orderby or cols["pres"] or ""
+            enable_compression(conn, table, segmentby, orderby, args.compress_after)
+            print(f"✅ Compression enabled (segmentby={segmentby}, orderby={orderby}), "
+                  f"policy: chunks older than {args.compress_after}.")
+        if args.compress_now:
+            n = compress_now(conn, table, args.compress_after)
+            print(f"✅ Compressed {n} chunks.")
+
+        if args.chunk_interval or args.compress or args.compress_now:
+            after = report(conn, table, cols, window, args.repeats)
+            print_report("After", after)
+            if before["bytes"]:
+                print(f"Size change: {100.0 * (after['bytes'] - before['bytes']) / before['bytes']:+.1f}%")
+    except Exception as e:
+        print("❌ Fatal error:", e)
+    finally:
+        if conn:
+            conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+argo_netcdf.py
+
+NetCDF cleaning steps shared by the upload service (clean.py) and the direct
+NetCDF ingester (LLM/netcdf_import.py).
+"""
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+
+PROF_DIM = "N_PROF"
+LEVEL_DIM = "N_LEVELS"
+CALIB_COMMENT = "SCIENTIFIC_CALIB_COMMENT"
+
+
+def profile_calib_comment(ds):
+    """
+    SCIENTIFIC_CALIB_COMMENT (N_PROF, N_CALIB, N_PARAM) reduced to one comment per
+    profile: the first one without "bad", or the first one if all of them say "bad".
+    apply_qc's calibration filter then sees the same profiles as bad as with the
+    flattened cartesian product (a level survived if any of its combinations did).
+    """
+    comments = ds[CALIB_COMMENT].values
+    n_prof = ds.sizes[PROF_DIM]
+    flat = comments.reshape(n_prof, -1) if comments.size else np.empty((n_prof, 0), dtype=object)
+    out = []
+    for row in flat:
+        texts = [c.decode("utf-8", errors="replace") if isinstance(c, (bytes, bytearray)) else str(c) for c in row]
+        good = [t for t in texts if "bad" not in t.lower()]
+        out.append(good[0] if good else (texts[0] if texts else ""))
+    return np.array(out, dtype=object)
+
+
+def load_netcdf_frame(file_path, variables=None):
+    """
+    Open an Argo NetCDF file and flatten it to a DataFrame with lower-case columns,
+    one row per (N_PROF, N_LEVELS) cell.
+    Only variables over (N_PROF, N_LEVELS), (N_PROF) or no dimension are read (lazily,
+    one at a time); per-profile values are repeated over the levels. Calibration,
+    history and parameter variables (N_CALIB, N_PARAM, N_HISTORY) are not expanded:
+    ds.to_dataframe() would build their cartesian product with every level, only for
+    apply_qc to drop those columns again. SCIENTIFIC_CALIB_COMMENT is kept per profile.
+    variables optionally limits the data variables read (names as in the file).
+    """
+    with xr.open_dataset(file_path, decode_cf=True, mask_and_scale=True) as ds:
+        if PROF_DIM not in ds.sizes:
+            # not a profile file: fall back to the generic flattening
+            df = ds.to_dataframe().reset_index()
+            df.columns = [c.lower() for c in df.columns]
+            return df
+
+        n_prof = ds.sizes[PROF_DIM]
+        n_levels = ds.sizes.get(LEVEL_DIM, 1)
+        columns = {
+            "n_prof": np.repeat(np.arange(n_prof), n_levels),
+            "n_levels": np.tile(np.arange(n_levels), n_prof),
+        }
+        names = variables if variables is not None else list(ds.variables)
+        for name in names:
+            if name not in ds.variables:
+                continue
+            var = ds[name]
+            dims = var.dims
+            if dims == (PROF_DIM, LEVEL_DIM):
+                columns[name.lower()] = var.values.reshape(-1)
+            elif dims == (PROF_DIM,):
+                columns[name.lower()] = np.repeat(var.values, n_levels)
+            elif dims == ():
+                columns[name.lower()] = np.repeat(var.values.reshape(1), n_prof * n_levels)
+            elif name == CALIB_COMMENT:
+                columns[name.lower()] = np.repeat(profile_calib_comment(ds), n_levels)
+    return pd.DataFrame(columns)
+
+
+def qc_digit(val):
+    """
+    Numeric QC flag of one cell as stored by xarray (b'1', '1', 1.0, b' ', nan ...):
+    the first character after stripping b'...' quoting, 9 when it is not a digit.
+    """
+    s = str(val).replace("b'", "").replace("'", "").strip()
+    try:
+        return int(s[0]) if s else 9
+    except ValueError:
+        return 9
+
+
+def decode_qc(col):
+    """QC flags of a whole column as an int array; each distinct cell value is decoded once."""
+    codes, uniques = pd.factorize(col, use_na_sentinel=False)
+    return np.array([qc_digit(u) for u in uniques], dtype=np.int8)[codes]
+
+
+def select_adjusted(raw, adjusted, raw_qc, adjusted_qc):
+    """
+    Per level: the adjusted value where it exists and its QC flag is better (lower)
+    than the raw one, the raw value otherwise.
+    """
+    use_adjusted = adjusted.notna().to_numpy() & (decode_qc(adjusted_qc) < decode_qc(raw_qc))
+    return pd.Series(np.where(use_adjusted, adjusted.to_numpy(), raw.to_numpy()), index=raw.index)
+
+
+def apply_qc(df, debug=True):
+    """
+    Calibration filtering, junk/duplicate removal and raw-vs-adjusted QC selection.
+    Returns (df, available_essential, error) where error is None or a message when
+    nothing is left.
+    """
+    # --- Handle scientific calibration fields ---
+    sci_cols = [c for c in df.columns if c.startswith("scientific_calib")]
+    if sci_cols:
+        # Convert bytes → str if needed
+        for c in sci_cols:
+            if df[c].dtype == object:
+                df[c] = df[c].apply(
+                    lambda x: x.decode() if isinstance(x, (bytes, bytearray)) else x
+                )
+
+        # Check comments for "bad"
+        if "scientific_calib_comment" in df.columns:
+            bad_mask = df["scientific_calib_comment"].str.contains(
+                "bad", case=False, na=False
+            )
+            if bad_mask.mean() < 0.8:  # not mostly bad
+                df = df[~bad_mask]
+
+        # Check calibration QC flags
+        if "scientific_calib_qc" in df.columns:
+            qcs = df["scientific_calib_qc"].astype(str)
+            if (qcs == "3").mean() < 0.8:
+                df = df[qcs.astype(int) < 3]
+
+        # Drop all calibration columns afterwards
+        df = df.drop(columns=sci_cols, errors="ignore")
+
+    if debug: 
+        print(f"After calib filter: {df.shape}")
+
+    # --- Drop obvious junk columns ---
+    drop_cols = [c for c in df.columns if c.startswith(
+        ("history", "n_", "data_type", "format_version", "crs")
+    )]
+    df = df.drop(columns=drop_cols, errors="ignore")
+    if debug: 
+        print(f"After dropping junk cols: {df.shape}")
+
+    # --- Remove duplicate rows ---
+    df = df.drop_duplicates()
+    if debug: 
+        print(f"After duplicates: {df.shape}")
+
+    # --- Drop empty rows (all three vars missing) ---
+    essential_cols = ["pres", "temp", "psal"]
+    available_essential = [col for col in essential_cols if col in df.columns]
+    
+    if available_essential:
+        df = df.dropna(subset=available_essential, how="all")
+    
+    if debug: 
+        print(f"After dropna essential cols: {df.shape}")
+    
+    if df.empty:
+        return df, available_essential, "No data remaining after cleaning"
+
+    # --- QC logic for pres, temp, psal ---
+    for var in available_essential:
+        qc_col = f"{var}_qc"
+        adj_col = f"{var}_adjusted"
+        adj_qc_col = f"{var}_adjusted_qc"
+
+        if qc_col in df.columns and adj_col in df.columns and adj_qc_col in df.columns:
+            df[var] = select_adjusted(df[var], df[adj_col], df[qc_col], df[adj_qc_col])
+
+        df = df.drop(columns=[qc_col, adj_col, adj_qc_col], errors="ignore")
+
+    if debug: 
+        print(f"After QC logic: {df.shape}")
+
+    # --- Profile-wide QC handling ---
+    for var in available_essential:
+        qc_col = f"{var}_qc"
+        if qc_col in df.columns:
+            qcs = df[qc_col].astype(str)
+            if (qcs == "3").mean() < 0.8:  # not mostly bad
+                df = df[qcs.astype(int) < 3]
+            df = df.drop(columns=[qc_col], errors="ignore")
+
+    if debug: 
+        print(f"After profile-wide QC: {df.shape}")
+
+    # --- Drop rows with no remaining data ---
+    if available_essential:
+        df = df.dropna(subset=available_essential, how="all")
+    
+    if debug: 
+        print(f"Final data before binning: {df.shape}")
+    
+    if df.empty:
+        return df, available_essential, "No data remaining after QC"
+
+    return df, available_essential, None
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+bench_ingest.py
+
+Ingest throughput benchmark for the CSV importers in LLM/.
+- Generates fixture folders (fixtures.py) and loads them with each importer:
+  bulk_import.py (values / copy / vectorized decoder), bulkimport-2.py, BGC.py and LLM/import.py.
+- Every run happens in a fresh process against freshly dropped tables and reports
+  rows/s, per-stage wall time (schema, insert, parse+rest) and the process peak RSS.
+- Needs a local PostgreSQL with TimescaleDB + PostGIS. The target tables are DROPPED before
+  each run, so point --db at a scratch database (default dbname=argo_bench), never at argo_db.
+
+Example:
+    python benchmarks/bench_ingest.py --files 200 --rows 500 --dup-ratio 0.05 --json bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import resource
+import tempfile
+import importlib.util
+import multiprocessing
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LLM_DIR = os.path.join(os.path.dirname(HERE), "LLM")
+sys.path.insert(0, HERE)
+sys.path.insert(0, LLM_DIR)
+
+from fixtures import write_fixtures  # noqa: E402
+
+DEFAULT_DSN = "dbname=argo_bench user=postgres password=1212 host=localhost port=5432"
+DROP_SQL = ("DROP TABLE IF EXISTS argo_data, bgc_argo, ingest_manifest, ingest_rejects, argo_profiles, "
+            "profile_metrics, argo_std_profiles, argo_std_levels CASCADE;")
+
+# ---------- Stage timing ----------
+class StageTimer:
+    """Accumulates wall time of selected module functions by wrapping them in place."""
+
+    def __init__(self):
+        self.totals = {}
+
+    def wrap(self, module, attr, stage):
+        fn = getattr(module, attr)
+
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.totals[stage] = self.totals.get(stage, 0.0) + time.perf_counter() - t0
+
+        setattr(module, attr, timed)
+        return timed
+
+def load_module(name, filename):
+    """Import an LLM/ script by path (bulkimport-2.py and import.py are not valid module names)."""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(LLM_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+# ---------- Importer adapters ----------
+def run_bulk_import(conn, dsn, folder, batch_size, timer, loader="values", decoder="python"):
+    import bulk_import
+    timer.wrap(bulk_import, "ensure_schema", "schema")
+    for name, fn in list(bulk_import.LOADERS.items()):
+        bulk_import.LOADERS[name] = timer.wrap(bulk_import, fn.__name__, "insert")
+    bulk_import.ensure_schema(conn)
+    bulk_import.ingest_folder(conn, folder, batch_size=batch_size, loader=loader, decoder=decoder)
+
+def run_bulkimport2(conn, dsn, folder, batch_size, timer):
+    module = load_module("bulkimport2", "bulkimport-2.py")
+    timer.wrap(module, "ensure_schema", "schema")
+    timer.wrap(module, "insert_batch", "insert")
+    timer.wrap(module, "record_progress", "manifest")
+    module.ensure_schema(conn)
+    module.ingest_folder(conn, folder, batch_size=batch_size)
+
+def run_import_py(conn, dsn, folder, batch_size, timer):
+    # import.py loads one file per call and inserts it in a single execute_values
+    module = load_module("argo_import", "import.py")
+    timer.wrap(module, "create_table", "schema")
+    timer.wrap(module, "execute_values", "insert")
+    module.create_table(conn)
+    for name in sorted(os.listdir(folder)):
+        module.CSV_FILE = os.path.join(folder, name)
+        module.import_csv(conn)
+
+def run_bgc(conn, dsn, folder, batch_size, timer):
+    module = load_module("bgc", "BGC.py")
+    timer.wrap(module, "ensure_table", "schema")
+    timer.wrap(module, "insert_batch", "insert")
+    module.ingest_folder(conn, folder, batch_size=batch_size)
+
+# name -> (fixture kind, runner, runner kwargs)
+IMPORTERS = {
+    "bulk_import": ("core", run_bulk_import, {}),
+    "bulk_import_copy": ("core", run_bulk_import, {"loader": "copy"}),
+    "bulk_import_vectorized": ("core", run_bulk_import, {"loader": "copy", "decoder": "vectorized"}),
+    "bulkimport2": ("core", run_bulkimport2, {}),
+    "import_py": ("core", run_import_py, {}),
+    "bgc": ("bgc", run_bgc, {}),
+}
+
+# ---------- Runner ----------
+def _run_one(name, dsn, folder, batch_size, result_q):
+    """Child process body: one importer, fresh tables, report timings and peak RSS."""
+    import psycopg2
+    import io
+    import contextlib
+
+    kind, runner, kwargs = IMPORTERS[name]
+    timer = StageTimer()
+    result = {"importer": name}
+    conn = None
+    try:
+        conn = psycopg2.connect(dsn)
+        with conn.cursor() as cur:
+            cur.execute(DROP_SQL)
+        conn.commit()
+        t0 = time.perf_counter()
+        # the importers print per file / per batch; keep the benchmark output readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            runner(conn, dsn, folder, batch_size, timer, **kwargs)
+        result["total_s"] = time.perf_counter() - t0
+        table = "bgc_argo" if kind == "bgc" else "argo_data"
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT count(*) FROM {table};")
+            result["rows_in_db"] = cur.fetchone()[0]
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        if conn:
+            conn.close()
+
+    result["stages_s"] = dict(timer.totals)
+    if "total_s" in result:
+        result["stages_s"]["parse+rest"] = result["total_s"] - sum(timer.totals.values())
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    result_q.put(result)
+
+def run_benchmark(importers, dsn, files, rows, batch_size, byte_literal_ratio, bad_juld_ratio, dup_ratio,
+                  workdir=None):
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        folders, source_rows = {}, {}
+        for kind in sorted({IMPORTERS[name][0] for name in importers}):
+            folders[kind] = os.path.join(tmp, kind)
+            info = write_fixtures(folders[kind], kind=kind, files=files, rows_per_file=rows,
+                                  byte_literal_ratio=byte_literal_ratio, bad_juld_ratio=bad_juld_ratio,
+                                  dup_ratio=dup_ratio)
+            source_rows[kind] = info["rows"]
+            print(f"Fixtures ({kind}): {info['files']} files, {info['rows']} rows")
+
+        for name in importers:
+            kind = IMPORTERS[name][0]
+            result_q = ctx.Queue()
+            proc = ctx.Process(target=_run_one, args=(name, dsn, folders[kind], batch_size, result_q))
+            proc.start()
+            proc.join()
+            try:
+                result = result_q.get(timeout=5)
+            except queue.Empty:
+                result = {"importer": name, "error": f"benchmark process died (exit code {proc.exitcode})"}
+            result["source_rows"] = source_rows[kind]
+            if "total_s" in result:
+                result["rows_per_s"] = source_rows[kind] / result["total_s"] if result["total_s"] > 0 else 0.0
+            results.append(result)
+            print_result(result)
+    return results
+
+def print_result(r):
+    if "error" in r:
+        print(f"{r['importer']:<24} ERROR {r['error']}")
+        return
+    stages = ", ".join(f"{k} {v:.2f}s" for k, v in sorted(r["stages_s"].items()))
+    print(f"{r['importer']:<24} {r['rows_per_s']:>10.0f} rows/s  total {r['total_s']:.2f}s  "
+          f"peak RSS {r['peak_rss_mb']:.0f} MB  rows in DB {r['rows_in_db']}  [{stages}]")
+
+# ---------- CLI ----------
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Argo CSV importers against a scratch database.")
+    parser.add_argument("--db", "-d", default=DEFAULT_DSN, help="psycopg2 connection string of a SCRATCH database.")
+    parser.add_argument("--importers", "-i", default=",".join(IMPORTERS),
+                        help=f"Comma-separated subset of: {', '.join(IMPORTERS)}.")
+    parser.add_argument("--files", type=int, default=50, help="Fixture files per folder (default 50).")
+    parser.add_argument("--rows", type=int, default=500, help="Levels per file (default 500).")
+    parser.add_argument("--batch", "-b", type=int, default=5000, help="Batch size passed to the importers.")
+    parser.add_argument("--byte-literal-ratio", type=float, default=0.5, help="Share of b'...' text cells.")
+    parser.add_argument("--bad-juld-ratio", type=float, default=0.01, help="Share of rows with an unparseable juld.")
+    parser.add_argument("--dup-ratio", type=float, default=0.02, help="Share of duplicated (platform, juld, pres) rows.")
+    parser.add_argument("--workdir", help="Where to write fixtures (default: system temp dir).")
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    importers = [n.strip() for n in args.importers.split(",") if n.strip()]
+    unknown = [n for n in importers if n not in IMPORTERS]
+    if unknown:
+        parser.error(f"unknown importers: {', '.join(unknown)}")
+
+    results = run_benchmark(importers, args.db, args.files, args.rows, args.batch, args.byte_literal_ratio,
+                            args.bad_juld_ratio, args.dup_ratio, workdir=args.workdir)
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+        print(f"Results written to {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+bench_netcdf_load.py
+
+Memory benchmark of argo_netcdf.load_netcdf_frame (used by clean_and_bin_netcdf and
+LLM/netcdf_import.py): the former ds.to_dataframe() flattening against the
+dimension-aware loader that builds the frame from N_PROF x N_LEVELS only.
+- Writes a synthetic BGC-like multi-profile file (several parameters, so N_PARAM,
+  N_CALIB and N_HISTORY are > 1), or uses a real profile file with --file.
+- Each loader runs in a fresh process and reports the frame shape, the load time and
+  the process peak RSS (plus the RSS after imports, i.e. before loading).
+- Checks that both frames give the same distinct pres / temp / psal levels after
+  apply_qc (to_dataframe also repeats each level once per N_PARAM entry).
+  No database needed.
+
+Example:
+    python benchmarks/bench_netcdf_load.py --profiles 50 --levels 1000 --params 12
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import resource
+import tempfile
+import multiprocessing
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+ESSENTIAL = ["pres", "temp", "psal"]
+
+# ---------- Former implementation (reference) ----------
+def legacy_load(file_path):
+    import xarray as xr
+    ds = xr.open_dataset(file_path, decode_cf=True, mask_and_scale=True)
+    df = ds.to_dataframe().reset_index()
+    df.columns = [c.lower() for c in df.columns]
+    return df
+
+def dimension_load(file_path):
+    from argo_netcdf import load_netcdf_frame
+    return load_netcdf_frame(file_path)
+
+LOADERS = {"to_dataframe": legacy_load, "dimension_aware": dimension_load}
+
+# ---------- Fixture ----------
+def write_profile_file(path, profiles, levels, params, calibs=2, history=5, seed=0):
+    """A multi-profile file laid out like an Argo *_prof.nc / BGC file."""
+    import xarray as xr
+
+    rng = np.random.default_rng(seed)
+    names = ["PRES", "TEMP", "PSAL"] + [f"PARAM{i}" for i in range(max(params - 3, 0))]
+    prof, lev = ("N_PROF",), ("N_PROF", "N_LEVELS")
+
+    def chars(values, width):
+        return np.array([v.ljust(width)[:width].encode() for v in values], dtype=f"S{width}")
+
+    def qc(shape):
+        return rng.choice(np.array([b"1", b"1", b"1", b"2", b"3", b"4"]), shape)
+
+    pres = np.tile(np.linspace(1, 2000, levels), (profiles, 1))
+    base = {"PRES": pres, "TEMP": 28 - pres / 100 + rng.normal(0, 0.1, pres.shape),
+            "PSAL": 35 + rng.normal(0, 0.2, pres.shape)}
+    data = {
+        "DATA_TYPE": ((), np.array(b"Argo profile    ")),
+        "FORMAT_VERSION": ((), np.array(b"3.1 ")),
+        "DATE_CREATION": ((), np.array(b"20230101000000")),
+        "PLATFORM_NUMBER": (prof, chars(["2902746"] * profiles, 8)),
+        "CYCLE_NUMBER": (prof, np.arange(1, profiles + 1, dtype=np.int32)),
+        "DIRECTION": (prof, chars(["A"] * profiles, 1)),
+        "DATA_MODE": (prof, chars(rng.choice(["R", "A", "D"], profiles), 1)),
+        "PLATFORM_TYPE": (prof, chars(["APEX"] * profiles, 32)),
+        "JULD": (prof, 26000.0 + np.arange(profiles) * 10.0,
+                 {"units": "days since 1950-01-01 00:00:00 UTC"}),
+        "JULD_QC": (prof, qc(profiles)),
+        "LATITUDE": (prof, rng.uniform(-60, 60, profiles)),
+        "LONGITUDE": (prof, rng.uniform(-180, 180, profiles)),
+        "POSITION_QC": (prof, qc(profiles)),
+        "STATION_PARAMETERS": (("N_PROF", "N_PARAM"),
+                               np.tile(chars(names, 16), (profiles, 1))),
+        "PARAMETER": (("N_PROF", "N_CALIB", "N_PARAM"),
+                      np.tile(chars(names, 16), (profiles, calibs, 1))),
+        "SCIENTIFIC_CALIB_EQUATION": (("N_PROF", "N_CALIB", "N_PARAM"),
+                                      np.full((profiles, calibs, len(names)), b"none".ljust(256))),
+        "SCIENTIFIC_CALIB_COEFFICIENT": (("N_PROF", "N_CALIB", "N_PARAM"),
+                                         np.full((profiles, calibs, len(names)), b"none".ljust(256))),
+        "SCIENTIFIC_CALIB_COMMENT": (("N_PROF", "N_CALIB", "N_PARAM"),
+                                     np.full((profiles, calibs, len(names)), b"No calibration".ljust(256))),
+        "HISTORY_INSTITUTION": (("N_HISTORY", "N_PROF"), np.full((history, profiles), b"IF  ")),
+        "HISTORY_STEP": (("N_HISTORY", "N_PROF"), np.full((history, profiles), b"ARFM")),
+        "HISTORY_START_PRES": (("N_HISTORY", "N_PROF"), rng.uniform(0, 10, (history, profiles))),
+    }
+    for name in names:
+        values = base.get(name, rng.uniform(0, 300, pres.shape))
+        adjusted = values + rng.normal(0, 0.01, pres.shape)
+        adjusted[rng.random(pres.shape) < 0.3] = np.nan
+        data[name] = (lev, values.astype(np.float32))
+        data[f"{name}_QC"] = (lev, qc(pres.shape))
+        data[f"{name}_ADJUSTED"] = (lev, adjusted.astype(np.float32))
+        data[f"{name}_ADJUSTED_QC"] = (lev, qc(pres.shape))
+        data[f"{name}_ADJUSTED_ERROR"] = (lev, np.full(pres.shape, 0.01, dtype=np.float32))
+    xr.Dataset({k: xr.Variable(*v) for k, v in data.items()}).to_netcdf(path)
+    return path
+
+# ---------- Runner ----------
+def _rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def _run_one(name, file_path, result_q):
+    """Child process body: load once, clean with apply_qc, report shape, time and peak RSS."""
+    import pandas  # noqa: F401 - imported up front so the baseline includes it
+    import xarray  # noqa: F401
+    from argo_netcdf import apply_qc
+
+    result = {"loader": name, "baseline_rss_mb": _rss_mb()}
+    try:
+        t0 = time.perf_counter()
+        df = LOADERS[name](file_path)
+        result["load_s"] = time.perf_counter() - t0
+        result["rows"], result["columns"] = df.shape
+        result["peak_rss_mb"] = _rss_mb()
+        cleaned, _, error = apply_qc(df, debug=False)
+        if error is None:
+            # the to_dataframe frame repeats every level once per STATION_PARAMETERS /
+            # PARAMETER value; compare the distinct levels
+            key = [c for c in ("platform_number", "cycle_number", "juld") if c in cleaned.columns]
+            cleaned = cleaned[key + [c for c in ESSENTIAL if c in cleaned.columns]].drop_duplicates()
+            cleaned = cleaned.sort_values(list(cleaned.columns), kind="stable")
+            result["cleaned"] = {c: cleaned[c].astype(float).round(4).tolist()
+                                 for c in ESSENTIAL if c in cleaned.columns}
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result_q.put(result)
+
+def run_benchmark(file_path):
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for name in LOADERS:
+        result_q = ctx.Queue()
+        proc = ctx.Process(target=_run_one, args=(name, file_path, result_q))
+        proc.start()
+        result = None
+        while result is None:
+            # the to_dataframe run may be killed for memory: stop waiting once it is gone
+            try:
+                result = result_q.get(timeout=1)
+            except queue.Empty:
+                if not proc.is_alive():
+                    result = {"loader": name, "error": f"benchmark process died (exit code {proc.exitcode})"}
+        proc.join()
+        results.append(result)
+
+    cleaned = [r.pop("cleaned", None) for r in results]
+    same = all(c is not None for c in cleaned) and all(c == cleaned[0] for c in cleaned)
+    return results, same
+
+def print_result(r):
+    if "error" in r:
+        print(f"{r['loader']:<16} ERROR {r['error']}")
+        return
+    print(f"{r['loader']:<16} {r['rows']:>10} rows x {r['columns']:<3} cols  load {r['load_s']:.2f}s  "
+          f"RSS before {r['baseline_rss_mb']:.0f} MB  peak {r['peak_rss_mb']:.0f} MB")
+
+# ---------- CLI ----------
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the peak memory of the NetCDF profile loader.")
+    parser.add_argument("--file", help="Argo profile NetCDF file to use instead of the synthetic one.")
+    parser.add_argument("--profiles", type=int, default=50, help="Synthetic profiles (default 50).")
+    parser.add_argument("--levels", type=int, default=1000, help="Levels per synthetic profile (default 1000).")
+    parser.add_argument("--params", type=int, default=12, help="Synthetic parameters incl. PRES/TEMP/PSAL (default 12).")
+    parser.add_argument("--calibs", type=int, default=2, help="Synthetic N_CALIB (default 2).")
+    parser.add_argument("--history", type=int, default=5, help="Synthetic N_HISTORY (default 5).")
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = args.file
+        if not file_path:
+            file_path = write_profile_file(os.path.join(tmp, "synthetic_prof.nc"), args.profiles, args.levels,
+                                           args.params, calibs=args.calibs, history=args.history)
+        print(f"File: {file_path} ({os.path.getsize(file_path) / 2**20:.1f} MB)")
+        results, same = run_benchmark(file_path)
+
+    for r in results:
+        print_result(r)
+    print("✅ Same pres/temp/psal after apply_qc." if same else "⚠ Cleaned values differ between loaders.")
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump({"results": results, "identical": same}, fh, indent=2)
+        print(f"Results written to {args.json}")
+
+if __name__ == "__main__":
+    main()
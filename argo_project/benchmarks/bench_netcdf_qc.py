@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+bench_netcdf_qc.py
+
+Raw-vs-adjusted QC selection of argo_netcdf.apply_qc (used by clean_and_bin_netcdf):
+the former row-wise df.apply(choose_value, axis=1) against the column-wise
+select_adjusted (flags decoded once per distinct value, np.where selection).
+- Runs on a synthetic multi-profile frame shaped like load_netcdf_frame output
+  (byte-string QC flags, partly missing adjusted values, ~40 columns), or on a real
+  profile file with --file.
+- Checks that both give the same values for pres, temp and psal, then reports the
+  best-of-N time of each and the speedup. No database needed.
+
+Example:
+    python benchmarks/bench_netcdf_qc.py --profiles 20 --levels 500
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from argo_netcdf import load_netcdf_frame, select_adjusted  # noqa: E402
+
+VARIABLES = ["pres", "temp", "psal"]
+QC_VALUES = [b"1", b"1", b"1", b"2", b"3", b"4", b" ", b"8"]
+
+# ---------- Former implementation (reference) ----------
+def legacy_select(df, var):
+    qc_col, adj_col, adj_qc_col = f"{var}_qc", f"{var}_adjusted", f"{var}_adjusted_qc"
+
+    def choose_value(row):
+        qc_val = str(row[qc_col]).replace("b'", "").replace("'", "").strip()
+        adj_qc_val = str(row[adj_qc_col]).replace("b'", "").replace("'", "").strip()
+        try:
+            qc_val = int(qc_val[0]) if qc_val else 9
+        except:
+            qc_val = 9
+        try:
+            adj_qc_val = int(adj_qc_val[0]) if adj_qc_val else 9
+        except:
+            adj_qc_val = 9
+
+        if pd.isna(row[adj_col]):
+            return row[var]
+        if adj_qc_val < qc_val:
+            return row[adj_col]
+        return row[var]
+
+    return df.apply(choose_value, axis=1)
+
+def vectorized_select(df, var):
+    return select_adjusted(df[var], df[f"{var}_adjusted"], df[f"{var}_qc"], df[f"{var}_adjusted_qc"])
+
+# ---------- Fixture ----------
+def synthetic_frame(profiles, levels, seed=0):
+    """profiles x levels rows with the columns apply_qc looks at, plus typical metadata."""
+    rng = np.random.default_rng(seed)
+    n = profiles * levels
+    df = pd.DataFrame({
+        "n_prof": np.repeat(np.arange(profiles), levels),
+        "n_levels": np.tile(np.arange(levels), profiles),
+        "platform_number": [b"2902746 "] * n,
+        "cycle_number": np.repeat(np.arange(1, profiles + 1), levels).astype(float),
+        "direction": [b"A"] * n,
+        "data_mode": rng.choice([b"R", b"A", b"D"], n),
+        "juld": pd.Timestamp("2023-01-01") + pd.to_timedelta(np.repeat(np.arange(profiles) * 10, levels), unit="D"),
+        "latitude": np.repeat(rng.uniform(-60, 60, profiles), levels),
+        "longitude": np.repeat(rng.uniform(-180, 180, profiles), levels),
+        "position_qc": [b"1"] * n,
+    })
+    base = {"pres": np.tile(np.linspace(1, 2000, levels), profiles),
+            "temp": rng.uniform(2, 28, n), "psal": rng.uniform(33, 37, n)}
+    for var in VARIABLES:
+        df[var] = base[var]
+        df[f"{var}_qc"] = rng.choice(QC_VALUES, n)
+        adjusted = base[var] + rng.normal(0, 0.01, n)
+        adjusted[rng.random(n) < 0.3] = np.nan
+        df[f"{var}_adjusted"] = adjusted
+        df[f"{var}_adjusted_qc"] = rng.choice(QC_VALUES, n)
+        df[f"{var}_adjusted_error"] = 0.01
+    # the other per-level / per-profile variables a real file carries
+    for i in range(12):
+        df[f"extra_{i}"] = [b"x"] * n if i % 2 else 0.0
+    return df
+
+# ---------- Runner ----------
+def best_time(fn, repeats):
+    best = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def run(df, repeats):
+    present = [v for v in VARIABLES
+               if all(c in df.columns for c in (v, f"{v}_qc", f"{v}_adjusted", f"{v}_adjusted_qc"))]
+    legacy_s, legacy = best_time(lambda: {v: legacy_select(df, v) for v in present}, repeats)
+    vector_s, vector = best_time(lambda: {v: vectorized_select(df, v) for v in present}, repeats)
+    for v in present:
+        pd.testing.assert_series_equal(legacy[v].astype(float), vector[v].astype(float), check_names=False)
+    return {
+        "rows": len(df),
+        "columns": len(df.columns),
+        "variables": present,
+        "legacy_s": legacy_s,
+        "vectorized_s": vector_s,
+        "speedup": legacy_s / vector_s if vector_s > 0 else None,
+    }
+
+# ---------- CLI ----------
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the raw-vs-adjusted QC selection of clean_and_bin_netcdf.")
+    parser.add_argument("--file", help="Argo profile NetCDF file to use instead of the synthetic frame.")
+    parser.add_argument("--profiles", type=int, default=20, help="Synthetic profiles (default 20).")
+    parser.add_argument("--levels", type=int, default=500, help="Levels per synthetic profile (default 500).")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per implementation, best one is reported (default 3).")
+    parser.add_argument("--json", help="Also write the result to this JSON file.")
+    args = parser.parse_args()
+
+    df = load_netcdf_frame(args.file) if args.file else synthetic_frame(args.profiles, args.levels)
+    result = run(df, args.repeats)
+    print(f"{result['rows']} levels x {result['columns']} columns, variables {', '.join(result['variables'])}")
+    print(f"row-wise apply : {result['legacy_s'] * 1000:9.1f} ms")
+    print(f"vectorized     : {result['vectorized_s'] * 1000:9.1f} ms")
+    print(f"speedup        : {result['speedup']:.0f}x (identical values)")
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(result, fh, indent=2)
+        print(f"Results written to {args.json}")
+
+if __name__ == "__main__":
+    main()
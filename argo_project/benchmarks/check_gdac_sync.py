@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+check_gdac_sync.py
+
+Check of the gdac_sync.py diff logic on a small local index (3 entries).
+- First sync queues every entry; an unchanged index is skipped.
+- A later date_update re-queues that file; an entry that left the index is removed
+  from the snapshot and nothing else is queued.
+- A change to a file whose job is running is deferred (snapshot kept) and queued by
+  the next sync once the job has finished.
+- Needs a local PostgreSQL. gdac_index_snapshot, gdac_sync_state and ingest_jobs are
+  DROPPED first, so point --db at a scratch database (default dbname=argo_bench).
+
+Example:
+    python benchmarks/check_gdac_sync.py
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), "LLM"))
+
+import psycopg2  # noqa: E402
+from gdac_sync import ensure_sync, sync_index  # noqa: E402
+
+DEFAULT_DSN = "dbname=argo_bench user=postgres password=1212 host=localhost port=5432"
+DROP_SQL = "DROP TABLE IF EXISTS gdac_index_snapshot, gdac_sync_state, ingest_jobs CASCADE;"
+TABLE = "argo_data"
+
+HEADER = [
+    "# Title : Profile directory file of the Argo Global Data Assembly Center",
+    "# FTP root number 1 : ftp://ftp.ifremer.fr/ifremer/argo/dac",
+    "file,date,latitude,longitude,ocean,profiler_type,institution,date_update",
+]
+FILES = {
+    "a": "aoml/1900001/profiles/R1900001_001.nc",
+    "b": "aoml/1900001/profiles/R1900001_002.nc",
+    "c": "incois/2902746/profiles/D2902746_010.nc",
+}
+
+def write_index(path, updates, mtime):
+    """updates: {key: date_update} of the entries to list."""
+    lines = list(HEADER)
+    for key, date_update in updates.items():
+        lines.append(f"{FILES[key]},20230101120000,12.5,85.1,I,846,IN,{date_update}")
+    with open(path, "w", newline="") as fh:
+        fh.write("\n".join(lines) + "\n")
+    os.utime(path, (mtime, mtime))
+
+def jobs(conn, root):
+    with conn.cursor() as cur:
+        cur.execute("SELECT file_path, status FROM ingest_jobs WHERE target_table = %s;", (TABLE,))
+        rows = cur.fetchall()
+    conn.commit()
+    return {path[len(root) + 1:]: status for path, status in rows}
+
+def snapshot_update(conn, key):
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_char(date_update AT TIME ZONE 'UTC', 'YYYYMMDDHH24MISS') "
+                    "FROM gdac_index_snapshot WHERE file = %s;", (FILES[key],))
+        row = cur.fetchone()
+    conn.commit()
+    return row[0] if row else None
+
+def set_status(conn, root, key, status):
+    with conn.cursor() as cur:
+        cur.execute("UPDATE ingest_jobs SET status = %s WHERE file_path = %s AND target_table = %s;",
+                    (status, f"{root}/{FILES[key]}", TABLE))
+    conn.commit()
+
+def check(conn, tmp):
+    index = os.path.join(tmp, "ar_index_global_prof.txt")
+    root = os.path.join(tmp, "dac").replace(os.sep, "/")
+
+    # 1. first sync: everything is new
+    write_index(index, {"a": "20230102000000", "b": "20230102000000", "c": "20230102000000"}, 1000)
+    r = sync_index(conn, index, root, table=TABLE)
+    assert (r["entries"], r["changed"], r["queued"], r["removed"]) == (3, 3, 3, 0), r
+    assert sync_index(conn, index, root, table=TABLE) is None, "unchanged index was diffed again"
+    for key in FILES:
+        set_status(conn, root, key, "done")
+
+    # 2. a updated, c gone from the index
+    write_index(index, {"a": "20230301000000", "b": "20230102000000"}, 2000)
+    r = sync_index(conn, index, root, table=TABLE)
+    assert (r["entries"], r["changed"], r["queued"], r["removed"]) == (2, 1, 1, 1), r
+    state = jobs(conn, root)
+    assert state[FILES["a"]] == "pending" and state[FILES["b"]] == "done", state
+    assert snapshot_update(conn, "a") == "20230301000000" and snapshot_update(conn, "c") is None
+
+    # 3. a updated again while its job runs: deferred, snapshot keeps the old date
+    set_status(conn, root, "a", "running")
+    write_index(index, {"a": "20230401000000", "b": "20230102000000"}, 3000)
+    r = sync_index(conn, index, root, table=TABLE)
+    assert (r["changed"], r["queued"], r["deferred"]) == (1, 0, 1), r
+    assert snapshot_update(conn, "a") == "20230301000000"
+
+    # 4. job finished: the same (unchanged) index now queues it
+    set_status(conn, root, "a", "done")
+    r = sync_index(conn, index, root, table=TABLE)
+    assert r is not None and (r["changed"], r["queued"], r["deferred"]) == (1, 1, 0), r
+    assert jobs(conn, root)[FILES["a"]] == "pending"
+    assert snapshot_update(conn, "a") == "20230401000000"
+
+# ---------- CLI ----------
+def main():
+    parser = argparse.ArgumentParser(description="Check the gdac_sync.py index diff against a scratch database.")
+    parser.add_argument("--db", "-d", default=DEFAULT_DSN, help="psycopg2 connection string of a SCRATCH database.")
+    args = parser.parse_args()
+
+    conn = None
+    try:
+        conn = psycopg2.connect(args.db)
+        with conn.cursor() as cur:
+            cur.execute(DROP_SQL)
+        conn.commit()
+        ensure_sync(conn)
+        with tempfile.TemporaryDirectory() as tmp:
+            check(conn, tmp)
+        print("✅ gdac_sync diff checks passed.")
+    except AssertionError as e:
+        print("❌ Check failed:", e)
+        sys.exit(1)
+    except Exception as e:
+        print("❌ Fatal error:", e)
+        sys.exit(1)
+    finally:
+        if conn:
+            conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+fixtures.py
+
+Synthetic Argo CSV folders for the ingest benchmarks (no real data needed).
+- kind="core": NODC-style files with the 12 argo_data columns
+  (what bulk_import.py, bulkimport-2.py and LLM/import.py read).
+- kind="bgc": files laid out like temp.csv (metadata columns followed by
+  DOXY/CHLA/BBP700/CDOM/PH/NITRATE), with a header row so BGC.py can read them.
+- One file = one profile of rows_per_file levels.
+- byte_literal_ratio: share of text cells written as b'...' like temp.csv.
+- bad_juld_ratio: share of rows whose juld cannot be parsed.
+- dup_ratio: share of rows repeated with the same (platform_number, juld, pres).
+"""
+
+import os
+import csv
+import random
+from datetime import datetime, timedelta
+
+CORE_HEADER = [
+    "platform_number", "cycle_number", "direction", "date_creation",
+    "platform_type", "juld", "latitude", "longitude",
+    "data_mode", "pres", "temp", "psal",
+]
+BGC_HEADER = [
+    "DATE_CREATION", "PLATFORM_NUMBER", "CYCLE_NUMBER", "DIRECTION", "DATA_MODE",
+    "PLATFORM_TYPE", "JULD", "LATITUDE", "LONGITUDE", "PRES",
+    "DOXY", "CHLA", "BBP700", "CDOM", "PH_IN_SITU_TOTAL", "NITRATE",
+]
+
+BASE_DATE = datetime(2023, 1, 1)
+DATE_FMT = "%Y%m%d%H%M%S"
+
+def _text(rng, value, byte_literal_ratio):
+    return f"b'{value}'" if rng.random() < byte_literal_ratio else value
+
+def _profile_levels(rng, n):
+    """Monotonic pressure levels from ~1 dbar down to ~2000 dbar."""
+    step = 2000.0 / n
+    return [round(1.0 + i * step + rng.uniform(0, step * 0.5), 2) for i in range(n)]
+
+def write_fixtures(folder, kind="core", files=20, rows_per_file=500, byte_literal_ratio=0.5,
+                   bad_juld_ratio=0.01, dup_ratio=0.02, seed=0):
+    """Write the fixture folder and return {"files": n, "rows": data rows written}."""
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    platforms = [str(1900000 + i) for i in range(max(1, files // 10))]
+    total_rows = 0
+
+    for i in range(files):
+        platform = platforms[i % len(platforms)]
+        cycle = i // len(platforms) + 1
+        juld = BASE_DATE + timedelta(days=10 * cycle, minutes=i)
+        created = (juld + timedelta(days=1)).strftime(DATE_FMT)
+        lat, lon = rng.uniform(-10, 25), rng.uniform(60, 100)
+        mode = rng.choice(["R", "D", "A"])
+
+        rows = []
+        for pres in _profile_levels(rng, rows_per_file):
+            juld_s = "not-a-date" if rng.random() < bad_juld_ratio else juld.strftime(DATE_FMT)
+            t = round(28.0 - 24.0 * (pres / 2000.0) ** 0.4 + rng.gauss(0, 0.05), 4)
+            s = round(34.5 + 0.6 * (pres / 2000.0) + rng.gauss(0, 0.01), 4)
+            if kind == "bgc":
+                row = [
+                    _text(rng, created, byte_literal_ratio), _text(rng, platform + " ", byte_literal_ratio),
+                    float(cycle), _text(rng, "A", byte_literal_ratio), _text(rng, mode, byte_literal_ratio),
+                    _text(rng, "SOLO_BGC_MRV".ljust(32), byte_literal_ratio), juld_s,
+                    round(lat, 5), round(lon, 5), pres,
+                    round(rng.uniform(5, 220), 4), round(rng.uniform(0, 1), 6), round(rng.uniform(0, 0.002), 8),
+                    round(rng.uniform(0.5, 3), 5), round(rng.uniform(7.4, 8.1), 5), round(rng.uniform(0, 40), 5),
+                ]
+            else:
+                row = [
+                    _text(rng, platform + " ", byte_literal_ratio), cycle, _text(rng, "A", byte_literal_ratio),
+                    created, _text(rng, "APEX", byte_literal_ratio), juld_s,
+                    round(lat, 5), round(lon, 5), _text(rng, mode, byte_literal_ratio), pres, t, s,
+                ]
+            rows.append(row)
+            if rng.random() < dup_ratio:
+                rows.append(list(row))
+
+        path = os.path.join(folder, f"{kind}_{platform}_{cycle:03d}.csv")
+        with open(path, "w", newline="", encoding="utf-8") as fh:
+            writer = csv.writer(fh)
+            writer.writerow(BGC_HEADER if kind == "bgc" else CORE_HEADER)
+            writer.writerows(rows)
+        total_rows += len(rows)
+
+    return {"files": files, "rows": total_rows}
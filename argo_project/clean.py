@@ -6,11 +6,12 @@ import traceback
 
 import numpy as np
 import pandas as pd
-import xarray as xr
 from flask import Flask, jsonify, request, send_file
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 
+from argo_netcdf import apply_qc, load_netcdf_frame
+
 
 # Custom JSON encoder to handle numpy types and other serialization issues
 class NumpyEncoder(json.JSONEncoder):
@@ -38,20 +39,20 @@ ALLOWED_EXTENSIONS = {'nc'}
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(PROCESSED_FOLDER, exist_ok=True)
 
+# A file may hold several profiles (multi-cycle *_prof.nc); binning and means are per profile
+PROFILE_KEYS = ["platform_number", "cycle_number", "juld"]
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def clean_and_bin_netcdf(file_path, save_path=None, bin_size=10, debug=True):
     """
-    Updated single file processor with enhanced error handling and metadata extraction
+    Updated single file processor with enhanced error handling and metadata extraction.
+    Bins every profile of the file (PROFILE_KEYS) on its own and adds one mean row per profile.
     """
     try:
-        # --- Load NetCDF file ---
-        ds = xr.open_dataset(file_path, decode_cf=True, mask_and_scale=True)
-        
-        # --- Convert to pandas DataFrame ---
-        df = ds.to_dataframe().reset_index()
-        df.columns = [c.lower() for c in df.columns]
+        # --- Load NetCDF file into a pandas DataFrame ---
+        df = load_netcdf_frame(file_path)
         
         if debug: 
             print(f"Loaded: {df.shape}")
@@ -59,115 +60,9 @@ def clean_and_bin_netcdf(file_path, save_path=None, bin_size=10, debug=True):
         # Store original columns for metadata
         original_columns = df.columns.tolist()
         
-        # --- Handle scientific calibration fields ---
-        sci_cols = [c for c in df.columns if c.startswith("scientific_calib")]
-        if sci_cols:
-            # Convert bytes → str if needed
-            for c in sci_cols:
-                if df[c].dtype == object:
-                    df[c] = df[c].apply(
-                        lambda x: x.decode() if isinstance(x, (bytes, bytearray)) else x
-                    )
-
-            # Check comments for "bad"
-            if "scientific_calib_comment" in df.columns:
-                bad_mask = df["scientific_calib_comment"].str.contains(
-                    "bad", case=False, na=False
-                )
-                if bad_mask.mean() < 0.8:  # not mostly bad
-                    df = df[~bad_mask]
-
-            # Check calibration QC flags
-            if "scientific_calib_qc" in df.columns:
-                qcs = df["scientific_calib_qc"].astype(str)
-                if (qcs == "3").mean() < 0.8:
-                    df = df[qcs.astype(int) < 3]
-
-            # Drop all calibration columns afterwards
-            df = df.drop(columns=sci_cols, errors="ignore")
-
-        if debug: 
-            print(f"After calib filter: {df.shape}")
-
-        # --- Drop obvious junk columns ---
-        drop_cols = [c for c in df.columns if c.startswith(
-            ("history", "n_", "data_type", "format_version", "crs")
-        )]
-        df = df.drop(columns=drop_cols, errors="ignore")
-        if debug: 
-            print(f"After dropping junk cols: {df.shape}")
-
-        # --- Remove duplicate rows ---
-        df = df.drop_duplicates()
-        if debug: 
-            print(f"After duplicates: {df.shape}")
-
-        # --- Drop empty rows (all three vars missing) ---
-        essential_cols = ["pres", "temp", "psal"]
-        available_essential = [col for col in essential_cols if col in df.columns]
-        
-        if available_essential:
-            df = df.dropna(subset=available_essential, how="all")
-        
-        if debug: 
-            print(f"After dropna essential cols: {df.shape}")
-        
-        if df.empty:
-            return pd.DataFrame(), {"error": "No data remaining after cleaning"}
-
-        # --- QC logic for pres, temp, psal ---
-        for var in available_essential:
-            qc_col = f"{var}_qc"
-            adj_col = f"{var}_adjusted"
-            adj_qc_col = f"{var}_adjusted_qc"
-
-            if qc_col in df.columns and adj_col in df.columns and adj_qc_col in df.columns:
-                def choose_value(row):
-                    qc_val = str(row[qc_col]).replace("b'", "").replace("'", "").strip()
-                    adj_qc_val = str(row[adj_qc_col]).replace("b'", "").replace("'", "").strip()
-                    try:
-                        qc_val = int(qc_val[0]) if qc_val else 9
-                    except:
-                        qc_val = 9
-                    try:
-                        adj_qc_val = int(adj_qc_val[0]) if adj_qc_val else 9
-                    except:
-                        adj_qc_val = 9
-
-                    if pd.isna(row[adj_col]):
-                        return row[var]
-                    if adj_qc_val < qc_val:
-                        return row[adj_col]
-                    return row[var]
-
-                df[var] = df.apply(choose_value, axis=1)
-
-            df = df.drop(columns=[qc_col, adj_col, adj_qc_col], errors="ignore")
-
-        if debug: 
-            print(f"After QC logic: {df.shape}")
-
-        # --- Profile-wide QC handling ---
-        for var in available_essential:
-            qc_col = f"{var}_qc"
-            if qc_col in df.columns:
-                qcs = df[qc_col].astype(str)
-                if (qcs == "3").mean() < 0.8:  # not mostly bad
-                    df = df[qcs.astype(int) < 3]
-                df = df.drop(columns=[qc_col], errors="ignore")
-
-        if debug: 
-            print(f"After profile-wide QC: {df.shape}")
-
-        # --- Drop rows with no remaining data ---
-        if available_essential:
-            df = df.dropna(subset=available_essential, how="all")
-        
-        if debug: 
-            print(f"Final data before binning: {df.shape}")
-        
-        if df.empty:
-            return pd.DataFrame(), {"error": "No data remaining after QC"}
+        df, available_essential, qc_error = apply_qc(df, debug=debug)
+        if qc_error:
+            return pd.DataFrame(), {"error": qc_error}
 
         # --- Compute statistics and metadata ---
         meta_cols = ["platform_number", "cycle_number", "direction",
@@ -193,51 +88,43 @@ def clean_and_bin_netcdf(file_path, save_path=None, bin_size=10, debug=True):
             if df[col].dtype == 'object':
                 df[col] = df[col].apply(lambda x: x.decode('utf-8') if isinstance(x, bytes) else str(x) if x is not None else None)
 
-        # --- Compute mean row from raw/unbinned data ---
-        mean_row = {}
-        for col in available_essential:
-            if col in df.columns and not df[col].isna().all():
-                mean_row[col] = df[col].mean()
-        
-        for col in meta_cols:
-            if col in df.columns and len(df) > 0:
-                mean_row[col] = df.iloc[0][col]
-        mean_row["profile_id"] = "Mean"
-        
-        # --- Bin by pressure (matching original logic) ---
+        # --- Profiles in the file (a *_prof.nc holds many) ---
+        profile_keys = [c for c in PROFILE_KEYS if c in df.columns]
+        if not profile_keys:
+            df["profile_key"] = 0
+            profile_keys = ["profile_key"]
+        profile_meta = [c for c in meta_cols if c in df.columns and c not in profile_keys]
+        n_profiles = df.groupby(profile_keys, dropna=False).ngroups
+
+        # --- Per-profile mean rows from raw/unbinned data ---
+        agg_dict = {col: "mean" for col in available_essential if col in df.columns}
+        agg_dict.update({col: "first" for col in profile_meta})
+        mean_df = df.groupby(profile_keys, dropna=False, as_index=False).agg(agg_dict)
+        mean_df["profile_id"] = "Mean"
+
+        # --- Bin by pressure within each profile ---
         if "pres" in df.columns and not df["pres"].isna().all():
             # Create pressure bins
             df["pres_bin"] = (df["pres"] // bin_size) * bin_size
-            
-            # Group by pressure bin and calculate means
-            binned_groups = df.groupby("pres_bin", as_index=False)
-            
-            # Create aggregation dictionary for available columns
-            agg_dict = {}
-            for col in available_essential:
-                if col in df.columns:
-                    agg_dict[col] = "mean"
-            
-            # Perform binning
-            binned = binned_groups.agg(agg_dict)
-            
-            # Add metadata columns to each binned row
-            for col in meta_cols:
-                if col in df.columns and len(df) > 0:
-                    binned[col] = df.iloc[0][col]
+
+            # One groupby over (profile, pressure bin): means of the data, profile metadata carried along
+            binned = df.groupby(profile_keys + ["pres_bin"], dropna=False, as_index=False).agg(agg_dict)
+            binned = binned[binned["pres_bin"].notna()]
             binned["profile_id"] = "Binned"
-            
-            # Combine binned data with mean row
-            mean_df = pd.DataFrame([mean_row])
+
+            # Each profile's bins followed by its mean row
             final_df = pd.concat([binned, mean_df], ignore_index=True)
-            
+            final_df = final_df.sort_values(profile_keys + ["profile_id"], kind="stable",
+                                            key=lambda c: c.eq("Mean") if c.name == "profile_id" else c)
+            final_df = final_df.reset_index(drop=True)
+
             if debug:
-                print(f"Binning results: {len(binned)} bins + 1 mean row = {len(final_df)} total rows")
+                print(f"Binning results: {len(binned)} bins over {n_profiles} profiles "
+                      f"+ {len(mean_df)} mean rows = {len(final_df)} total rows")
         else:
-            # If no pressure data, just add the mean row to the original data
+            # If no pressure data, just add the mean rows to the original data
             df_copy = df.copy()
             df_copy["profile_id"] = "Original"
-            mean_df = pd.DataFrame([mean_row])
             final_df = pd.concat([df_copy, mean_df], ignore_index=True)
 
         # --- Keep lean schema ---
@@ -259,6 +146,8 @@ def clean_and_bin_netcdf(file_path, save_path=None, bin_size=10, debug=True):
                 "bin_size": bin_size,
                 "available_essential_cols": available_essential,
                 "has_pressure_data": "pres" in df.columns and not df["pres"].isna().all(),
+                "profiles": n_profiles,
+                "profile_keys": [c for c in profile_keys if c in PROFILE_KEYS],
                 "unique_pressure_bins": len(df.groupby("pres_bin")) if "pres_bin" in df.columns else 0,
                 "data_rows_before_binning": len(df),
                 "data_rows_after_binning": len(final_df)
@@ -269,6 +158,7 @@ def clean_and_bin_netcdf(file_path, save_path=None, bin_size=10, debug=True):
             print(f"Processing summary:")
             print(f"  Original data: {df.shape[0]} rows, {df.shape[1]} columns")
             print(f"  Final data: {final_df.shape[0]} rows, {final_df.shape[1]} columns")
+            print(f"  Profiles: {n_profiles}")
             print(f"  Available essential columns: {available_essential}")
             if "pres_bin" in df.columns:
                 print(f"  Pressure range: {df['pres'].min():.2f} to {df['pres'].max():.2f}")